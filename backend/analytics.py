@@ -0,0 +1,322 @@
+# backend/analytics.py
+#
+# Yard analytics from precomputed rollups. RollupTracker follows the same
+# transitions that history.EventLog writes and accumulates, per spot and per
+# minute / hour / day bucket, the seconds the spot was occupied, arrivals,
+# departures and the dwell time of the buses that left. EventLog upserts the
+# accumulated increments in the same transaction as the events, so rollups and
+# history never disagree about what was applied.
+#
+# Time a bus is still parked is added when it leaves and, while it stays, at
+# least every ACCRUE_SECONDS, so rollups lag the yard by at most about a
+# minute. Every bucket is also rolled up for the whole yard under the spot id
+# ALL_SPOTS, so yard-wide queries read one row per bucket instead of one per
+# spot.
+#
+# The query helpers answer the /api/analytics/* endpoints; results are kept
+# for a short time in an AnalyticsCache since dashboards ask the same
+# questions over and over.
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+Rollup = models.OccupancyRollup
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+ALL_SPOTS = "*"
+ACCRUE_SECONDS = 60.0
+
+# Bucket counters, in column order: occupied_seconds, arrivals, departures, dwell_seconds.
+_COUNTERS = ("occupied_seconds", "arrivals", "departures", "dwell_seconds")
+
+
+def _epoch(dt: datetime) -> float:
+    return dt.timestamp() if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+
+class RollupTracker:
+    """
+    Turns transitions into rollup increments. Not thread-safe on its own:
+    EventLog calls it under its lock.
+    """
+
+    def __init__(self, accrue_seconds=ACCRUE_SECONDS):
+        self.accrue_seconds = accrue_seconds
+        # spot_id -> [bus, arrived_at, accrued_until] (epoch seconds) for occupied spots
+        self._parked: Dict[str, list] = {}
+        # (spot_id, granularity, bucket epoch) -> [occupied, arrivals, departures, dwell]
+        self._dirty: Dict[tuple, list] = {}
+        self._last_accrual = 0.0
+
+    def load(self, db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Picks up the spots that are occupied according to the history, so
+        dwell times span restarts. Time before `now` is not accrued again:
+        the previous process accounted for it up to when it stopped.
+        """
+        Event = models.OccupancyEvent
+        last = (
+            select(Event.spot_id, func.max(Event.ts).label("ts")).group_by(Event.spot_id).subquery()
+        )
+        rows = db.execute(
+            select(Event).join(last, (Event.spot_id == last.c.spot_id) & (Event.ts == last.c.ts))
+        ).scalars()
+        now = _epoch(now or datetime.now(timezone.utc))
+        latest = {}
+        for row in rows:
+            # A depart and an arrival can share the last timestamp; the arrival wins.
+            if row.spot_id not in latest or latest[row.spot_id].kind == "depart":
+                latest[row.spot_id] = row
+        for spot_id, row in latest.items():
+            if row.kind != "depart":
+                self._parked[spot_id] = [row.bus_id, _epoch(row.ts), now]
+        self._last_accrual = now
+        return len(self._parked)
+
+    def apply(self, events) -> None:
+        """Updates the tracker with occupancy_events rows (see history.transitions)."""
+        for event in events:
+            spot_id, ts = event["spot_id"], _epoch(event["ts"])
+            current = self._parked.get(spot_id)
+            if event["kind"] == "depart":
+                if current is not None and current[0] == event["bus_id"]:
+                    self._accrue(spot_id, current, ts)
+                    self._add(spot_id, ts, departures=1, dwell=ts - current[1])
+                    del self._parked[spot_id]
+                continue
+            if current is not None:
+                # Another bus took the spot without a depart for the one
+                # parked there (its depart was lost, or the tracker was seeded
+                # from older history): that bus leaves now.
+                self._accrue(spot_id, current, ts)
+                self._add(spot_id, ts, departures=1, dwell=ts - current[1])
+            self._parked[spot_id] = [event["bus_id"], ts, ts]
+            self._add(spot_id, ts, arrivals=1)
+
+    def accrue(self, now: datetime, force=False) -> None:
+        """Adds the time spots have been occupied up to `now`, at most every accrue_seconds."""
+        now = _epoch(now)
+        if not force and now - self._last_accrual < self.accrue_seconds:
+            return
+        for spot_id, current in self._parked.items():
+            self._accrue(spot_id, current, now)
+        self._last_accrual = now
+
+    def take(self) -> Dict[tuple, list]:
+        """Returns the increments accumulated since the last take and starts over."""
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def restore(self, dirty: Dict[tuple, list]) -> None:
+        """Puts back increments whose write failed, to go out with the next batch."""
+        for key, values in dirty.items():
+            totals = self._dirty.setdefault(key, [0.0, 0, 0, 0.0])
+            for i, value in enumerate(values):
+                totals[i] += value
+
+    def _accrue(self, spot_id, current, until):
+        start = current[2]
+        if until <= start:
+            return
+        for granularity, size in GRANULARITIES.items():
+            bucket = start // size * size
+            while bucket < until:
+                overlap = min(until, bucket + size) - max(start, bucket)
+                self._bucket(spot_id, granularity, bucket)[0] += overlap
+                self._bucket(ALL_SPOTS, granularity, bucket)[0] += overlap
+                bucket += size
+        current[2] = until
+
+    def _add(self, spot_id, ts, arrivals=0, departures=0, dwell=0.0):
+        for granularity, size in GRANULARITIES.items():
+            bucket = ts // size * size
+            for key in (spot_id, ALL_SPOTS):
+                totals = self._bucket(key, granularity, bucket)
+                totals[1] += arrivals
+                totals[2] += departures
+                totals[3] += dwell
+
+    def _bucket(self, spot_id, granularity, bucket):
+        key = (spot_id, granularity, bucket)
+        totals = self._dirty.get(key)
+        if totals is None:
+            totals = self._dirty[key] = [0.0, 0, 0, 0.0]
+        return totals
+
+
+def write_rollups(db: Session, dirty: Dict[tuple, list]) -> None:
+    """Adds the increments to occupancy_rollups with one batched upsert."""
+    if not dirty:
+        return
+    rows = [
+        {"spot_id": spot_id, "granularity": granularity, "bucket_start": _datetime(bucket),
+         **dict(zip(_COUNTERS, values))}
+        for (spot_id, granularity, bucket), values in dirty.items()
+    ]
+    insert = crud._insert_for(db)
+    stmt = insert(Rollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Rollup.spot_id, Rollup.granularity, Rollup.bucket_start],
+        set_={name: getattr(Rollup, name) + stmt.excluded[name] for name in _COUNTERS},
+    )
+    db.execute(stmt, rows)
+
+
+def prune(db: Session, granularity: str, before: datetime) -> int:
+    """Deletes rollup buckets of one granularity that start before `before`."""
+    return db.execute(
+        delete(Rollup).where(Rollup.granularity == granularity, Rollup.bucket_start < before)
+    ).rowcount
+
+
+# --- Queries ---
+
+def bucket_floor(dt: datetime, granularity: str) -> datetime:
+    size = GRANULARITIES[granularity]
+    return _datetime(_epoch(dt) // size * size)
+
+
+def _range(granularity, start, end, spot_id):
+    return (
+        Rollup.spot_id == (spot_id or ALL_SPOTS),
+        Rollup.granularity == granularity,
+        Rollup.bucket_start >= bucket_floor(start, granularity),
+        Rollup.bucket_start < end,
+    )
+
+
+def spot_count(db: Session) -> int:
+    return db.scalar(select(func.count()).select_from(models.Spot)) or 0
+
+
+def utilization(db: Session, granularity: str, start: datetime, end: datetime,
+                spot_id: Optional[str] = None, spots: int = 1) -> dict:
+    """
+    Occupied fraction per bucket between `start` and `end`, for one spot or
+    (with `spots` set to the number of spots) the whole yard. Buckets are
+    aligned to the granularity; missing buckets had no occupancy. The overall
+    figure covers exactly `start` to `end`: the buckets at either end only
+    count the share of their occupancy that falls inside the range.
+    """
+    size = GRANULARITIES[granularity]
+    count = 1 if spot_id else max(spots, 1)
+    capacity = size * count
+    rows = db.execute(
+        select(Rollup.bucket_start, Rollup.occupied_seconds, Rollup.arrivals)
+        .where(*_range(granularity, start, end, spot_id))
+        .order_by(Rollup.bucket_start)
+    ).all()
+    buckets = [
+        {"start": _datetime(_epoch(row.bucket_start)), "occupiedSeconds": row.occupied_seconds,
+         "utilization": row.occupied_seconds / capacity, "arrivals": row.arrivals}
+        for row in rows
+    ]
+    range_start, range_end = _epoch(start), _epoch(end)
+    # The current bucket has only accrued up to now, so its occupancy is
+    # spread over the part of it that has passed.
+    now = time.time()
+    total = 0.0
+    for bucket in buckets:
+        bucket_start = _epoch(bucket["start"])
+        accrued_end = min(bucket_start + size, max(now, bucket_start + 1))
+        inside = min(accrued_end, range_end) - max(bucket_start, range_start)
+        if inside > 0:
+            total += bucket["occupiedSeconds"] * min(1.0, inside / (accrued_end - bucket_start))
+    return {
+        "spotId": spot_id,
+        "granularity": granularity,
+        "start": _datetime(_epoch(bucket_floor(start, granularity))),
+        "end": end,
+        "buckets": buckets,
+        "utilization": total / (count * max(range_end - range_start, 1.0)),
+        "arrivals": sum(b["arrivals"] for b in buckets),
+    }
+
+
+def dwell(db: Session, start: datetime, end: datetime, granularity: str = "day") -> dict:
+    """Average dwell per bus visit that ended in the range, for the yard and per spot."""
+    rows = db.execute(
+        select(Rollup.spot_id, func.sum(Rollup.departures).label("departures"),
+               func.sum(Rollup.dwell_seconds).label("dwell_seconds"))
+        .where(
+            Rollup.granularity == granularity,
+            Rollup.bucket_start >= bucket_floor(start, granularity),
+            Rollup.bucket_start < end,
+        )
+        .group_by(Rollup.spot_id)
+    ).all()
+    spots, yard = [], {"departures": 0, "averageDwellSeconds": None}
+    for row in rows:
+        entry = {
+            "departures": row.departures,
+            "averageDwellSeconds": row.dwell_seconds / row.departures if row.departures else None,
+        }
+        if row.spot_id == ALL_SPOTS:
+            yard = entry
+        else:
+            spots.append({"spotId": row.spot_id, **entry})
+    spots.sort(key=lambda s: s["spotId"])
+    return {"start": bucket_floor(start, granularity), "end": end, **yard, "spots": spots}
+
+
+def peak_hours(db: Session, start: datetime, end: datetime) -> dict:
+    """
+    Average number of occupied spots for each hour of the day (UTC) over the
+    range, and the single busiest hour.
+    """
+    rows = db.execute(
+        select(Rollup.bucket_start, Rollup.occupied_seconds).where(*_range("hour", start, end, None))
+    ).all()
+    by_hour = [[0.0, 0] for _ in range(24)]
+    busiest = None
+    for row in rows:
+        bucket = _datetime(_epoch(row.bucket_start))
+        occupied = row.occupied_seconds / 3600
+        by_hour[bucket.hour][0] += occupied
+        if busiest is None or occupied > busiest["occupiedSpots"]:
+            busiest = {"start": bucket, "occupiedSpots": occupied}
+    days = max(1.0, (_epoch(end) - _epoch(bucket_floor(start, "hour"))) / 86400)
+    profile = [{"hour": hour, "averageOccupiedSpots": total / days} for hour, (total, _) in enumerate(by_hour)]
+    peak = max(profile, key=lambda p: p["averageOccupiedSpots"])
+    return {
+        "start": bucket_floor(start, "hour"),
+        "end": end,
+        "hours": profile,
+        "peakHour": peak["hour"] if peak["averageOccupiedSpots"] > 0 else None,
+        "busiestHour": busiest,
+    }
+
+
+class AnalyticsCache:
+    """Keeps query results for `ttl` seconds, keyed by the query and its arguments."""
+
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
@@ -0,0 +1,73 @@
+# backend/broadcaster.py
+#
+# Fans spot changes out to live dashboard connections (GET /api/status/stream).
+#
+# Each subscriber owns a "pending" dict keyed by spot_id instead of a queue of
+# events. Publishing only overwrites entries in those dicts, so it never waits
+# on a slow client, a subscriber's backlog can never grow beyond the number of
+# spots, and a burst of changes to one spot collapses into its latest value.
+
+import asyncio
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from .status_cache import SpotChange
+
+
+class Subscriber:
+    def __init__(self):
+        self._pending: Dict[str, SpotChange] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, changes: Iterable[SpotChange]) -> None:
+        for change in changes:
+            self._pending[change.spot_id] = change
+        self._ready.set()
+
+    async def next_batch(self, coalesce_seconds: float = 0.0) -> Dict[str, SpotChange]:
+        """Waits for changes, lingers briefly to batch a burst, then drains them."""
+        await self._ready.wait()
+        if coalesce_seconds:
+            await asyncio.sleep(coalesce_seconds)
+        self._ready.clear()
+        batch, self._pending = self._pending, {}
+        return batch
+
+
+class StatusBroadcaster:
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._guard = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        """Must be called from the event loop that serves the stream."""
+        subscriber = Subscriber()
+        with self._guard:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._guard:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, changes) -> None:
+        """Thread-safe; called from the request threads that apply detections."""
+        if not changes or not self._subscribers or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._fan_out, list(changes))
+        except RuntimeError:
+            # The loop that served the streams has shut down.
+            self._loop = None
+
+    def _fan_out(self, changes) -> None:
+        with self._guard:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(changes)
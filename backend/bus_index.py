@@ -0,0 +1,91 @@
+# backend/bus_index.py
+#
+# In-memory index from bus number to where that bus is, for dispatcher
+# lookups. Exact lookups are one dict access; prefix search bisects a sorted
+# list of bus numbers, so neither scans the yard. The index is rebuilt from
+# bus_locations on startup and then updated by the detection endpoints right
+# after each write to bus_locations, with the same last-seen time semantics:
+# a bus is "seen" whenever an upload (re)writes its row.
+#
+# Buses that leave stay in the index, marked as not parked, with the spot and
+# time they were last seen, until the process restarts.
+
+import bisect
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from . import models
+from .history import utc
+
+
+class BusIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # bus number -> {"busNumber", "parked", "spotId", "cameraId", "lastSeen"}
+        self._buses: Dict[str, dict] = {}
+        self._sorted: List[str] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, session_factory) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            db = session_factory()
+            try:
+                self._buses = {}
+                for loc in db.query(models.BusLocation).all():
+                    self._buses[loc.detected_bus_id] = {
+                        "busNumber": loc.detected_bus_id,
+                        "parked": True,
+                        "spotId": loc.spot_id,
+                        "cameraId": loc.camera_id,
+                        "lastSeen": utc(loc.timestamp),
+                    }
+                self._sorted = sorted(self._buses)
+                self._loaded = True
+            finally:
+                db.close()
+
+    def record(self, camera_id: str, changes, seen: Dict[str, str], at: Optional[datetime] = None) -> None:
+        """
+        Applies one detection payload: `changes` are the SpotChanges it caused
+        and `seen` the spot -> bus map that was written to bus_locations.
+        """
+        at = at or datetime.now(timezone.utc)
+        with self._lock:
+            for change in changes:
+                entry = self._buses.get(change.old_bus) if change.old_bus is not None else None
+                if entry is not None and entry["parked"] and entry["spotId"] == change.spot_id:
+                    entry["parked"] = False
+            for spot_id, bus in seen.items():
+                entry = self._buses.get(bus)
+                if entry is None:
+                    entry = self._buses[bus] = {"busNumber": bus}
+                    bisect.insort(self._sorted, bus)
+                entry.update(parked=True, spotId=spot_id, cameraId=camera_id, lastSeen=at)
+
+    def get(self, bus_number: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._buses.get(bus_number)
+            return dict(entry) if entry is not None else None
+
+    def search(self, prefix: str, limit: int = 20) -> List[dict]:
+        """Buses whose number starts with `prefix`, in order."""
+        with self._lock:
+            start = bisect.bisect_left(self._sorted, prefix)
+            matches = []
+            for bus in self._sorted[start:start + limit]:
+                if not bus.startswith(prefix):
+                    break
+                matches.append(dict(self._buses[bus]))
+            return matches
+
+    def __len__(self) -> int:
+        return len(self._buses)
@@ -0,0 +1,133 @@
+# backend/crud.py
+#
+# Set-based write helpers for the bus_locations table. Each helper issues a
+# fixed number of statements no matter how many detections a camera sends, and
+# leaves committing to the caller so a whole payload lands in one transaction
+# (or, through write_behind.LocationWriter, many payloads in one).
+
+from typing import Dict, List
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+# INSERT constructs with ON CONFLICT, for database.SUPPORTED_DIALECTS (any
+# other database is refused when the engine is created).
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _insert_for(db: Session):
+    """Returns the dialect-specific INSERT construct that supports ON CONFLICT."""
+    return _INSERTS[db.get_bind().dialect.name]
+
+
+def spot_map(detections) -> Dict[str, str]:
+    """spot_id -> bus_number for a list of detections; if a spot appears twice, the last wins."""
+    return {d.spot_id: d.bus_number for d in detections}
+
+
+def upsert_bus_locations(db: Session, camera_id: str, spot_to_bus: Dict[str, str],
+                         depot_id: str = models.DEFAULT_DEPOT) -> None:
+    """
+    Writes the given spot -> bus assignments with a single
+    INSERT ... ON CONFLICT (spot_id) DO UPDATE statement.
+    """
+    if not spot_to_bus:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.BusLocation).values([
+        {"spot_id": spot_id, "detected_bus_id": bus_number, "camera_id": camera_id, "depot_id": depot_id}
+        for spot_id, bus_number in spot_to_bus.items()
+    ])
+    # ON CONFLICT bypasses the ORM, so the column's onupdate never fires and the
+    # timestamp has to be refreshed explicitly.
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.BusLocation.spot_id],
+        set_={
+            "detected_bus_id": stmt.excluded.detected_bus_id,
+            "camera_id": stmt.excluded.camera_id,
+            "depot_id": stmt.excluded.depot_id,
+            "timestamp": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+
+def clear_empty_spots(db: Session, camera_id: str, occupied_spot_ids) -> None:
+    """
+    Deletes the bus_locations rows for every spot this camera covers that is
+    not in `occupied_spot_ids`, using one DELETE with a subquery on spots.
+    """
+    camera_spots = select(models.Spot.spot_id).where(models.Spot.camera_id == camera_id)
+    stmt = delete(models.BusLocation).where(models.BusLocation.spot_id.in_(camera_spots))
+    if occupied_spot_ids:
+        stmt = stmt.where(models.BusLocation.spot_id.not_in(list(occupied_spot_ids)))
+    db.execute(stmt)
+
+
+def apply_camera_snapshot(db: Session, camera_id: str, detections,
+                          depot_id: str = models.DEFAULT_DEPOT) -> Dict[str, str]:
+    """
+    Replaces everything `camera_id` knows about with `detections` (a list of
+    objects with spot_id / bus_number). Returns the deduplicated spot -> bus map
+    that was written; if a spot appears twice, the last detection wins.
+    """
+    spot_to_bus = spot_map(detections)
+    clear_empty_spots(db, camera_id, spot_to_bus.keys())
+    upsert_bus_locations(db, camera_id, spot_to_bus, depot_id)
+    return spot_to_bus
+
+
+def remove_bus_locations(db: Session, spot_ids, camera_id: str = None) -> None:
+    """
+    Deletes the bus_locations rows for the given spots in one statement; with
+    `camera_id`, only for those of the spots that camera covers.
+    """
+    if not spot_ids:
+        return
+    stmt = delete(models.BusLocation).where(models.BusLocation.spot_id.in_(list(spot_ids)))
+    if camera_id is not None:
+        camera_spots = select(models.Spot.spot_id).where(models.Spot.camera_id == camera_id)
+        stmt = stmt.where(models.BusLocation.spot_id.in_(camera_spots))
+    db.execute(stmt)
+
+
+def apply_camera_delta(db: Session, camera_id: str, upserts, removals,
+                       depot_id: str = models.DEFAULT_DEPOT) -> Dict[str, str]:
+    """
+    Applies an incremental update from `camera_id`: `upserts` are detections
+    whose spot gained or changed bus, `removals` are spot ids that emptied.
+    Removals of spots another camera covers are ignored. Returns the
+    deduplicated spot -> bus map that was written.
+    """
+    spot_to_bus = spot_map(upserts)
+    remove_bus_locations(db, [s for s in removals if s not in spot_to_bus], camera_id)
+    upsert_bus_locations(db, camera_id, spot_to_bus, depot_id)
+    return spot_to_bus
+
+
+def write_location_batch(db: Session, rows: List[dict], removals) -> None:
+    """
+    Writes a batch of buffered spot states from several cameras: `rows` are
+    bus_locations rows (spot_id, detected_bus_id, camera_id, depot_id and the
+    timestamp the upload was accepted at) sent as one executemany upsert, and
+    `removals` the spots that emptied, deleted in one statement.
+    """
+    remove_bus_locations(db, removals)
+    if not rows:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.BusLocation)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.BusLocation.spot_id],
+        set_={
+            "detected_bus_id": stmt.excluded.detected_bus_id,
+            "camera_id": stmt.excluded.camera_id,
+            "depot_id": stmt.excluded.depot_id,
+            "timestamp": stmt.excluded.timestamp,
+        },
+    )
+    db.execute(stmt, rows)
@@ -0,0 +1,420 @@
+# backend/history.py
+#
+# Occupancy history. BusLocation only holds the current bus per spot, so every
+# change the detection endpoints apply is also appended to the occupancy_events
+# table as transitions (arrive, depart, move). Nothing is written for frames or
+# heartbeats that change nothing, and EventLog writes in batches from a
+# background thread, so history costs one multi-row INSERT per second or so no
+# matter how many cameras are uploading.
+#
+# Queries:
+#   bus_location_at  - where a bus was parked at a given time
+#   spot_occupancy   - which buses held a spot over a time range
+# Both read one index range ((bus_id, ts) or (spot_id, ts)), so their cost
+# depends on the events in the range asked for, not on how much history exists.
+#
+# Maintenance (run from cron or a scheduler):
+#   python -m backend.history --retention-days 365 --compact-after-days 7
+# creates upcoming monthly partitions (PostgreSQL), drops history past the
+# retention period, and compacts old history by removing flaps: a bus that
+# "departs" and re-arrives at the same spot within --flap-seconds, which is a
+# missed detection rather than a real departure. Per-minute analytics rollups
+# (see analytics.py) are kept for --minute-rollup-days.
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import analytics, crud, metrics, models
+
+logger = metrics.get_logger("njt.history")
+
+Event = models.OccupancyEvent
+PARTITION_PREFIX = "occupancy_events_p"
+
+
+def utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored in UTC; SQLite hands them back without a zone."""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def transitions(changes, ts: datetime) -> List[dict]:
+    """
+    Turns the SpotChanges of one applied payload into occupancy_events rows.
+    A bus that leaves one spot and shows up in another within the same payload
+    is recorded as a depart plus a move rather than a depart plus an arrive.
+    """
+    left = {c.old_bus: c.spot_id for c in changes if c.old_bus is not None}
+    events = []
+    for c in changes:
+        if c.old_bus is not None:
+            events.append({"spot_id": c.spot_id, "ts": ts, "kind": "depart", "bus_id": c.old_bus,
+                           "camera_id": c.camera_id, "from_spot_id": None})
+        if c.new_bus is not None:
+            origin = left.get(c.new_bus)
+            moved = origin is not None and origin != c.spot_id
+            events.append({"spot_id": c.spot_id, "ts": ts, "kind": "move" if moved else "arrive",
+                           "bus_id": c.new_bus, "camera_id": c.camera_id,
+                           "from_spot_id": origin if moved else None})
+    return events
+
+
+def insert_events(db: Session, events: List[dict]) -> int:
+    """
+    Writes a batch as an executemany, which SQLAlchemy sends as multi-row
+    INSERTs; replaying a batch that was already written is a no-op. Returns
+    how many events were skipped because their (spot_id, ts, kind) was
+    already taken (0 if the driver does not report it).
+    """
+    if not events:
+        return 0
+    insert = crud._insert_for(db)
+    # On the connection (not the ORM session) so the result reports its rowcount.
+    rowcount = db.connection().execute(insert(Event).on_conflict_do_nothing(), events).rowcount
+    return max(0, len(events) - rowcount) if rowcount is not None and rowcount >= 0 else 0
+
+
+class EventLog:
+    """
+    Buffers transitions and writes them from a background thread, every
+    `flush_interval` seconds or as soon as `batch_size` are waiting. A failed
+    write is retried with the next batch; beyond `max_pending` buffered events
+    new ones are dropped (and counted) rather than growing without bound while
+    the database is down. With `rollups` (an analytics.RollupTracker) the
+    rollup increments are written in the same transaction as the events, and
+    dropped events never reach the tracker. A failed batch is always kept (its
+    increments are already in the tracker), so after failures up to one batch
+    more than `max_pending` can be buffered.
+    `clock` returns the current time (a UTC datetime); replays of recorded
+    history pass their own.
+
+    The primary key is (spot_id, ts, kind), so two payloads changing a spot
+    within one clock tick would collide and the second be skipped; a spot's
+    transitions are therefore stamped at least a microsecond after its
+    previous ones. Conflicts that still happen are counted and logged.
+    """
+
+    def __init__(self, session_factory, flush_interval=1.0, batch_size=1000, max_pending=100_000,
+                 rollups=None, clock=None):
+        self.session_factory = session_factory
+        self.rollups = rollups
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self.conflicts = 0
+        self._last_ts: Dict[str, datetime] = {}  # spot_id -> ts of its latest transitions
+        self._pending: List[dict] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def record(self, changes, ts: Optional[datetime] = None) -> None:
+        events = transitions(changes, ts or self.clock())
+        if not events:
+            return
+        with self._cond:
+            self._order(events)
+            room = self.max_pending - len(self._pending)
+            if room < len(events):
+                self.dropped += len(events) - max(room, 0)
+                events = events[:max(room, 0)]
+            if self.rollups is not None:
+                self.rollups.apply(events)
+            self._pending.extend(events)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _order(self, events) -> None:
+        # Called with the lock held. The events of one spot in one payload
+        # (a depart and an arrival) keep sharing their timestamp.
+        stamped = {}
+        for event in events:
+            spot_id = event["spot_id"]
+            ts = stamped.get(spot_id)
+            if ts is None:
+                last = self._last_ts.get(spot_id)
+                ts = stamped[spot_id] = (
+                    event["ts"] if last is None or event["ts"] > last else last + timedelta(microseconds=1)
+                )
+            event["ts"] = ts
+        self._last_ts.update(stamped)
+
+    def load_rollups(self, db: Session) -> None:
+        """Seeds the rollup tracker with the spots that are occupied according to the history."""
+        if self.rollups is not None:
+            with self._cond:
+                self.rollups.load(db, self.clock())
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"written": self.written, "pending": len(self._pending),
+                    "dropped": self.dropped, "failures": self.failures, "conflicts": self.conflicts}
+
+    def flush(self) -> None:
+        """Writes everything buffered so far on the calling thread."""
+        with self._cond:
+            batch, rollups = self._take(force_accrual=True)
+        self._write(batch, rollups)
+
+    def close(self, timeout=5.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                batch, rollups = self._take()
+                closed = self._closed
+            self._write(batch, rollups)
+            if closed:
+                return
+
+    def _take(self, force_accrual=False):
+        # Called with the lock held.
+        batch, self._pending = self._pending, []
+        if self.rollups is None:
+            return batch, {}
+        self.rollups.accrue(self.clock(), force=force_accrual)
+        return batch, self.rollups.take()
+
+    def _write(self, batch, rollups=None):
+        if not batch and not rollups:
+            return
+        db = self.session_factory()
+        try:
+            conflicts = insert_events(db, batch)
+            analytics.write_rollups(db, rollups)
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            with self._cond:
+                self.failures += 1
+                if rollups:
+                    self.rollups.restore(rollups)
+                self._pending[:0] = batch
+            logger.warning("occupancy history write failed", extra={"fields": {
+                "events": len(batch), "error": str(exc)[:200],
+            }})
+            return
+        finally:
+            db.close()
+        if conflicts:
+            logger.warning("occupancy events skipped, key already taken", extra={"fields": {
+                "events": len(batch), "conflicts": conflicts,
+            }})
+        with self._cond:
+            self.written += len(batch) - conflicts
+            self.conflicts += conflicts
+
+
+# --- Queries ---
+
+def _latest_first():
+    # A depart and an arrive/move can share a timestamp (one payload); the
+    # arrival is the state after the payload, so it sorts first.
+    return (Event.ts.desc(), (Event.kind == "depart").asc())
+
+
+def bus_location_at(db: Session, bus_id: str, at: datetime) -> dict:
+    """Where `bus_id` was parked at `at`, from its last event at or before then."""
+    row = db.execute(
+        select(Event).where(Event.bus_id == bus_id, Event.ts <= at).order_by(*_latest_first()).limit(1)
+    ).scalar_one_or_none()
+    if row is None:
+        return {"busId": bus_id, "at": at, "spotId": None, "cameraId": None, "since": None, "lastEvent": None}
+    parked = row.kind != "depart"
+    return {
+        "busId": bus_id,
+        "at": at,
+        "spotId": row.spot_id if parked else None,
+        "cameraId": row.camera_id,
+        "since": utc(row.ts),
+        "lastEvent": row.kind,
+        "lastSpotId": row.spot_id,
+    }
+
+
+def spot_occupancy(db: Session, spot_id: str, start: datetime, end: datetime) -> dict:
+    """
+    The buses that held `spot_id` between `start` and `end` as intervals
+    clipped to the range, plus the occupied fraction of the range.
+    """
+    before = db.execute(
+        select(Event).where(Event.spot_id == spot_id, Event.ts <= start).order_by(*_latest_first()).limit(1)
+    ).scalar_one_or_none()
+    rows = db.execute(
+        select(Event)
+        .where(Event.spot_id == spot_id, Event.ts > start, Event.ts <= end)
+        .order_by(Event.ts, (Event.kind == "depart").desc())
+    ).scalars()
+
+    intervals = []
+    bus, since = (before.bus_id, start) if before is not None and before.kind != "depart" else (None, None)
+    for row in rows:
+        ts = utc(row.ts)
+        if bus is not None and (row.kind != "depart" or row.bus_id == bus):
+            intervals.append({"busId": bus, "start": since, "end": ts})
+            bus = None
+        if row.kind != "depart":
+            bus, since = row.bus_id, ts
+    if bus is not None:
+        intervals.append({"busId": bus, "start": since, "end": end, "ongoing": True})
+
+    span = (end - start).total_seconds()
+    occupied = sum((i["end"] - i["start"]).total_seconds() for i in intervals)
+    return {
+        "spotId": spot_id,
+        "start": start,
+        "end": end,
+        "intervals": intervals,
+        "occupiedSeconds": occupied,
+        "utilization": occupied / span if span > 0 else 0.0,
+    }
+
+
+# --- Maintenance ---
+
+def _month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def ensure_partitions(engine, now: Optional[datetime] = None, months_ahead=2) -> List[str]:
+    """
+    Creates the monthly partitions of occupancy_events from this month through
+    `months_ahead`, plus a default partition for anything outside them.
+    Returns the partitions created; a no-op on databases other than PostgreSQL.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    month = _month_start(now or datetime.now(timezone.utc))
+    created = []
+    with engine.begin() as conn:
+        existing = set(conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'occupancy_events'"
+        )).scalars())
+        if "occupancy_events_default" not in existing:
+            conn.execute(text("CREATE TABLE occupancy_events_default PARTITION OF occupancy_events DEFAULT"))
+            created.append("occupancy_events_default")
+        for _ in range(months_ahead + 1):
+            name = f"{PARTITION_PREFIX}{month:%Y%m}"
+            upper = _next_month(month)
+            if name not in existing:
+                conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF occupancy_events "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+                ))
+                created.append(name)
+            month = upper
+    return created
+
+
+def apply_retention(engine, cutoff: datetime) -> dict:
+    """
+    Removes history older than `cutoff`. On PostgreSQL whole monthly
+    partitions that end before the cutoff are dropped, which frees their
+    space at once; what remains older than the cutoff is deleted row by row.
+    """
+    dropped = []
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            partitions = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'occupancy_events'"
+            )).scalars()
+            for name in partitions:
+                if not name.startswith(PARTITION_PREFIX):
+                    continue
+                month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").replace(tzinfo=timezone.utc)
+                if _next_month(month) <= cutoff:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                    dropped.append(name)
+        deleted = conn.execute(delete(Event).where(Event.ts < cutoff)).rowcount
+    return {"dropped_partitions": dropped, "deleted_events": deleted}
+
+
+def compact(engine, before: datetime, flap_seconds: float, chunk=1000) -> int:
+    """
+    Deletes depart/re-arrive pairs older than `before` where the same bus came
+    back to the same spot within `flap_seconds`. Returns the rows removed.
+    """
+    order = (Event.ts, (Event.kind == "depart").desc())
+    following = select(
+        Event.spot_id, Event.ts, Event.kind, Event.bus_id,
+        *(func.lead(column, type_=column.type).over(partition_by=Event.spot_id, order_by=order).label(label)
+          for column, label in ((Event.ts, "next_ts"), (Event.kind, "next_kind"), (Event.bus_id, "next_bus"))),
+    ).where(Event.ts < before).subquery()
+    flaps = select(following).where(
+        following.c.kind == "depart",
+        following.c.next_kind == "arrive",
+        following.c.next_bus == following.c.bus_id,
+    )
+    keys = []
+    with engine.begin() as conn:
+        for row in conn.execute(flaps):
+            if (utc(row.next_ts) - utc(row.ts)).total_seconds() <= flap_seconds:
+                keys.append((row.spot_id, row.ts, "depart"))
+                keys.append((row.spot_id, row.next_ts, "arrive"))
+        for i in range(0, len(keys), chunk):
+            conn.execute(delete(Event).where(
+                tuple_(Event.spot_id, Event.ts, Event.kind).in_(keys[i:i + chunk])
+            ))
+    return len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Occupancy history maintenance.")
+    parser.add_argument("--retention-days", type=float, default=365.0, help="drop history older than this")
+    parser.add_argument("--compact-after-days", type=float, default=7.0, help="remove flaps older than this")
+    parser.add_argument("--flap-seconds", type=float, default=60.0,
+                        help="a depart followed by the same bus re-arriving within this is a flap")
+    parser.add_argument("--minute-rollup-days", type=float, default=14.0,
+                        help="drop per-minute analytics rollups older than this (hour/day rollups are kept)")
+    parser.add_argument("--partitions-ahead", type=int, default=2, help="monthly partitions to create in advance")
+    args = parser.parse_args()
+
+    from . import database
+
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    created = ensure_partitions(database.engine, now, args.partitions_ahead)
+    retention = apply_retention(database.engine, now - timedelta(days=args.retention_days))
+    compacted = compact(database.engine, now - timedelta(days=args.compact_after_days), args.flap_seconds)
+    with database.SessionLocal() as db:
+        pruned = analytics.prune(db, "minute", now - timedelta(days=args.minute_rollup_days))
+        db.commit()
+    logger.info("history maintenance finished", extra={"fields": {
+        "partitions_created": created, **retention, "compacted_events": compacted,
+        "pruned_minute_rollups": pruned,
+        "seconds": round(time.perf_counter() - started, 3),
+    }})
+
+
+if __name__ == "__main__":
+    main()
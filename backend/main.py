@@ -1,16 +1,83 @@
 # backend/main.py
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from pydantic import BaseModel
-from . import models, database
+import asyncio
+import json
+import os
+from pydantic import BaseModel, ValidationError
+from . import database, crud, analytics, history, metrics, migrate, sharding, wire
+from .broadcaster import StatusBroadcaster
+from .bus_index import BusIndex
+from .sequencing import CameraSequencer
+from .startup import Warmup
+from .status_cache import StatusSnapshot
+from .write_behind import LocationWriter, WriterStalled
 
-# Create database tables
-models.Base.metadata.create_all(bind=database.engine)
+# Schema changes run as part of the warm-up unless NJT_MIGRATE_ON_STARTUP=0,
+# for deployments that run `python -m backend.migrate` once per release instead.
+MIGRATE_ON_STARTUP = os.environ.get("NJT_MIGRATE_ON_STARTUP", "1") != "0"
+# Seconds a request that needs the warmed-up state waits for it before 503.
+READY_TIMEOUT_SECONDS = float(os.environ.get("NJT_READY_TIMEOUT", "10"))
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Serve right away; migrations and cache loading finish in the background
+    # and /health/ready reports when they are done.
+    warmup.start()
+    yield
+    await warmup.stop()
+    # Write out acknowledged detections and buffered history before the
+    # process goes away.
+    await run_in_threadpool(location_writer.close)
+    await run_in_threadpool(event_log.close)
+
+app = FastAPI(lifespan=lifespan)
+logger = metrics.get_logger("njt.api")
+
+# Last applied sequence number per camera, used to validate delta uploads.
+sequencer = CameraSequencer()
+# Pre-serialized /api/status body, updated by the detection endpoints.
+status_snapshot = StatusSnapshot()
+# Bus number -> current spot, for dispatcher lookups.
+bus_index = BusIndex()
+# Group commit for bus_locations writes; disabled with DETECTION_FLUSH_MS=0.
+location_writer = LocationWriter(database.SessionLocal)
+# Live dashboard connections that get pushed spot changes.
+broadcaster = StatusBroadcaster()
+# Batched writer for the occupancy history (arrive/depart/move transitions)
+# and the analytics rollups maintained from it.
+rollups = analytics.RollupTracker()
+event_log = history.EventLog(database.SessionLocal, rollups=rollups)
+# Recent /api/analytics/* results; rollups themselves lag by up to a minute.
+analytics_cache = analytics.AnalyticsCache(ttl=30.0)
+
+metrics.instrument_engine(database.engine)
+metrics.instrument_engine(database.read_engine)
+if database.async_engine is not None:
+    metrics.instrument_engine(database.async_engine.sync_engine)
+metrics.STREAM_SUBSCRIBERS.set_function(lambda: broadcaster.subscriber_count)
+metrics.WRITE_BEHIND_PENDING.set_function(lambda: location_writer.stats()["pending"])
+metrics.WRITE_BEHIND_STALENESS.set_function(location_writer.staleness)
+
+# Seconds to linger after a change before flushing to stream clients, so a
+# burst of camera updates goes out as one event.
+STREAM_COALESCE_SECONDS = 0.1
+# Uploads naming a spot the status layout does not know reload it at most
+# this often (spots are added outside this process, e.g. by populate_db.py).
+LAYOUT_RELOAD_SECONDS = 10.0
+# A comment line is sent this often on idle streams to keep proxies from
+# closing the connection.
+STREAM_KEEPALIVE_SECONDS = 15.0
 
 # --- FIX APPLIED HERE ---
 # Added the default Vite port (5173) to the list of allowed origins.
@@ -27,6 +94,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compresses the larger JSON answers (analytics, global status). /api/status
+# compresses its own cached bodies and the event stream is left alone.
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # --- Pydantic Models ---
 class DetectionItem(BaseModel):
@@ -36,70 +107,442 @@ class DetectionItem(BaseModel):
 class DetectionPayload(BaseModel):
     camera_id: str
     detections: List[DetectionItem]
+    seq: Optional[int] = None # Set by engines that follow up with delta uploads
+
+class DeltaPayload(BaseModel):
+    camera_id: str
+    seq: int
+    base_seq: int # The sequence number this delta was computed against
+    upserts: List[DetectionItem] = []
+    removals: List[str] = []
 
 # --- Database Dependency ---
-def get_db():
-    db = database.SessionLocal()
+def get_read_db():
+    """Session on the read pool, for endpoints that only query."""
+    db = database.ReadSessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+def _load_status():
+    # Staged detections are already in memory but not yet in bus_locations;
+    # write them out before (re)loading from the database.
+    if location_writer.enabled:
+        location_writer.flush()
+    status_snapshot.ensure_loaded(database.ReadSessionLocal)
+    bus_index.ensure_loaded(database.ReadSessionLocal)
+
+def upload_body(model):
+    """
+    Dependency that parses a detection upload into `model` from JSON or, with
+    Content-Type application/x-msgpack, from the compact form in wire.py
+    whose spot numbers refer to the current layout. A compact upload built
+    against another layout is answered with 412 and the current version, so
+    the engine refetches /api/layout and resends. Uploads for a camera another
+    shard owns are redirected before their spots are looked up, since they
+    were numbered against the owner's layout.
+    """
+    async def parse(request: Request):
+        content_type = request.headers.get("content-type")
+        body = await request.body()
+        try:
+            data = wire.unpack_upload(body, content_type)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Malformed upload: {exc}")
+        if isinstance(data, dict) and isinstance(data.get("camera_id"), str):
+            redirect_to_owner(data["camera_id"], request)
+        if (content_type or "").startswith(wire.MSGPACK):
+            await ensure_status_loaded()
+        try:
+            data = wire.resolve_spots(data, content_type, status_snapshot.layout_version, status_snapshot.spot_ids)
+        except wire.LayoutMismatch as exc:
+            raise HTTPException(status_code=412, detail={
+                "message": str(exc), "layout": status_snapshot.layout_version,
+            })
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Malformed upload: {exc}")
+        try:
+            return model.model_validate(data)
+        except ValidationError as exc:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+            )
+    return parse
+
+async def ensure_status_loaded():
+    # Writes also wait for the rollup state, so no transition is counted before it is loaded.
+    try:
+        await warmup.wait(READY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Starting up.", headers={"Retry-After": "1"})
+    # Loading runs once per process (and after invalidate); keep it off the loop.
+    if not status_snapshot.loaded or not bus_index.loaded:
+        await run_in_threadpool(_load_status)
+
+async def refresh_layout(camera_id, spot_ids):
+    """Reloads the status layout if an upload names spots added since it was read."""
+    if status_snapshot.claim_layout_reload(spot_ids, LAYOUT_RELOAD_SECONDS):
+        logger.info("upload names unknown spots, reloading the layout", extra={"fields": {"camera_id": camera_id}})
+        await run_in_threadpool(status_snapshot.reload_layout, database.ReadSessionLocal)
+
+def _apply_sync(apply, *args):
+    """Runs a crud apply function and commits, on a pooled sync session."""
+    db = database.SessionLocal()
+    try:
+        spot_to_bus = apply(db, *args)
+        db.commit()
+        return spot_to_bus
+    finally:
+        db.close()
+
+async def apply_and_commit(apply, *args):
+    """
+    Runs `apply(db, *args)` from crud and commits it. With an async driver the
+    request waits on the database without holding a worker thread; otherwise
+    the sync session runs on the threadpool.
+    """
+    if database.AsyncSessionLocal is None:
+        return await run_in_threadpool(_apply_sync, apply, *args)
+    async with database.AsyncSessionLocal() as session:
+        spot_to_bus = await session.run_sync(apply, *args)
+        await session.commit()
+        return spot_to_bus
+
+async def write_locations(apply, *args):
+    """
+    The bus_locations write for one payload. With write-behind the payload is
+    staged after it is applied in memory (LocationWriter.stage), so here it is
+    only checked that the buffer is within its staleness bound; otherwise
+    `apply` runs and commits now.
+    """
+    if not location_writer.enabled:
+        await apply_and_commit(apply, *args)
+        return
+    try:
+        location_writer.check()
+    except WriterStalled as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+def _load_rollups():
+    # Resume dwell times of buses that were parked before this process started.
+    with database.ReadSessionLocal() as db:
+        event_log.load_rollups(db)
+
+warmup = Warmup(
+    ([("migrate", lambda: migrate.run(database.engine))] if MIGRATE_ON_STARTUP else [])
+    + [("rollups", _load_rollups), ("status", _load_status)]
+)
+
+def _analytics_range(start, end, default_span):
+    end = history.utc(end) or datetime.now(timezone.utc)
+    start = history.utc(start) or end - default_span
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    # Defaults move with the clock; rounding them to whole minutes (the end
+    # up, so the current bucket is included) lets repeated dashboard requests
+    # share a cache entry.
+    rounded_end = end.replace(second=0, microsecond=0)
+    if rounded_end < end:
+        rounded_end += timedelta(minutes=1)
+    return start.replace(second=0, microsecond=0), rounded_end
+
+def on_state_changes(changes):
+    """Called with the SpotChanges produced by every applied detection payload."""
+    broadcaster.publish(changes)
+    event_log.record(changes)
+
 # --- API Endpoints ---
 
+def redirect_to_owner(camera_id: str, request: Request):
+    """Raises a 307 to the replica that owns `camera_id` when sharded and it is not this one."""
+    owner = sharding.owner_url(camera_id)
+    if owner is not None:
+        raise HTTPException(
+            status_code=307, detail="Camera is owned by another shard.",
+            headers={"Location": owner + request.url.path},
+        )
+
+
 @app.post("/api/detections")
-def receive_detections(payload: DetectionPayload, db: Session = Depends(get_db)):
+async def receive_detections(payload: DetectionPayload = Depends(upload_body(DetectionPayload))):
     """
     Receives parking detection data from the detection script and updates the
     current location of each bus. This uses an "upsert" logic.
+    A snapshot whose seq is older than the last one applied for the camera is
+    rejected with 409, like a delta that does not fit.
     """
-    print(f"Received detections from {payload.camera_id}")
-    
-    detected_spot_ids = {d.spot_id for d in payload.detections}
-    spots_this_camera_sees_query = db.query(models.Spot.spot_id).filter(models.Spot.camera_id == payload.camera_id).all()
-    spots_this_camera_sees_set = {s.spot_id for s in spots_this_camera_sees_query}
-    
-    empty_spots = spots_this_camera_sees_set - detected_spot_ids
-
-    if empty_spots:
-        db.query(models.BusLocation).filter(
-            models.BusLocation.spot_id.in_(empty_spots)
-        ).delete(synchronize_session=False)
-
-    for detection in payload.detections:
-        existing_location = db.query(models.BusLocation).filter(models.BusLocation.spot_id == detection.spot_id).first()
-        if existing_location:
-            existing_location.detected_bus_id = detection.bus_number
-            existing_location.camera_id = payload.camera_id
-        else:
-            new_location = models.BusLocation(
-                spot_id=detection.spot_id,
-                detected_bus_id=detection.bus_number,
-                camera_id=payload.camera_id
+    logger.info("detections received", extra={"fields": {
+        "camera_id": payload.camera_id, "detections": len(payload.detections),
+    }})
+
+    # One DELETE for the spots that emptied plus one bulk upsert for the rest,
+    # committed together (or staged together for the next group commit) so the
+    # dashboard never sees a half-applied payload.
+    await ensure_status_loaded()
+    async with sequencer.async_camera(payload.camera_id):
+        if not sequencer.accepts_snapshot(payload.camera_id, payload.seq):
+            raise HTTPException(
+                status_code=409,
+                detail={"expected_base_seq": sequencer.last_seq(payload.camera_id)},
             )
-            db.add(new_location)
-        
-    db.commit()
+        await refresh_layout(payload.camera_id, [d.spot_id for d in payload.detections])
+        depot_id = status_snapshot.depot_for(payload.camera_id)
+        await write_locations(crud.apply_camera_snapshot, payload.camera_id, payload.detections, depot_id)
+        spot_to_bus = crud.spot_map(payload.detections)
+        changes = status_snapshot.apply_snapshot(payload.camera_id, spot_to_bus)
+        if location_writer.enabled:
+            location_writer.stage(payload.camera_id, depot_id, spot_to_bus, changes)
+        bus_index.record(payload.camera_id, changes, spot_to_bus)
+        on_state_changes(changes)
+        # A full snapshot (re)starts the camera's sequence. One without a seq
+        # (a replayed spool entry) leaves it alone.
+        sequencer.record(payload.camera_id, payload.seq)
     return {"status": "success", "message": f"Updated locations for {len(payload.detections)} buses."}
 
 
+@app.post("/api/detections/delta")
+async def receive_detection_delta(payload: DeltaPayload = Depends(upload_body(DeltaPayload))):
+    """
+    Receives only what changed for a camera since its last accepted upload.
+    A delta is rejected with 409 unless its base_seq matches the last sequence
+    applied for that camera, in which case the engine resends a full snapshot.
+    An empty delta is a heartbeat and never touches the database.
+    """
+    await ensure_status_loaded()
+    async with sequencer.async_camera(payload.camera_id):
+        if not sequencer.accepts_delta(payload.camera_id, payload.seq, payload.base_seq):
+            raise HTTPException(
+                status_code=409,
+                detail={"expected_base_seq": sequencer.last_seq(payload.camera_id)},
+            )
+        if payload.upserts or payload.removals:
+            await refresh_layout(payload.camera_id, [d.spot_id for d in payload.upserts])
+            depot_id = status_snapshot.depot_for(payload.camera_id)
+            await write_locations(
+                crud.apply_camera_delta, payload.camera_id, payload.upserts, payload.removals, depot_id,
+            )
+            spot_to_bus = crud.spot_map(payload.upserts)
+            changes = status_snapshot.apply_delta(payload.camera_id, spot_to_bus, payload.removals)
+            if location_writer.enabled:
+                location_writer.stage(payload.camera_id, depot_id, spot_to_bus, changes)
+            bus_index.record(payload.camera_id, changes, spot_to_bus)
+            on_state_changes(changes)
+        sequencer.record(payload.camera_id, payload.seq)
+
+    return {"status": "success", "seq": payload.seq}
+
+
 @app.get("/api/status")
-def get_parking_status(db: Session = Depends(get_db)):
+async def get_parking_status(request: Request):
     """
     Provides the complete, current status of all parking spots to the frontend.
+    The body is served from the in-memory snapshot; clients that send back the
+    ETag they already have get an empty 304 until something changes.
+
+    The Accept header picks the format (see wire.py): the JSON list by
+    default, or one of the compact forms that list only each spot's bus in
+    /api/layout order. Large bodies are gzipped for clients that accept it.
+    """
+    await ensure_status_loaded()
+    media_type = wire.negotiate(request.headers.get("accept"))
+    compress = wire.accepts_gzip(request.headers.get("accept-encoding"))
+    etag, body, gzipped = status_snapshot.render(media_type, compress)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/layout")
+async def get_layout(request: Request):
     """
-    all_spots = db.query(models.Spot).all()
-    bus_locations = db.query(models.BusLocation).all()
-
-    location_map = {loc.spot_id: loc.detected_bus_id for loc in bus_locations}
-    
-    status_data = []
-    for spot in all_spots:
-        status_data.append({
-            "spotId": spot.spot_id,
-            "actualBus": location_map.get(spot.spot_id), # Returns the bus number or None if empty
-            "cameraId": spot.camera_id,
-            "coordinates": spot.coordinates_json,
-        })
-        
-    return status_data
+    Every spot with its camera, depot and geometry, in the order the compact
+    status and upload formats number them. It only changes when the spots
+    table does, so clients cache it and revalidate with the ETag.
+    """
+    await ensure_status_loaded()
+    etag, body = status_snapshot.layout()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/status/owned")
+async def get_owned_status():
+    """
+    The status of the spots whose cameras this replica owns; this is the part
+    of the status each shard is authoritative for.
+    """
+    await ensure_status_loaded()
+    return status_snapshot.status_for_cameras(sharding.owns)
+
+
+@app.get("/api/status/global")
+async def get_global_status():
+    """
+    Status across every shard and depot: the owned spots of each replica
+    merged, with occupancy per depot and which shards answered.
+    """
+    await ensure_status_loaded()
+    return await sharding.gather_status(lambda: status_snapshot.status_for_cameras(sharding.owns))
+
+
+@app.get("/api/status/stream")
+async def stream_parking_status():
+    """
+    Server-sent events stream of the parking status. A "snapshot" event with the
+    full status list is sent on connect, followed by "spots" events that list
+    only the spots whose bus changed since the previous event.
+    """
+    await ensure_status_loaded()
+
+    async def event_stream():
+        # Subscribe before taking the snapshot so no change can fall in between.
+        subscriber = broadcaster.subscribe()
+        try:
+            _, body, _ = status_snapshot.render()
+            yield b"event: snapshot\ndata: " + body + b"\n\n"
+            while True:
+                try:
+                    batch = await asyncio.wait_for(
+                        subscriber.next_batch(STREAM_COALESCE_SECONDS), STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                spots = [
+                    {"spotId": c.spot_id, "actualBus": c.new_bus, "cameraId": c.camera_id}
+                    for c in batch.values()
+                ]
+                yield f"event: spots\ndata: {json.dumps(spots)}\n\n".encode("utf-8")
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/buses")
+async def search_buses(prefix: str = "", limit: int = 20):
+    """Buses whose number starts with `prefix` (all buses, in order, if empty)."""
+    await ensure_status_loaded()
+    return bus_index.search(prefix, max(1, min(limit, 200)))
+
+
+@app.get("/api/buses/{bus_number}")
+async def get_bus(bus_number: str):
+    """
+    Where a bus is now: its spot and camera and when an upload last reported
+    it. A bus that has left since this process started is returned with
+    parked false and the spot it was last seen in.
+    """
+    await ensure_status_loaded()
+    entry = bus_index.get(bus_number)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Bus {bus_number} has not been seen.")
+    return entry
+
+
+@app.get("/api/history/buses/{bus_id}")
+def get_bus_history(bus_id: str, at: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    """
+    Where a bus was parked at time `at` (ISO 8601, default now; a time without
+    a zone is taken as UTC). spotId is null if the bus was not in a spot then.
+    """
+    at = history.utc(at) or datetime.now(timezone.utc)
+    return history.bus_location_at(db, bus_id, at)
+
+
+@app.get("/api/history/spots/{spot_id}")
+def get_spot_history(
+    spot_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Which buses occupied a spot between `start` and `end` (default: the last
+    24 hours), as intervals clipped to the range, with the occupied fraction.
+    """
+    end = history.utc(end) or datetime.now(timezone.utc)
+    start = history.utc(start) or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    return history.spot_occupancy(db, spot_id, start, end)
+
+
+ANALYTICS_DEFAULT_SPAN = {"minute": timedelta(hours=1), "hour": timedelta(days=1), "day": timedelta(days=30)}
+# Keeps a single request from summing an unbounded number of buckets.
+ANALYTICS_MAX_BUCKETS = 5000
+
+
+@app.get("/api/analytics/utilization")
+def get_utilization(
+    granularity: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    spot_id: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Occupied fraction of the yard (or of one spot) per minute, hour or day
+    bucket. Defaults to the last hour, day or 30 days respectively.
+    """
+    if granularity not in analytics.GRANULARITIES:
+        raise HTTPException(status_code=422, detail=f"granularity must be one of {list(analytics.GRANULARITIES)}")
+    start, end = _analytics_range(start, end, ANALYTICS_DEFAULT_SPAN[granularity])
+    if (end - start).total_seconds() / analytics.GRANULARITIES[granularity] > ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(status_code=422, detail="range too long for this granularity")
+    return analytics_cache.get(
+        ("utilization", granularity, start, end, spot_id),
+        lambda: analytics.utilization(db, granularity, start, end, spot_id, analytics.spot_count(db)),
+    )
+
+
+@app.get("/api/analytics/dwell")
+def get_dwell(start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    """Average dwell per bus visit, yard-wide and per spot (default: last 7 days)."""
+    start, end = _analytics_range(start, end, timedelta(days=7))
+    return analytics_cache.get(("dwell", start, end), lambda: analytics.dwell(db, start, end))
+
+
+@app.get("/api/analytics/peak-hours")
+def get_peak_hours(start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    """Average occupied spots per hour of day (UTC) and the peak hour (default: last 7 days)."""
+    start, end = _analytics_range(start, end, timedelta(days=7))
+    return analytics_cache.get(("peak-hours", start, end), lambda: analytics.peak_hours(db, start, end))
+
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving; says nothing about the database."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """
+    200 once the warm-up finished and detection writes are reaching the
+    database, 503 (with what is still pending) otherwise, so load balancers
+    only route to replicas that can serve.
+    """
+    body = {"warmup": warmup.status(), "write_staleness": round(location_writer.staleness(), 3)}
+    ready = warmup.ready and location_writer.staleness() <= location_writer.max_staleness
+    return Response(content=json.dumps({"ready": ready, **body}), status_code=200 if ready else 503,
+                    media_type="application/json")
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = metrics.metrics_response()
+    return Response(content=body, media_type=content_type)
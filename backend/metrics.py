@@ -0,0 +1,158 @@
+# backend/metrics.py
+#
+# Prometheus metrics for the API, served at /metrics:
+#   - request latency per endpoint (route template, method and status), timed
+#     to the start of the response so long-lived streams count their setup only
+#   - database statements and their durations, from SQLAlchemy cursor events
+#   - live dashboard stream subscribers
+# Optionally, a sampled fraction of requests (NJT_TRACE_SAMPLE_RATE, 0..1) is
+# logged as a span: the request's route, status, duration and every database
+# statement it ran. Log lines are JSON and rate limited per message so a busy
+# endpoint cannot flood the log.
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+TRACE_SAMPLE_RATE = float(os.environ.get("NJT_TRACE_SAMPLE_RATE", "0"))
+
+REQUEST_SECONDS = Histogram(
+    "njt_http_request_duration_seconds",
+    "Time from receiving a request until its response starts.",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+DB_STATEMENTS = Counter("njt_db_statements_total", "SQL statements executed.", ["operation"])
+DB_STATEMENT_SECONDS = Histogram(
+    "njt_db_statement_duration_seconds",
+    "SQL statement execution time.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+STREAM_SUBSCRIBERS = Gauge("njt_stream_subscribers", "Connected /api/status/stream clients.")
+WRITE_BEHIND_PENDING = Gauge("njt_write_behind_pending_spots", "Spot states acknowledged but not yet written.")
+WRITE_BEHIND_STALENESS = Gauge("njt_write_behind_staleness_seconds", "Age of the oldest acknowledged, unwritten spot state.")
+
+# The statements of the request being traced, if it was sampled.
+_trace_statements = contextvars.ContextVar("trace_statements", default=None)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets each distinct message template through at most `per_interval` times
+    per `interval` seconds. The first record after a quiet period reports how
+    many were suppressed in between.
+    """
+
+    def __init__(self, per_interval=5, interval=10.0):
+        super().__init__()
+        self.per_interval = per_interval
+        self.interval = interval
+        self._windows = {}  # msg template -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(record.msg, [now, 0, 0])
+            if now - window[0] >= self.interval:
+                if window[2]:
+                    record.suppressed = window[2]
+                window[:] = [now, 0, 0]
+            if window[1] >= self.per_interval:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        return json.dumps(entry)
+
+
+def get_logger(name):
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+logger = get_logger("njt.api")
+
+
+def _operation(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+
+def instrument_engine(engine):
+    """Counts and times every statement run through `engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        operation = _operation(statement)
+        DB_STATEMENTS.labels(operation).inc()
+        DB_STATEMENT_SECONDS.labels(operation).observe(seconds)
+        statements = _trace_statements.get()
+        if statements is not None:
+            statements.append({"sql": statement[:200], "ms": round(seconds * 1000, 3)})
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        statements = [] if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE else None
+        token = _trace_statements.set(statements)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                # Routing has run by now, so the matched route template is known;
+                # unmatched paths are grouped rather than exploding the labels.
+                route = getattr(scope.get("route"), "path", "unmatched")
+                seconds = time.perf_counter() - start
+                REQUEST_SECONDS.labels(scope["method"], route, message["status"]).observe(seconds)
+                if statements is not None:
+                    logger.info("trace", extra={"fields": {
+                        "method": scope["method"], "route": route, "status": message["status"],
+                        "ms": round(seconds * 1000, 3), "statements": statements,
+                    }})
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _trace_statements.reset(token)
+
+
+def metrics_response():
+    """(body, content type) of the current metrics in the Prometheus text format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,79 @@
+# backend/migrate.py
+#
+# Schema setup and upgrades. Creating tables used to happen when backend.main
+# was imported, which made every replica start with a round of DDL. Now it is
+# a step of its own, run once per deploy:
+#
+#   python -m backend.migrate
+#
+# or by the backend's startup warm-up when NJT_MIGRATE_ON_STARTUP is not "0"
+# (the default, so a plain `uvicorn backend.main:app` still works on an empty
+# database). Every step is idempotent:
+#   - tables that do not exist yet are created (models.Base.metadata.create_all)
+#   - columns added to existing tables since they were created are added with
+#     ALTER TABLE (depot_id on spots and bus_locations, from before depots)
+#   - the monthly occupancy_events partitions are created (PostgreSQL only)
+
+import time
+from typing import List
+
+from sqlalchemy import inspect, text
+
+from . import history, metrics, models
+
+logger = metrics.get_logger("njt.migrate")
+
+# Columns added to tables after they first shipped; type, server default,
+# nullability and index are taken from the model.
+ADDED_COLUMNS = [
+    ("spots", models.Spot.__table__.c.depot_id),
+    ("bus_locations", models.BusLocation.__table__.c.depot_id),
+]
+
+
+def add_missing_columns(engine) -> List[str]:
+    """Adds the ADDED_COLUMNS that existing tables lack; returns "table.column" for each one added."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table, column in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            if column.name in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            default = column.server_default.arg if column.server_default is not None else None
+            ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}"
+            if default is not None:
+                # Existing rows take the default, so the column can be NOT NULL right away.
+                ddl += f" DEFAULT '{default}'"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+            for index in column.table.indexes:
+                if list(index.columns) == [column]:
+                    index.create(conn, checkfirst=True)
+            added.append(f"{table}.{column.name}")
+    return added
+
+
+def run(engine) -> dict:
+    """Brings the schema up to date; returns what was done."""
+    started = time.perf_counter()
+    models.Base.metadata.create_all(bind=engine)
+    added = add_missing_columns(engine)
+    partitions = history.ensure_partitions(engine)
+    summary = {"columns_added": added, "partitions_created": partitions,
+               "seconds": round(time.perf_counter() - started, 3)}
+    logger.info("schema up to date", extra={"fields": summary})
+    return summary
+
+
+def main():
+    from . import database
+
+    run(database.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, JSON, DateTime
+from sqlalchemy import Column, Float, Index, Integer, String, JSON, DateTime
 from sqlalchemy.sql import func
 from .database import Base
 
+# Depot of rows written before depots existed, and of single-garage setups.
+DEFAULT_DEPOT = "default"
+
 class Spot(Base):
     """
     Defines the physical parking spots in the garage.
@@ -14,6 +17,7 @@ class Spot(Base):
     id = Column(Integer, primary_key=True, index=True)
     spot_id = Column(String, unique=True, index=True, nullable=False) # e.g., "A1"
     camera_id = Column(String, nullable=False) # e.g., "cam_main_01"
+    depot_id = Column(String, nullable=False, index=True, default=DEFAULT_DEPOT, server_default=DEFAULT_DEPOT) # e.g., "newark"
     coordinates_json = Column(JSON, nullable=True) # For frontend overlays
 
 class BusLocation(Base):
@@ -27,4 +31,48 @@ class BusLocation(Base):
     spot_id = Column(String, unique=True, index=True, nullable=False) # Each spot has only one current location entry
     detected_bus_id = Column(String, nullable=False) # The bus number the AI read
     camera_id = Column(String, nullable=False)
+    depot_id = Column(String, nullable=False, index=True, default=DEFAULT_DEPOT, server_default=DEFAULT_DEPOT)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class OccupancyEvent(Base):
+    """
+    Append-only log of spot transitions, written in batches by history.EventLog.
+    A bus arriving at or departing from a spot is one row. A bus that changes
+    spots within one camera upload is a "depart" at the old spot plus a "move"
+    at the new one (from_spot_id says where it came from).
+
+    On PostgreSQL the table is range-partitioned by month on ts (partitions are
+    created by history.ensure_partitions), so retention drops whole partitions.
+    The primary key (spot_id, ts, kind) includes the partition key and serves
+    the per-spot time-range queries; ix_occupancy_events_bus_ts serves the
+    per-bus lookups.
+    """
+    __tablename__ = "occupancy_events"
+    __table_args__ = (
+        Index("ix_occupancy_events_bus_ts", "bus_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    spot_id = Column(String, primary_key=True)
+    ts = Column(DateTime(timezone=True), primary_key=True)
+    kind = Column(String(8), primary_key=True) # "arrive", "depart" or "move"
+    bus_id = Column(String, nullable=False)
+    camera_id = Column(String, nullable=False)
+    from_spot_id = Column(String, nullable=True) # Previous spot, for "move"
+
+class OccupancyRollup(Base):
+    """
+    Occupancy totals per spot per minute, hour and day, kept up to date by
+    analytics.RollupTracker as transitions are logged. Utilization, dwell and
+    peak-hour queries sum these rows instead of replaying the event history.
+    """
+    __tablename__ = "occupancy_rollups"
+    __table_args__ = (Index("ix_occupancy_rollups_granularity_bucket", "granularity", "bucket_start"),)
+
+    spot_id = Column(String, primary_key=True)
+    granularity = Column(String(6), primary_key=True) # "minute", "hour" or "day"
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    occupied_seconds = Column(Float, nullable=False, default=0.0)
+    arrivals = Column(Integer, nullable=False, default=0)
+    departures = Column(Integer, nullable=False, default=0)
+    dwell_seconds = Column(Float, nullable=False, default=0.0) # Total dwell of the departures in this bucket
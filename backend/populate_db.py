@@ -1,32 +1,36 @@
 # backend/populate_db.py
 
 # This is a one-time script to add the permanent parking spot data to the database.
+# Run it once per depot/camera, e.g.:
+#   python backend/populate_db.py --depot newark --camera cam_newark_01 --spots NWK-A1 NWK-A2
+# Spot ids must be unique across all depots.
+import argparse
 import sys
 import os
 from sqlalchemy.orm import Session
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from backend import models, database
+from backend import models, database, migrate
 
-def populate_spots(db: Session):
+# --- Define Your Parking Spots Here ---
+# This list now matches your 8-spot parking lot design.
+DEFAULT_SPOTS = [
+    'A1', 'A2',
+    'B1', 'B2', 'B3',
+]
+DEFAULT_CAMERA = "cam_main_01"
+
+def populate_spots(db: Session, spots_to_add=DEFAULT_SPOTS, camera_id=DEFAULT_CAMERA, depot_id=models.DEFAULT_DEPOT):
     """
-    Adds the predefined list of parking spots to the database.
+    Adds the given parking spots, all watched by `camera_id` in `depot_id`, to the database.
     """
-    # --- Define Your Parking Spots Here ---
-    # This list now matches your 8-spot parking lot design.
-    spots_to_add = [
-        'A1', 'A2',
-        'B1', 'B2', 'B3', 
-    ]
-
-    camera_id_for_all = "cam_main_01"
-
     for spot_id in spots_to_add:
         # Check if the spot already exists to avoid duplicates
         existing_spot = db.query(models.Spot).filter(models.Spot.spot_id == spot_id).first()
         if not existing_spot:
             new_spot = models.Spot(
                 spot_id=spot_id,
-                camera_id=camera_id_for_all
+                camera_id=camera_id,
+                depot_id=depot_id,
                 # Note: coordinates_json can be added later or manually in pgAdmin
             )
             db.add(new_spot)
@@ -38,16 +42,22 @@ def populate_spots(db: Session):
     print("Database population complete.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add parking spots to the database.")
+    parser.add_argument("--depot", default=models.DEFAULT_DEPOT, help="depot the spots belong to")
+    parser.add_argument("--camera", default=DEFAULT_CAMERA, help="camera that watches the spots")
+    parser.add_argument("--spots", nargs="+", default=DEFAULT_SPOTS, help="spot ids to add")
+    args = parser.parse_args()
+
     print("Connecting to the database...")
     # Get a database session
     db = database.SessionLocal()
     try:
-        # Create the tables if they don't exist
-        print("Creating tables if they don't exist...")
-        models.Base.metadata.create_all(bind=database.engine)
+        # Create the tables if they don't exist, and bring older ones up to date
+        print("Updating the database schema...")
+        migrate.run(database.engine)
         # Populate the spots table
         print("Populating spots...")
-        populate_spots(db)
+        populate_spots(db, args.spots, args.camera, args.depot)
     finally:
         # Close the session
         db.close()
@@ -0,0 +1,50 @@
+# backend/sequencing.py
+#
+# Keeps the last applied sequence number per camera so delta uploads can be
+# checked against the state they were computed from. This lives in process
+# memory on purpose: after a restart every camera's first delta is rejected and
+# the detection engine answers by resending a full snapshot.
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class CameraSequencer:
+    def __init__(self):
+        self._sequences: Dict[str, Optional[int]] = {}
+        self._async_locks: Dict[str, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def async_camera(self, camera_id: str):
+        """
+        Serializes check-and-apply for one camera across concurrent requests
+        on the event loop, without blocking the loop while waiting.
+        """
+        lock = self._async_locks.get(camera_id)
+        if lock is None:
+            lock = self._async_locks.setdefault(camera_id, asyncio.Lock())
+        async with lock:
+            yield
+
+    def last_seq(self, camera_id: str) -> Optional[int]:
+        return self._sequences.get(camera_id)
+
+    def accepts_delta(self, camera_id: str, seq: int, base_seq: int) -> bool:
+        """A delta applies only on top of exactly the state the backend holds."""
+        last = self._sequences.get(camera_id)
+        return last is not None and base_seq == last and seq > last
+
+    def accepts_snapshot(self, camera_id: str, seq: Optional[int]) -> bool:
+        """
+        A full snapshot replaces the camera's state unless it is older than
+        what was applied last (a late retry overtaken by newer uploads).
+        Snapshots without a seq carry no order and are always applied.
+        """
+        last = self._sequences.get(camera_id)
+        return seq is None or last is None or seq >= last
+
+    def record(self, camera_id: str, seq: Optional[int]) -> None:
+        """Remembers `seq` as the camera's last applied sequence; None keeps the current one."""
+        if seq is not None:
+            self._sequences[camera_id] = seq
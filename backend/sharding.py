@@ -0,0 +1,90 @@
+# backend/sharding.py
+#
+# Camera-to-shard routing for running several backend replicas. Every camera
+# has exactly one owner replica, chosen by crc32(camera_id) % number of
+# shards, so one camera's snapshots and deltas are always applied, sequenced
+# and cached by the same process. A replica that receives a detection upload
+# for a camera it does not own answers 307 with the owner's URL; clients that
+# know the shard list can route directly with shard_for().
+#
+# Configuration (environment):
+#   NJT_SHARDS       comma-separated base URLs of all replicas, in shard order
+#                    (e.g. "http://10.0.0.5:8000,http://10.0.0.6:8000");
+#                    unset or one URL means a single process owning everything
+#   NJT_SHARD_INDEX  this replica's position in NJT_SHARDS
+#
+# Replicas can share one database or each use their own; either way a
+# replica's in-memory status is authoritative only for the cameras it owns,
+# which is what the cross-shard status view (gather_status) relies on.
+
+import asyncio
+import os
+import zlib
+from typing import Callable, List, Optional
+
+SHARD_URLS = [url.strip().rstrip("/") for url in os.environ.get("NJT_SHARDS", "").split(",") if url.strip()]
+SHARD_INDEX = int(os.environ.get("NJT_SHARD_INDEX", "0"))
+# Seconds to wait for each shard in the cross-shard status view.
+GATHER_TIMEOUT = float(os.environ.get("NJT_SHARD_TIMEOUT", "2.0"))
+
+
+def shard_for(camera_id: str, shards: int) -> int:
+    """The index of the shard that owns `camera_id` among `shards` replicas."""
+    return zlib.crc32(camera_id.encode("utf-8")) % shards
+
+
+def sharded() -> bool:
+    return len(SHARD_URLS) > 1
+
+
+def owns(camera_id: str) -> bool:
+    """Whether this replica applies uploads for `camera_id`."""
+    return not sharded() or shard_for(camera_id, len(SHARD_URLS)) == SHARD_INDEX
+
+
+def owner_url(camera_id: str) -> Optional[str]:
+    """Base URL of the replica that owns `camera_id`, or None if it is this one."""
+    if owns(camera_id):
+        return None
+    return SHARD_URLS[shard_for(camera_id, len(SHARD_URLS))]
+
+
+async def gather_status(local: Callable[[], List[dict]], path="/api/status/owned") -> dict:
+    """
+    Merges the owned-camera status of every shard into one view. `local`
+    returns this replica's own part without an HTTP round trip. Shards that do
+    not answer within GATHER_TIMEOUT are listed as unavailable and their spots
+    are missing from the result.
+    """
+    shards = [{"shard": i, "url": url} for i, url in enumerate(SHARD_URLS)] or [{"shard": 0, "url": None}]
+
+    async def fetch(client, shard):
+        if shard["shard"] == SHARD_INDEX:
+            return local()
+        response = await client.get(shard["url"] + path, timeout=GATHER_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    # Only sharded deployments and the global view need an HTTP client; keep
+    # its import off every replica's startup path.
+    import httpx
+
+    async with httpx.AsyncClient() as client:
+        results = await asyncio.gather(*(fetch(client, shard) for shard in shards), return_exceptions=True)
+
+    spots = []
+    for shard, result in zip(shards, results):
+        shard["ok"] = not isinstance(result, BaseException)
+        if shard["ok"]:
+            shard["spots"] = len(result)
+            spots.extend(result)
+        else:
+            shard["error"] = str(result)[:200] or type(result).__name__
+    spots.sort(key=lambda spot: (spot["depotId"], spot["spotId"]))
+
+    depots = {}
+    for spot in spots:
+        depot = depots.setdefault(spot["depotId"], {"spots": 0, "occupied": 0})
+        depot["spots"] += 1
+        depot["occupied"] += spot["actualBus"] is not None
+    return {"spots": spots, "depots": depots, "shards": shards}
@@ -0,0 +1,83 @@
+# backend/startup.py
+#
+# Background warm-up, so a new replica starts answering right away instead of
+# after seconds of schema checks and cache loading. The process serves
+# /health/live as soon as it is up; the warm-up steps (migrations, loading the
+# rollup state, the status snapshot and the bus index) run in order on the
+# threadpool, and /health/ready only answers 200 once they all finished.
+# A failing step (typically the database not being reachable yet) is logged
+# and retried until it succeeds, whatever it raised, so readiness never gets
+# stuck on a task that died. Requests that need the warmed state wait for it up to a
+# timeout and are answered 503 after that.
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from . import metrics
+
+logger = metrics.get_logger("njt.startup")
+
+
+class Warmup:
+    def __init__(self, steps: List[Tuple[str, Callable[[], object]]], retry_seconds=2.0):
+        self.steps = steps
+        self.retry_seconds = retry_seconds
+        self.completed: List[str] = []
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.seconds is not None
+
+    def start(self) -> None:
+        """Starts the steps in the background; calling it again does nothing."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def wait(self, timeout: float) -> None:
+        """Returns once warm-up finished; raises asyncio.TimeoutError after `timeout` seconds."""
+        if self.ready:
+            return
+        self.start()
+        await asyncio.wait_for(asyncio.shield(self._task), timeout)
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "completed": list(self.completed),
+            "pending": [name for name, _ in self.steps if name not in self.completed],
+            "error": self.error,
+            "seconds": self.seconds,
+        }
+
+    async def _run(self):
+        started = time.perf_counter()
+        for name, step in self.steps:
+            while True:
+                try:
+                    await run_in_threadpool(step)
+                    break
+                except Exception as exc:
+                    self.error = f"{name}: {type(exc).__name__}: {str(exc)[:200]}"
+                    logger.warning("warm-up step failed, retrying", extra={"fields": {
+                        "step": name, "error": str(exc)[:200], "type": type(exc).__name__,
+                        "retry_seconds": self.retry_seconds,
+                    }})
+                    await asyncio.sleep(self.retry_seconds)
+            self.completed.append(name)
+        self.error = None
+        self.seconds = round(time.perf_counter() - started, 3)
+        logger.info("warm-up finished", extra={"fields": {"steps": self.completed, "seconds": self.seconds}})
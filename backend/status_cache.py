@@ -0,0 +1,243 @@
+# backend/status_cache.py
+#
+# An in-memory, versioned copy of what GET /api/status returns. It is loaded
+# from the database once, then kept current by the detection endpoints, so
+# dashboard polls are served from a pre-serialized body without touching the
+# database. The version (and with it the ETag) only changes when a spot's bus
+# actually changes.
+#
+# The static part (spot ids, cameras, depots and geometry) is served apart as
+# the layout (GET /api/layout), whose version is a checksum of its content, so
+# clients can cache it across restarts and the compact status formats in
+# wire.py can refer to spots by their position in it.
+# Spots are added by a separate process (populate_db.py), so the layout is
+# reloaded when an upload names a spot it does not know yet (see
+# claim_layout_reload), at most once per `min_interval`.
+
+import gzip
+import json
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+from . import models, wire
+
+# Rendered bodies smaller than this are never compressed.
+GZIP_MIN_BYTES = 1000
+
+_ETAG_KINDS = {wire.JSON: "", wire.COMPACT_JSON: "-c", wire.MSGPACK: "-m", wire.PACKED: "-p"}
+
+
+class SpotChange(NamedTuple):
+    """One spot whose bus changed; a None bus means the spot is empty."""
+    spot_id: str
+    camera_id: str
+    old_bus: Optional[str]
+    new_bus: Optional[str]
+
+
+class StatusSnapshot:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Layout comes from the spots table; reloaded when uploads name new spots.
+        self._spots: List[dict] = []
+        self._known_spots: set = set()
+        self._loaded_at = float("-inf")
+        self._camera_spots: Dict[str, set] = {}
+        self._camera_depots: Dict[str, str] = {}
+        # spot_id -> bus number for every occupied spot.
+        self._occupancy: Dict[str, str] = {}
+        self._version = 0
+        # A per-process prefix keeps ETags from a previous run from matching.
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._spot_ids: List[str] = []
+        self._layout_version = 0
+        self._layout_body = b'{"version":0,"spots":[]}'
+        # (media_type, gzip) -> body, for the version in _rendered_version.
+        self._rendered_version = -1
+        self._bodies: Dict[tuple, bytes] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, session_factory) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            db = session_factory()
+            try:
+                self._load(db)
+            finally:
+                db.close()
+
+    def _load(self, db) -> None:
+        self._set_layout(db.query(models.Spot).all())
+        self._occupancy = {
+            loc.spot_id: loc.detected_bus_id for loc in db.query(models.BusLocation).all()
+        }
+        self._version += 1
+        self._loaded = True
+
+    def _set_layout(self, spots) -> None:
+        self._spots = [
+            {"spotId": s.spot_id, "cameraId": s.camera_id, "depotId": s.depot_id, "coordinates": s.coordinates_json}
+            for s in spots
+        ]
+        self._spot_ids = [spot["spotId"] for spot in self._spots]
+        self._known_spots = set(self._spot_ids)
+        self._loaded_at = time.monotonic()
+        layout = json.dumps(self._spots, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        self._layout_version = zlib.crc32(layout)
+        self._layout_body = json.dumps(
+            {"version": self._layout_version, "spots": self._spots}, separators=(",", ":"),
+        ).encode("utf-8")
+        self._camera_spots = {}
+        self._camera_depots = {}
+        for s in spots:
+            self._camera_spots.setdefault(s.camera_id, set()).add(s.spot_id)
+            self._camera_depots[s.camera_id] = s.depot_id
+
+    def invalidate(self) -> None:
+        """Forces a reload on next use, e.g. after spots were added to the DB."""
+        with self._lock:
+            self._loaded = False
+
+    def claim_layout_reload(self, spot_ids, min_interval: float) -> bool:
+        """
+        True if any of `spot_ids` is missing from the layout and the layout
+        was last read at least `min_interval` seconds ago, so an engine
+        configured with a spot that never gets added cannot make every upload
+        reload. A True answer counts as a reload: concurrent uploads naming
+        the same spot get False until `min_interval` passed again.
+        """
+        with self._lock:
+            if not self._loaded or time.monotonic() - self._loaded_at < min_interval:
+                return False
+            if all(spot_id in self._known_spots for spot_id in spot_ids):
+                return False
+            self._loaded_at = time.monotonic()
+            return True
+
+    def reload_layout(self, session_factory) -> None:
+        """
+        Re-reads the spots table. Occupancy stays as it is in memory: it
+        already holds every applied upload (including ones for spots the old
+        layout lacked), while the database may lag behind it.
+        """
+        db = session_factory()
+        try:
+            spots = db.query(models.Spot).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._set_layout(spots)
+            self._version += 1
+
+    def _set(self, spot_id, camera_id, bus, changes) -> None:
+        old_bus = self._occupancy.get(spot_id)
+        if old_bus == bus:
+            return
+        if bus is None:
+            del self._occupancy[spot_id]
+        else:
+            self._occupancy[spot_id] = bus
+        changes.append(SpotChange(spot_id, camera_id, old_bus, bus))
+
+    def apply_snapshot(self, camera_id: str, spot_to_bus: Dict[str, str]) -> List[SpotChange]:
+        """Mirrors crud.apply_camera_snapshot and returns what changed."""
+        changes: List[SpotChange] = []
+        with self._lock:
+            for spot_id in self._camera_spots.get(camera_id, ()):
+                if spot_id not in spot_to_bus:
+                    self._set(spot_id, camera_id, None, changes)
+            for spot_id, bus in spot_to_bus.items():
+                self._set(spot_id, camera_id, bus, changes)
+            if changes:
+                self._version += 1
+        return changes
+
+    def apply_delta(self, camera_id: str, spot_to_bus: Dict[str, str], removals) -> List[SpotChange]:
+        """Mirrors crud.apply_camera_delta and returns what changed."""
+        changes: List[SpotChange] = []
+        with self._lock:
+            camera_spots = self._camera_spots.get(camera_id, ())
+            for spot_id in removals:
+                # A camera can only empty its own spots.
+                if spot_id not in spot_to_bus and spot_id in camera_spots:
+                    self._set(spot_id, camera_id, None, changes)
+            for spot_id, bus in spot_to_bus.items():
+                self._set(spot_id, camera_id, bus, changes)
+            if changes:
+                self._version += 1
+        return changes
+
+    def depot_for(self, camera_id: str) -> str:
+        """The depot a camera's spots belong to."""
+        return self._camera_depots.get(camera_id, models.DEFAULT_DEPOT)
+
+    @property
+    def layout_version(self) -> int:
+        return self._layout_version
+
+    @property
+    def spot_ids(self) -> List[str]:
+        """Spot ids in layout order; index i is spot number i in compact payloads."""
+        return self._spot_ids
+
+    def layout(self):
+        """Returns (etag, body) of the layout: every spot with its camera, depot and geometry."""
+        with self._lock:
+            return f'"layout-{self._layout_version:08x}"', self._layout_body
+
+    def _status(self, spots):
+        # Geometry is only in the layout; status entries carry what changes.
+        return [
+            {
+                "spotId": spot["spotId"],
+                "actualBus": self._occupancy.get(spot["spotId"]), # None if empty
+                "cameraId": spot["cameraId"],
+                "depotId": spot["depotId"],
+            }
+            for spot in spots
+        ]
+
+    def status_for_cameras(self, include) -> List[dict]:
+        """The status entries of the spots whose camera passes `include(camera_id)`."""
+        with self._lock:
+            return self._status([spot for spot in self._spots if include(spot["cameraId"])])
+
+    def _encode(self, media_type):
+        if media_type == wire.JSON:
+            return json.dumps(self._status(self._spots)).encode("utf-8")
+        buses = [self._occupancy.get(spot_id) for spot_id in self._spot_ids]
+        return wire.encode_status(media_type, self._layout_version, buses)
+
+    def render(self, media_type=wire.JSON, compress=False):
+        """
+        Returns (etag, body, gzipped) for the current version in one of the
+        wire.py status formats, serializing (and compressing) each at most once
+        per version. Bodies under GZIP_MIN_BYTES are never compressed.
+        """
+        with self._lock:
+            if self._rendered_version != self._version:
+                self._bodies = {}
+                self._rendered_version = self._version
+            rendered = self._bodies.get((media_type, compress))
+            if rendered is None:
+                plain = self._bodies.get((media_type, False))
+                if plain is None:
+                    plain = self._bodies[(media_type, False)] = (self._encode(media_type), False)
+                rendered = plain
+                if compress and len(plain[0]) >= GZIP_MIN_BYTES:
+                    rendered = (gzip.compress(plain[0], compresslevel=6, mtime=0), True)
+                self._bodies[(media_type, compress)] = rendered
+            body, gzipped = rendered
+            # Every representation gets its own ETag.
+            tag = f"{self._boot_id}-{self._version}{_ETAG_KINDS[media_type]}{'-gz' if gzipped else ''}"
+            return f'"{tag}"', body, gzipped
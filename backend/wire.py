@@ -0,0 +1,188 @@
+# backend/wire.py
+#
+# Compact encodings for the two hot payloads: the parking status the
+# dashboards fetch and the detection uploads the engines send.
+#
+# Spot ids are interned to small integers: a spot's number is its position in
+# the layout served by GET /api/layout, which also carries the static spot
+# geometry and is cacheable until the spots table changes. Every compact
+# payload names the layout version it was built against.
+#
+# Status (GET /api/status, chosen by the Accept header):
+#   application/json                   [{spotId, actualBus, cameraId, depotId}, ...]
+#   application/vnd.njt.compact+json   {"layout": version, "buses": [bus or null per spot]}
+#   application/x-msgpack              the same object as msgpack
+#   application/vnd.njt.packed         "NJT1", u32 layout version, u32 spot count,
+#                                      then per spot a u8 length and that many
+#                                      UTF-8 bytes of bus number (0 = empty)
+# Large responses are also gzip-compressed when the client accepts it.
+#
+# Uploads (POST /api/detections[/delta]) may be sent as application/x-msgpack
+# with the JSON payload's fields, "layout" set, and each detection as a
+# [spot, bus_number] pair; spots and removals are layout indices, or strings
+# for spots the layout does not have yet.
+#
+# msgpack is optional; without it only the JSON and packed formats are offered.
+
+import json
+import struct
+from typing import List, Optional, Sequence
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COMPACT_JSON = "application/vnd.njt.compact+json"
+MSGPACK = "application/x-msgpack"
+PACKED = "application/vnd.njt.packed"
+
+PACKED_MAGIC = b"NJT1"
+_PACKED_HEADER = struct.Struct("<4sII")
+
+
+class LayoutMismatch(ValueError):
+    """A compact upload was built against a different layout version."""
+
+
+def status_formats() -> List[str]:
+    return [JSON, COMPACT_JSON, PACKED] + ([MSGPACK] if msgpack is not None else [])
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """The status format to answer an Accept header with; JSON unless another is asked for."""
+    if not accept:
+        return JSON
+    offered = status_formats()
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.strip().lower()
+        # Ties keep the earlier entry, so the client's order breaks them.
+        if media_type in offered and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    return bool(accept_encoding) and any(
+        part.strip().split(";")[0] in ("gzip", "*") and not part.strip().endswith("q=0")
+        for part in accept_encoding.split(",")
+    )
+
+
+def encode_status(media_type: str, layout_version: int, buses: Sequence[Optional[str]]) -> bytes:
+    """Status in one of the compact formats; `buses` lists each spot's bus in layout order."""
+    if media_type == PACKED:
+        return pack_status(layout_version, buses)
+    compact = {"layout": layout_version, "buses": list(buses)}
+    if media_type == MSGPACK:
+        return msgpack.packb(compact)
+    return json.dumps(compact, separators=(",", ":")).encode("utf-8")
+
+
+def pack_status(layout_version: int, buses: Sequence[Optional[str]]) -> bytes:
+    header = _PACKED_HEADER.pack(PACKED_MAGIC, layout_version, len(buses))
+    # Bus numbers are short ASCII strings, where character and byte lengths
+    # agree and the whole body can be built as one string.
+    text = "".join([chr(len(bus)) + bus if bus else "\0" for bus in buses])
+    if text.isascii():
+        return header + text.encode("ascii")
+    parts = [header]
+    for bus in buses:
+        encoded = bus.encode("utf-8")[:255] if bus else b""
+        parts.append(bytes((len(encoded),)) + encoded)
+    return b"".join(parts)
+
+
+def unpack_status(body: bytes):
+    """(layout_version, [bus or None per spot]) from a packed status body."""
+    magic, layout_version, count = _PACKED_HEADER.unpack_from(body)
+    if magic != PACKED_MAGIC:
+        raise ValueError("not a packed status body")
+    payload = body[_PACKED_HEADER.size:]
+    ascii_only = payload.isascii()
+    if ascii_only:
+        payload = payload.decode("ascii")
+    buses = []
+    offset = 0
+    for _ in range(count):
+        length = ord(payload[offset]) if ascii_only else payload[offset]
+        if length:
+            bus = payload[offset + 1:offset + 1 + length]
+            buses.append(bus if ascii_only else bus.decode("utf-8"))
+        else:
+            buses.append(None)
+        offset += 1 + length
+    return layout_version, buses
+
+
+def decode_upload(body: bytes, content_type: Optional[str], layout_version: int, spot_ids: Sequence[str]) -> dict:
+    """
+    The JSON-shaped payload dict of a detection upload in either format.
+    Raises LayoutMismatch if a msgpack upload used another layout, and
+    ValueError for bodies that cannot be decoded.
+    """
+    return resolve_spots(unpack_upload(body, content_type), content_type, layout_version, spot_ids)
+
+
+def unpack_upload(body: bytes, content_type: Optional[str]):
+    """
+    The fields of an upload in either format, with the spots of a msgpack
+    upload still numbered; enough to route it by camera before
+    resolve_spots checks it against a layout.
+    """
+    if _media_type(content_type) != MSGPACK:
+        return json.loads(body)
+    if msgpack is None:
+        raise ValueError("msgpack uploads are not supported by this server")
+    data = msgpack.unpackb(body)
+    if not isinstance(data, dict):
+        raise ValueError("upload must be a map")
+    return data
+
+
+def resolve_spots(data: dict, content_type: Optional[str], layout_version: int, spot_ids: Sequence[str]) -> dict:
+    """Replaces the spot numbers of an unpacked msgpack upload with spot ids from the layout."""
+    if _media_type(content_type) != MSGPACK:
+        return data
+    if data.get("layout") != layout_version:
+        raise LayoutMismatch(f"upload uses layout {data.get('layout')}, current is {layout_version}")
+
+    def spot(value):
+        if isinstance(value, int):
+            if not 0 <= value < len(spot_ids):
+                raise ValueError(f"unknown spot index {value}")
+            return spot_ids[value]
+        return value
+
+    def entries(key):
+        value = data[key]
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"{key} must be an array")
+        return value
+
+    def pair(key, entry):
+        if not isinstance(entry, (list, tuple)) or len(entry) != 2:
+            raise ValueError(f"each entry of {key} must be a [spot, bus] pair")
+        return {"spot_id": spot(entry[0]), "bus_number": entry[1]}
+
+    for key in ("detections", "upserts"):
+        if key in data:
+            data[key] = [pair(key, entry) for entry in entries(key)]
+    if "removals" in data:
+        data["removals"] = [spot(s) for s in entries("removals")]
+    return data
+
+
+def _media_type(content_type: Optional[str]) -> str:
+    return (content_type or JSON).split(";")[0].strip().lower()
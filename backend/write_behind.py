@@ -0,0 +1,173 @@
+# backend/write_behind.py
+#
+# Group commit for detection ingest. With LocationWriter enabled, the
+# detection endpoints acknowledge a payload as soon as it is applied to the
+# in-memory status (status_cache, bus_index), and its bus_locations writes
+# are staged here instead of being committed per request. Only the latest
+# state of each spot is kept, and a background thread writes everything
+# staged in one transaction every `flush_interval` seconds, or sooner once
+# `flush_spots` spots are waiting, so the commit rate no longer follows the
+# camera request rate.
+#
+# Staleness is bounded: if staged state has waited more than `max_staleness`
+# seconds (the database is down or too slow), check() raises WriterStalled and
+# the endpoints answer 503 instead of acknowledging more, so the engines keep
+# the state in their own spools. Everything staged is flushed on shutdown.
+#
+# Reads: /api/status, the status stream and bus lookups are served from the
+# in-memory state, which already includes staged payloads. Code that reads
+# bus_locations from the database flushes first (see main.ensure_status_loaded)
+# or overlays pending(). A crash loses at most the staged window; the
+# sequencer is in memory too, so every camera's next delta is rejected and it
+# resends a full snapshot.
+#
+# Configuration (environment):
+#   DETECTION_FLUSH_MS     flush interval; "0" commits every payload itself (default 50)
+#   DETECTION_FLUSH_SPOTS  flush early once this many spots are staged (default 2000)
+#   DETECTION_MAX_STALENESS  seconds staged state may wait before ingest is refused (default 5)
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from . import crud, metrics
+
+logger = metrics.get_logger("njt.write_behind")
+
+FLUSH_INTERVAL = float(os.environ.get("DETECTION_FLUSH_MS", "50")) / 1000
+FLUSH_SPOTS = int(os.environ.get("DETECTION_FLUSH_SPOTS", "2000"))
+MAX_STALENESS = float(os.environ.get("DETECTION_MAX_STALENESS", "5"))
+
+
+class WriterStalled(Exception):
+    """Staged detections have not reached the database within the staleness bound."""
+
+
+class LocationWriter:
+    def __init__(self, session_factory, flush_interval=FLUSH_INTERVAL, flush_spots=FLUSH_SPOTS,
+                 max_staleness=MAX_STALENESS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_spots = flush_spots
+        self.max_staleness = max_staleness
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        # spot_id -> bus_locations row, or None if the spot emptied.
+        self._pending: Dict[str, Optional[dict]] = {}
+        self._oldest = None  # monotonic time of the oldest unflushed stage
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one transaction at a time, in staging order
+        self._closed = False
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval > 0
+
+    def staleness(self) -> float:
+        """Seconds the oldest staged state has been waiting for the database."""
+        with self._cond:
+            return time.monotonic() - self._oldest if self._oldest is not None else 0.0
+
+    def check(self) -> None:
+        """Raises WriterStalled if no more payloads should be acknowledged right now."""
+        if self.staleness() > self.max_staleness:
+            raise WriterStalled(f"detections have not been written for over {self.max_staleness:g} s")
+
+    def stage(self, camera_id: str, depot_id: str, spot_to_bus: Dict[str, str], changes) -> None:
+        """
+        Stages one applied payload: `spot_to_bus` is every spot it reported
+        (their last-seen time is refreshed, as a direct write would) and
+        `changes` the SpotChanges it caused, whose emptied spots are deleted.
+        """
+        at = datetime.now(timezone.utc)
+        with self._cond:
+            for change in changes:
+                if change.new_bus is None:
+                    self._pending[change.spot_id] = None
+            for spot_id, bus_number in spot_to_bus.items():
+                self._pending[spot_id] = {"spot_id": spot_id, "detected_bus_id": bus_number,
+                                          "camera_id": camera_id, "depot_id": depot_id, "timestamp": at}
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="location-writer", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.flush_spots:
+                self._cond.notify()
+
+    def pending(self) -> Dict[str, Optional[str]]:
+        """spot_id -> bus number (None if emptied) for everything staged but not yet written."""
+        with self._cond:
+            return {spot_id: row and row["detected_bus_id"] for spot_id, row in self._pending.items()}
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {"pending": len(self._pending), "flushes": self.flushes, "written": self.written,
+                    "failures": self.failures,
+                    "staleness": time.monotonic() - self._oldest if self._oldest is not None else 0.0}
+
+    def flush(self) -> bool:
+        """Writes everything staged so far on the calling thread; False if the write failed."""
+        with self._flush_lock:
+            with self._cond:
+                batch, oldest = self._pending, self._oldest
+                self._pending, self._oldest = {}, None
+            return self._write(batch, oldest)
+
+    def close(self, timeout=5.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.flush_spots,
+                                    timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _write(self, batch, oldest) -> bool:
+        if not batch:
+            return True
+        rows = [row for row in batch.values() if row is not None]
+        removals = [spot_id for spot_id, row in batch.items() if row is None]
+        db = None
+        try:
+            db = self.session_factory()
+            crud.write_location_batch(db, rows, removals)
+            db.commit()
+        except Exception as exc:
+            # Any failure, not only database errors: the batch is re-queued
+            # and retried at the next flush instead of ending the flush thread
+            # and leaving staleness to refuse ingest for good.
+            if db is not None:
+                db.rollback()
+            with self._cond:
+                self.failures += 1
+                # Spots staged again since the batch was taken are newer; keep those.
+                for spot_id, row in batch.items():
+                    self._pending.setdefault(spot_id, row)
+                if self._oldest is None or oldest < self._oldest:
+                    self._oldest = oldest
+            logger.warning("detection write failed", extra={"fields": {
+                "spots": len(batch), "error": str(exc)[:200],
+            }})
+            return False
+        finally:
+            if db is not None:
+                db.close()
+        with self._cond:
+            self.flushes += 1
+            self.written += len(batch)
+        return True
@@ -0,0 +1,108 @@
+# benchmarks/bench_analytics.py
+#
+# Description:
+# Replays a synthetic month of yard activity (see bench_history.generate)
+# through the history EventLog with rollups enabled, then times the analytics
+# queries behind /api/analytics/* over the whole month and checks each stays
+# under the dashboard budget (50 ms at p99). For comparison it also computes
+# the month's yard utilization the slow way, from the raw event history, and
+# checks that the rollups agree with it (within a point) and count exactly the
+# departures the history holds.
+# Exits non-zero if a check fails.
+# Uses a throwaway SQLite file unless DATABASE_URL is set.
+#
+# How to Run:
+#   python benchmarks/bench_analytics.py [--days 30] [--spots 100] [--queries 100]
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench_history import generate, timed  # also points DATABASE_URL at a throwaway database
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import analytics, database, history, models
+
+BUDGET_MS = 50.0
+# Rollups clip the buckets at either end of a range proportionally, so they
+# may differ slightly from the exact figure.
+UTILIZATION_TOLERANCE = 0.01
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup analytics query timings over a synthetic month.")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--spots", type=int, default=100)
+    parser.add_argument("--buses", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.SessionLocal() as db:
+        db.add_all([models.Spot(spot_id=f"S{i:03d}", camera_id="cam") for i in range(args.spots)])
+        db.commit()
+
+    replay_clock = [datetime.now(timezone.utc) - timedelta(days=args.days)]
+    log = history.EventLog(database.SessionLocal, batch_size=5000, rollups=analytics.RollupTracker(),
+                           clock=lambda: replay_clock[0])
+    start = time.perf_counter()
+    for ts, changes in generate(args.days, args.spots, args.buses):
+        replay_clock[0] = ts
+        log.record(changes, ts)
+    replay_clock[0] = datetime.now(timezone.utc)
+    log.close(timeout=60)
+    with database.ReadSessionLocal() as db:
+        rollup_rows = db.query(models.OccupancyRollup).count()
+    print(f"replayed {log.stats()['written']} events into {rollup_rows} rollup rows "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    now = datetime.now(timezone.utc)
+    month_ago = now - timedelta(days=args.days)
+    rng = random.Random(0)
+    db = database.ReadSessionLocal()
+    spots = analytics.spot_count(db)
+    queries = {
+        "utilization/hour, month": lambda: analytics.utilization(db, "hour", month_ago, now, spots=spots),
+        "utilization/day, month": lambda: analytics.utilization(db, "day", month_ago, now, spots=spots),
+        "utilization/minute, day": lambda: analytics.utilization(db, "minute", now - timedelta(days=1), now, spots=spots),
+        "spot utilization/hour": lambda: analytics.utilization(
+            db, "hour", month_ago, now, spot_id=f"S{rng.randrange(args.spots):03d}"),
+        "dwell, month": lambda: analytics.dwell(db, month_ago, now),
+        "peak hours, month": lambda: analytics.peak_hours(db, month_ago, now),
+    }
+    print(f"\n{'query':>26} {'p50 ms':>8} {'p99 ms':>8}")
+    passed = True
+    for name, query in queries.items():
+        p50, p99 = timed(query, args.queries)
+        passed &= p99 < BUDGET_MS
+        print(f"{name:>26} {p50:>8.2f} {p99:>8.2f}{'' if p99 < BUDGET_MS else '  over budget'}")
+
+    start = time.perf_counter()
+    occupied = sum(
+        history.spot_occupancy(db, f"S{i:03d}", month_ago, now)["occupiedSeconds"] for i in range(args.spots)
+    )
+    raw_ms = (time.perf_counter() - start) * 1000
+    raw_utilization = occupied / (spots * (now - month_ago).total_seconds())
+    print(f"\nmonth utilization from raw events: {raw_ms:.0f} ms ({raw_utilization:.1%})")
+    consistent = True
+    for granularity in ("hour", "day"):
+        from_rollups = analytics.utilization(db, granularity, month_ago, now, spots=spots)["utilization"]
+        agrees = abs(from_rollups - raw_utilization) <= UTILIZATION_TOLERANCE
+        consistent &= agrees
+        print(f"  from {granularity} rollups: {from_rollups:.1%}{'' if agrees else '  disagrees'}")
+    raw_departures = db.query(models.OccupancyEvent).filter(models.OccupancyEvent.kind == "depart").count()
+    rollup_departures = analytics.dwell(db, month_ago - timedelta(days=1), now)["departures"]
+    consistent &= raw_departures == rollup_departures
+    print(f"departures in the history: {raw_departures}, in the rollups: {rollup_departures}")
+    db.close()
+    print(f"\n{'PASS' if passed else 'FAIL'}: every rollup query p99 under {BUDGET_MS:.0f} ms")
+    print(f"{'PASS' if consistent else 'FAIL'}: rollups agree with the history")
+    sys.exit(0 if passed and consistent else 1)
+
+
+if __name__ == "__main__":
+    main()
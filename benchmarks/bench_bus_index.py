@@ -0,0 +1,56 @@
+# benchmarks/bench_bus_index.py
+#
+# Description:
+# Times "where is bus N?" as the yard grows: the dashboard's old approach
+# (take the /api/status list and scan it) against BusIndex exact lookups and
+# prefix search, for yards of 100 to 100,000 occupied spots. Lookup time
+# should stay flat for the index while the scan grows with the yard.
+#
+# How to Run:
+#   python benchmarks/bench_bus_index.py [--lookups 2000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Importing the backend creates engines; keep them off any real database.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='njt_bench_'), 'bench.db')}")
+
+from backend.bus_index import BusIndex
+
+
+def per_lookup_us(fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bus index lookups vs. scanning the status list.")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'spots':>8} {'scan us':>10} {'index us':>10} {'prefix us':>10}")
+    for size in (100, 1000, 10_000, 100_000):
+        rng = random.Random(size)
+        buses = rng.sample(range(10_000, 10_000 + size * 10), size)
+        seen = {f"S{i:06d}": str(bus) for i, bus in enumerate(buses)}
+        status = [{"spotId": spot, "actualBus": bus, "cameraId": "cam"} for spot, bus in seen.items()]
+        index = BusIndex()
+        index._loaded = True
+        index.record("cam", [], seen)
+
+        keys = [str(rng.choice(buses)) for _ in range(args.lookups)]
+        scan = per_lookup_us(lambda bus: next(s for s in status if s["actualBus"] == bus), keys[:200])
+        exact = per_lookup_us(index.get, keys)
+        prefix = per_lookup_us(lambda bus: index.search(bus[:3], 20), keys)
+        print(f"{size:>8} {scan:>10.1f} {exact:>10.2f} {prefix:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
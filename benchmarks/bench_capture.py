@@ -0,0 +1,103 @@
+# benchmarks/bench_capture.py
+#
+# Description:
+# Continuous dataset capture from a simulated live camera: the old
+# imageCollector approach (cv2.imwrite on the capture thread) against
+# capture.DatasetWriter (encoder pool behind a bounded, dropping queue). The
+# camera delivers a synthetic 640x480 frame every 1/--fps seconds and, like a
+# real one, only holds the newest frame, so any frame the loop is too busy to
+# read is lost. Every frame read is saved. Reports, per mode:
+#   - frames the capture loop read and lost to the camera
+#   - frames written and dropped by the writer queue
+#   - capture loop time per frame (p50/p99/max ms), i.e. how long the preview
+#     and capture stall
+#
+# How to Run:
+#   python benchmarks/bench_capture.py [--seconds 10] [--fps 30] [--format jpg png]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import cv2
+
+import synthetic
+from capture import DatasetWriter
+from qr_code_engine import PARKING_SPOT_ZONES
+
+
+def run(frames, seconds, fps, save):
+    """Drives `save(frame, timestamp, number)` from a simulated camera; returns the loop measurements."""
+    period = 1.0 / fps
+    loop_times = []
+    read = lost = 0
+    last_frame = -1
+    start = time.perf_counter()
+    while True:
+        now = time.perf_counter() - start
+        if now >= seconds:
+            break
+        current = int(now / period)
+        if current == last_frame:
+            time.sleep(period - now % period)
+            continue
+        lost += current - last_frame - 1
+        last_frame = current
+        began = time.perf_counter()
+        save(frames[current % len(frames)], start + now, current)
+        loop_times.append(time.perf_counter() - began)
+        read += 1
+    loop_times.sort()
+    return {
+        "read": read, "lost": lost,
+        "p50_ms": loop_times[len(loop_times) // 2] * 1000,
+        "p99_ms": loop_times[min(len(loop_times) - 1, int(len(loop_times) * 0.99))] * 1000,
+        "max_ms": loop_times[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synchronous imwrite vs. the DatasetWriter encoder pool.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--format", nargs="+", choices=("jpg", "png"), default=["jpg", "png"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--crops", action="store_true", help="also save per-zone crops (pool modes)")
+    args = parser.parse_args()
+
+    frames = [frame for frame, _ in synthetic.yard_sequence(PARKING_SPOT_ZONES, 60, change_every=10)]
+    print(f"{args.fps:g} frames/s camera for {args.seconds:g} s, saving every frame read")
+    print(f"{'format':>6} {'mode':>10} {'read':>6} {'lost':>6} {'written':>8} {'dropped':>8} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    for image_format in args.format:
+        output = tempfile.mkdtemp(prefix="njt_capture_")
+        try:
+            params = [cv2.IMWRITE_JPEG_QUALITY, 95] if image_format == "jpg" else [cv2.IMWRITE_PNG_COMPRESSION, 3]
+
+            def imwrite(frame, timestamp, number):
+                cv2.imwrite(os.path.join(output, f"bus_image_{number}.{image_format}"), frame, params)
+
+            r = run(frames, args.seconds, args.fps, imwrite)
+            print(f"{image_format:>6} {'imwrite':>10} {r['read']:>6} {r['lost']:>6} {r['read']:>8} {0:>8} "
+                  f"{r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['max_ms']:>7.2f}")
+            for workers in args.workers:
+                writer = DatasetWriter(os.path.join(output, f"pool{workers}"), "bench", image_format,
+                                       95 if image_format == "jpg" else 3,
+                                       PARKING_SPOT_ZONES if args.crops else None, workers, queue_size=64)
+                r = run(frames, args.seconds, args.fps, writer.submit)
+                writer.close()
+                stats = writer.stats()
+                print(f"{image_format:>6} {f'pool x{workers}':>10} {r['read']:>6} {r['lost']:>6} "
+                      f"{stats['written']:>8} {stats['dropped']:>8} "
+                      f"{r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['max_ms']:>7.2f}")
+        finally:
+            shutil.rmtree(output, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_cascade.py
+#
+# Description:
+# Compares the original fixed decode chain (bilateral + adaptive threshold on
+# every ROI, plain gray as fallback) with the adaptive decode cascade on the
+# same frames: per-frame latency, recall, and the cascade's per-stage hit rate
+# and mean latency. Motion gating is off so every frame is decoded.
+#
+# With no input, a synthetic clip with known ground truth is generated. With
+# --video or --images there is no ground truth, so recall is measured against
+# everything either mode found on that frame.
+#
+# How to Run:
+#   python benchmarks/bench_cascade.py [--video clip.avi | --images frames/] [--frames 200]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import synthetic
+from decoder import DecodeCascade
+from frame_sources import open_source
+from pipeline import DetectionPipeline
+from qr_code_engine import PARKING_SPOT_ZONES, ROI_PADDING
+
+# The original fixed chain: thresholded image, plain gray only if that found nothing.
+CLASSIC_STAGES = ["bilateral", "gray"]
+
+
+def recorded_frames(source, limit):
+    cap = open_source(source)
+    count = 0
+    while count < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        count += 1
+        yield frame, None
+    cap.release()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed decode chain vs. adaptive decode cascade.")
+    parser.add_argument("--video", help="recorded video file")
+    parser.add_argument("--images", help="directory of recorded frames")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.video or args.images:
+        frames = recorded_frames(args.video or args.images, args.frames)
+    else:
+        frames = synthetic.yard_sequence(PARKING_SPOT_ZONES, args.frames)
+
+    cascade = DecodeCascade()
+    pipelines = {
+        "fixed": DetectionPipeline(PARKING_SPOT_ZONES, True, ROI_PADDING, False, stages=CLASSIC_STAGES),
+        "cascade": DetectionPipeline(PARKING_SPOT_ZONES, True, ROI_PADDING, False),
+    }
+    # The fixed chain never learns or gives up early on empty zones.
+    pipelines["fixed"].policy.plan = lambda region, capacity, full=False: (CLASSIC_STAGES, 1, None)
+    latency = {mode: [] for mode in pipelines}
+    hits = {mode: 0 for mode in pipelines}
+    expected_total = 0
+
+    for index, (frame, truth) in enumerate(frames):
+        found = {}
+        for mode, pipeline in pipelines.items():
+            start = time.perf_counter()
+            sightings, _ = pipeline.process(cascade, frame, index)
+            latency[mode].append(time.perf_counter() - start)
+            found[mode] = {spot: bus for bus, spot in sightings}
+        if truth is None:
+            truth = {k: v for result in found.values() for k, v in result.items()}
+        expected_total += len(truth)
+        for mode, result in found.items():
+            hits[mode] += sum(1 for spot, bus in truth.items() if result.get(spot) == bus)
+
+    print(f"{'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'recall':>8}")
+    for mode, values in latency.items():
+        recall = hits[mode] / expected_total if expected_total else 1.0
+        print(f"{mode:>8} {statistics.median(values) * 1000:>8.2f} {percentile(values, 0.95) * 1000:>8.2f} "
+              f"{statistics.mean(values) * 1000:>8.2f} {recall:>8.1%}")
+
+    print(f"\n{'stage':>10} {'runs':>6} {'hit rate':>9} {'mean ms':>8}")
+    for stage, stats in pipelines["cascade"].policy.report().items():
+        print(f"{stage:>10} {stats['runs']:>6} {stats['hit_rate']:>9.1%} {stats['mean_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
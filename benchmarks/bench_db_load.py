@@ -0,0 +1,124 @@
+# benchmarks/bench_db_load.py
+#
+# Description:
+# Load test for the database path behind the hot endpoints. Starts the backend
+# with uvicorn in a subprocess, once with the async session path (DB_ASYNC=1)
+# and once with the sync session on the threadpool (DB_ASYNC=0), and drives it
+# with 1, 16 and 128 concurrent clients. Each client plays one camera: it sends
+# a full snapshot, then loops over delta uploads that change a spot, with every
+# fourth request a GET /api/status. Reports requests/second, p50/p99 latency
+# and errors per concurrency level.
+#
+# By default this uses a throwaway SQLite file; pass --database-url to run it
+# against Postgres (the async run then needs asyncpg installed).
+#
+# How to Run:
+#   python benchmarks/bench_db_load.py [--requests 2000] [--concurrency 1 16 128]
+#   python benchmarks/bench_db_load.py --database-url postgresql://user:pw@localhost/njt_bench
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PORT = 8766
+BASE_URL = f"http://127.0.0.1:{PORT}"
+SPOTS_PER_CAMERA = 8
+
+
+def start_server(database_url, use_async):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="1" if use_async else "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(PORT), "--log-level", "warning", "--backlog", "4096"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(BASE_URL + "/api/status", timeout=1.0)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("backend did not start")
+
+
+async def camera_client(client, camera_id, requests, latencies, errors):
+    spots = [f"{camera_id}_S{i}" for i in range(SPOTS_PER_CAMERA)]
+    response = await client.post("/api/detections", json={
+        "camera_id": camera_id, "seq": 0,
+        "detections": [{"spot_id": spot, "bus_number": "100"} for spot in spots],
+    })
+    response.raise_for_status()
+    seq = 0
+    for i in range(requests):
+        start = time.perf_counter()
+        try:
+            if i % 4 == 3:
+                response = await client.get("/api/status")
+            else:
+                response = await client.post("/api/detections/delta", json={
+                    "camera_id": camera_id, "seq": seq + 1, "base_seq": seq,
+                    "upserts": [{"spot_id": spots[i % len(spots)], "bus_number": str(100 + i % 50)}],
+                })
+                if response.status_code == 200:
+                    seq += 1
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(i)
+
+
+async def run_level(concurrency, total_requests, run_id):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=30.0) as client:
+        latencies, errors = [], []
+        per_client = max(1, total_requests // concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            camera_client(client, f"cam_{run_id}_{concurrency}_{c}", per_client, latencies, errors)
+            for c in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async vs. threadpool database load test.")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--database-url", help="default: a throwaway SQLite file per mode")
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for use_async in (False, True):
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='njt_bench_'), 'bench.db')}"
+        server = start_server(database_url, use_async)
+        mode = "async" if use_async else "threadpool"
+        try:
+            for concurrency in args.concurrency:
+                r = asyncio.run(run_level(concurrency, args.requests, mode))
+                print(f"{mode:>10} {concurrency:>8} {r['rps']:>8.0f} {r['p50_ms']:>8.1f} "
+                      f"{r['p99_ms']:>8.1f} {r['errors']:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
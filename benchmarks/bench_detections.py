@@ -0,0 +1,111 @@
+# benchmarks/bench_detections.py
+#
+# Description:
+# Measures POST /api/detections latency and the number of SQL statements each
+# payload costs, for payloads of 10, 100 and 1000 detections. It runs against a
+# throwaway SQLite database so no Postgres server is needed.
+#
+# Every size runs twice: "direct" commits each payload in its request
+# (DETECTION_FLUSH_MS=0), "write-behind" stages it for the group commit
+# (write_behind.LocationWriter, DETECTION_FLUSH_MS or 50 ms). Write-behind
+# statements are counted up to a final flush after the last round, so
+# stmts/payload includes its share of the group commits.
+#
+# How to Run:
+#   python benchmarks/bench_detections.py [--rounds 50]
+#
+# Point DATABASE_URL at a Postgres instance to benchmark the real server instead.
+# Statements are counted on both the sync engine and the async engine the
+# detection endpoints write through (DB_ASYNC=0 turns that path off).
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_tmpdir = tempfile.mkdtemp(prefix="njt_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from backend import database, migrate, models
+from backend import write_behind
+from backend.main import app, location_writer, status_snapshot
+
+CAMERA_ID = "cam_bench_01"
+SIZES = (10, 100, 1000)
+
+
+def seed_spots(count):
+    db = database.SessionLocal()
+    try:
+        db.query(models.BusLocation).delete()
+        db.query(models.Spot).delete()
+        db.add_all([models.Spot(spot_id=f"S{i:05d}", camera_id=CAMERA_ID) for i in range(count)])
+        db.commit()
+    finally:
+        db.close()
+
+
+def make_payload(size, round_index):
+    # Rotate which spots are occupied so every round mixes inserts, updates and deletes.
+    detections = [
+        {"spot_id": f"S{(i + round_index) % (size * 2):05d}", "bus_number": str(1000 + i + round_index)}
+        for i in range(size)
+    ]
+    return {"camera_id": CAMERA_ID, "detections": detections}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    statement_count = 0
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statement_count
+        statement_count += 1
+
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count_statement)
+
+    migrate.run(database.engine)
+    with TestClient(app) as client:
+        print(f"ingest through the {'async' if database.async_engine is not None else 'sync'} engine")
+        print(f"{'mode':>12} {'detections':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+              f"{'stmts/payload':>14} {'flushes':>8}")
+        modes = (("direct", 0.0), ("write-behind", write_behind.FLUSH_INTERVAL or 0.05))
+        for size in SIZES:
+            for mode, flush_interval in modes:
+                location_writer.flush()
+                location_writer.flush_interval = flush_interval
+                seed_spots(size * 2)
+                status_snapshot.invalidate()
+                client.get("/api/status").raise_for_status()  # reload the snapshot outside the timing
+                latencies = []
+                statement_count = 0
+                flushes = location_writer.flushes
+                for round_index in range(args.rounds):
+                    payload = make_payload(size, round_index)
+                    start = time.perf_counter()
+                    response = client.post("/api/detections", json=payload)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    response.raise_for_status()
+                location_writer.flush()
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                print(f"{mode:>12} {size:>10} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+                      f"{latencies[-1]:>8.2f} {statement_count / args.rounds:>14.1f} "
+                      f"{location_writer.flushes - flushes:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/bench_frame_ring.py
+#
+# Description:
+# Compares the single-camera engine's old frame handoff (copy every sampled
+# frame into a one-element Queue, fresh gray/filtered/threshold arrays per
+# decode) with the preallocated FrameRing (capture reads straight into a slot,
+# the slot index is handed over, a waiting frame is dropped when a newer one
+# arrives, and decode intermediates reuse scratch buffers).
+#   allocations - frames replayed one at a time under tracemalloc; reports the
+#                 peak bytes allocated above the steady state while handling
+#                 one frame (capture + decode), which counts numpy and OpenCV
+#                 image buffers.
+#   latency     - a capture thread replays the clip at --fps in real time while
+#                 the detection thread decodes; reports capture-to-decision
+#                 latency (frame read until its tracker update) and how
+#                 many captured frames were never decided.
+# Motion gating is off so every frame handed over is decoded.
+#
+# How to Run:
+#   python benchmarks/bench_frame_ring.py [--video clip.avi] [--frames 300] [--fps 30]
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from queue import Queue
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import numpy as np
+
+import synthetic
+from decoder import DecodeCascade
+from frame_ring import FrameRing
+from frame_sources import open_source
+from pipeline import DetectionPipeline
+from qr_code_engine import PARKING_SPOT_ZONES, ROI_PADDING
+from tracker import SpotTracker
+
+
+class FreshBuffers:
+    """Stands in for ScratchBuffers but allocates every time, like the old decode chain."""
+
+    def get(self, name, shape):
+        return np.empty(shape, dtype=np.uint8)
+
+
+def make_worker(mode):
+    cascade = DecodeCascade()
+    if mode == "queue":
+        cascade.scratch = FreshBuffers()
+    pipeline = DetectionPipeline(PARKING_SPOT_ZONES, True, ROI_PADDING, False)
+    tracker = SpotTracker()
+
+    def decide(frame):
+        now = time.time()
+        sightings, _ = pipeline.process(cascade, frame, now)
+        tracker.update(sightings, now)
+
+    return decide
+
+
+def allocations(video, mode, frames):
+    cap = open_source(video)
+    decide = make_worker(mode)
+    ring = None
+    per_frame = []
+    tracemalloc.start()
+    for index in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        if mode == "queue":
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frame = frame.copy()
+            decide(frame)
+        else:
+            if ring is None:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                ring = FrameRing(3, frame.shape)
+            slot = ring.acquire()
+            ok, frame = cap.read(ring.frames[slot])
+            if not ok:
+                break
+            decide(frame)
+            ring.release(slot)
+        if index >= 5:  # skip warm-up: first-use buffers and lazily built state
+            per_frame.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    cap.release()
+    return per_frame
+
+
+def latency(video, mode, frames, fps):
+    source = open_source(video)
+    decide = make_worker(mode)
+    latencies = []
+    captured = 0
+
+    if mode == "queue":
+        queue = Queue(maxsize=1)
+
+        def worker():
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                frame, captured_at = item
+                decide(frame)
+                latencies.append(time.perf_counter() - captured_at)
+    else:
+        ok, first = source.read()
+        ring = FrameRing(3, first.shape)
+
+        def worker():
+            while True:
+                handoff = ring.take_latest()
+                if handoff is None:
+                    return
+                slot, captured_at = handoff
+                decide(ring.frames[slot])
+                ring.release(slot)
+                latencies.append(time.perf_counter() - captured_at)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    start = time.perf_counter()
+    for index in range(frames):
+        time.sleep(max(0.0, start + index / fps - time.perf_counter()))
+        if mode == "queue":
+            ok, frame = source.read()
+            if not ok:
+                break
+            captured += 1
+            if not queue.full():
+                queue.put((frame.copy(), time.perf_counter()))
+        else:
+            slot = ring.acquire(timeout=1.0)
+            ok, _ = source.read(ring.frames[slot])
+            if not ok:
+                ring.release(slot)
+                break
+            captured += 1
+            ring.publish(slot, time.perf_counter())
+    if mode == "queue":
+        queue.put(None)
+    else:
+        # Let the last published frame be decided before stopping.
+        while ring.in_flight():
+            time.sleep(0.01)
+        ring.stop()
+    thread.join()
+    source.release()
+    return latencies, captured
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue + copy vs. preallocated frame ring.")
+    parser.add_argument("--video", help="video file to replay (default: generated synthetic clip)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=30.0, help="real-time capture rate for the latency run")
+    args = parser.parse_args()
+
+    video = args.video
+    if video is None:
+        video = os.path.join(tempfile.mkdtemp(prefix="njt_bench_"), "yard.avi")
+        synthetic.write_video(video, (f for f, _ in synthetic.yard_sequence(PARKING_SPOT_ZONES, args.frames)))
+
+    print(f"{'mode':>6} {'peak KB/frame':>15} {'p50 ms':>8} {'p99 ms':>8} {'decided':>8} {'skipped':>8}")
+    for mode in ("queue", "ring"):
+        per_frame = allocations(video, mode, min(args.frames, 60))
+        lat, captured = latency(video, mode, args.frames, args.fps)
+        print(f"{mode:>6} {statistics.mean(per_frame) / 1024:>15.1f} {statistics.median(lat) * 1000:>8.1f} "
+              f"{percentile(lat, 0.99) * 1000:>8.1f} {len(lat):>8} {captured - len(lat):>8}")
+
+
+if __name__ == "__main__":
+    main()
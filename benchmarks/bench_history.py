@@ -0,0 +1,127 @@
+# benchmarks/bench_history.py
+#
+# Description:
+# Fills the occupancy history with synthetic months of yard activity (buses
+# arriving, leaving, moving between spots, and the occasional one-frame flap),
+# then times the history queries against it:
+#   - bus_location_at for random buses at random times
+#   - spot_occupancy over one day and over one week
+# and finally the maintenance job's compaction and retention passes.
+# Uses a throwaway SQLite file unless DATABASE_URL is set.
+#
+# How to Run:
+#   python benchmarks/bench_history.py [--days 90] [--spots 100] [--buses 300] [--queries 300]
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_tmpdir = tempfile.mkdtemp(prefix="njt_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+
+from backend import database, history, models
+from backend.status_cache import SpotChange
+
+
+def generate(days, spots, buses, seed=0):
+    """Yields (ts, [SpotChange]) for a yard where every spot turns over a few times a day."""
+    rng = random.Random(seed)
+    spot_ids = [f"S{i:03d}" for i in range(spots)]
+    occupancy = {}
+    parked = {}
+    ts = datetime.now(timezone.utc) - timedelta(days=days)
+    end = datetime.now(timezone.utc)
+    while ts < end:
+        ts += timedelta(seconds=rng.expovariate(spots * 12 / 86400))
+        spot = rng.choice(spot_ids)
+        bus = occupancy.get(spot)
+        if bus is not None and rng.random() < 0.1:
+            # A missed detection: the bus "leaves" and is back a few seconds later.
+            yield ts, [SpotChange(spot, "cam", bus, None)]
+            yield ts + timedelta(seconds=rng.uniform(1, 20)), [SpotChange(spot, "cam", None, bus)]
+            continue
+        if bus is not None:
+            free = [s for s in rng.sample(spot_ids, 5) if s not in occupancy]
+            if free and rng.random() < 0.2:
+                del occupancy[spot]
+                occupancy[free[0]] = bus
+                parked[bus] = free[0]
+                yield ts, [SpotChange(spot, "cam", bus, None), SpotChange(free[0], "cam", None, bus)]
+            else:
+                del occupancy[spot]
+                del parked[bus]
+                yield ts, [SpotChange(spot, "cam", bus, None)]
+        else:
+            idle = [b for b in (str(1000 + rng.randrange(buses)) for _ in range(5)) if b not in parked]
+            if idle:
+                occupancy[spot] = parked[idle[0]] = idle[0]
+                yield ts, [SpotChange(spot, "cam", None, idle[0])]
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Occupancy history query and maintenance timings.")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--spots", type=int, default=100)
+    parser.add_argument("--buses", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    history.ensure_partitions(database.engine, datetime.now(timezone.utc) - timedelta(days=args.days),
+                              months_ahead=args.days // 28 + 2)
+    log = history.EventLog(database.SessionLocal, batch_size=5000)
+    start = time.perf_counter()
+    for ts, changes in generate(args.days, args.spots, args.buses):
+        log.record(changes, ts)
+    log.close()
+    stats = log.stats()
+    print(f"wrote {stats['written']} events for {args.days} days in {time.perf_counter() - start:.1f} s "
+          f"(dropped {stats['dropped']}, failed batches {stats['failures']})")
+
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc)
+    db = database.ReadSessionLocal()
+
+    def random_time():
+        return now - timedelta(seconds=rng.uniform(0, args.days * 86400))
+
+    print(f"\n{'query':>24} {'p50 ms':>8} {'p99 ms':>8}")
+    queries = {
+        "bus at time": lambda: history.bus_location_at(db, str(1000 + rng.randrange(args.buses)), random_time()),
+        "spot over 1 day": lambda: history.spot_occupancy(
+            db, f"S{rng.randrange(args.spots):03d}", *(lambda t: (t - timedelta(days=1), t))(random_time())),
+        "spot over 7 days": lambda: history.spot_occupancy(
+            db, f"S{rng.randrange(args.spots):03d}", *(lambda t: (t - timedelta(days=7), t))(random_time())),
+    }
+    for name, query in queries.items():
+        p50, p99 = timed(query, args.queries)
+        print(f"{name:>24} {p50:>8.2f} {p99:>8.2f}")
+    db.close()
+
+    start = time.perf_counter()
+    removed = history.compact(database.engine, now - timedelta(days=7), flap_seconds=60)
+    print(f"\ncompaction removed {removed} flap events in {time.perf_counter() - start:.2f} s")
+    start = time.perf_counter()
+    retention = history.apply_retention(database.engine, now - timedelta(days=args.days // 2))
+    print(f"retention ({args.days // 2} days) removed {retention['deleted_events']} events, "
+          f"{len(retention['dropped_partitions'])} partitions in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
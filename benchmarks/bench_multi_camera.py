@@ -0,0 +1,64 @@
+# benchmarks/bench_multi_camera.py
+#
+# Description:
+# Throughput of the multi-camera engine in frames/second as the number of
+# decode worker processes grows. Every camera replays the same video file
+# headless and nothing is uploaded. Without --video, a synthetic clip of the
+# parking lot screenshot with a QR code in every zone is generated first.
+#
+# How to Run:
+#   python benchmarks/bench_multi_camera.py [--video clip.avi] [--cameras 4] [--frames 100]
+
+import argparse
+import copy
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import multi_camera_engine
+import synthetic
+from qr_code_engine import PARKING_SPOT_ZONES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera engine frames/second vs. worker count.")
+    parser.add_argument("--video", help="video file to replay (default: generated synthetic clip)")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=100, help="frames decoded per camera")
+    parser.add_argument("--workers", type=int, nargs="*", help="worker counts to try (default: 1..CPU count)")
+    args = parser.parse_args()
+
+    video = args.video
+    if video is None:
+        video = os.path.join(tempfile.mkdtemp(prefix="njt_bench_"), "synthetic.avi")
+        synthetic.write_video(video, synthetic.parked_sequence(PARKING_SPOT_ZONES, args.frames))
+
+    worker_counts = args.workers or list(range(1, (os.cpu_count() or 1) + 1))
+    base_config = copy.deepcopy(multi_camera_engine.DEFAULT_CONFIG)
+    base_config["cameras"] = [
+        {**multi_camera_engine.DEFAULT_CAMERA, "camera_id": f"cam_bench_{i:02d}", "source": video,
+         "zones": PARKING_SPOT_ZONES, "max_frames": args.frames,
+         # Every frame must reach a worker to measure decode scaling.
+         "motion_gating": False}
+        for i in range(args.cameras)
+    ]
+
+    results = []
+    for workers in worker_counts:
+        config = copy.deepcopy(base_config)
+        config["workers"] = workers
+        summary = multi_camera_engine.run(config, upload=False, report_interval=0)
+        results.append((workers, summary))
+
+    baseline = results[0][1]["frames_per_second"]
+    print(f"\n{'workers':>8} {'frames':>8} {'seconds':>8} {'frames/s':>9} {'speedup':>8}")
+    for workers, summary in results:
+        fps = summary["frames_per_second"]
+        print(f"{workers:>8} {summary['frames_decoded']:>8} {summary['elapsed_seconds']:>8.2f} "
+              f"{fps:>9.1f} {fps / baseline if baseline else 0:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
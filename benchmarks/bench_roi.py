@@ -0,0 +1,118 @@
+# benchmarks/bench_roi.py
+#
+# Description:
+# Compares ROI-cropped detection (only the padded PARKING_SPOT_ZONES areas are
+# filtered and scanned) against full-frame detection on the same frames:
+# per-frame latency and detection recall.
+#
+# With no input, a synthetic clip with known ground truth is generated. With
+# --video or --images (recorded footage), there is no ground truth, so recall is
+# measured against everything either mode found on that frame.
+#
+# How to Run:
+#   python benchmarks/bench_roi.py [--video clip.avi | --images frames/] [--frames 200]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import cv2
+
+import synthetic
+from decoder import DecodeCascade, decode_regions
+from frame_sources import open_source
+from qr_code_engine import PARKING_SPOT_ZONES, ROI_PADDING
+from zones import get_spot_for_qr, merge_zone_rois
+
+
+# The original fixed chain: thresholded image, plain gray only if that found nothing.
+CLASSIC_ORDER = ["bilateral", "gray"]
+
+
+def decode(cascade, gray_frame, rois):
+    tasks = [(roi, CLASSIC_ORDER, 1, None) for roi in rois]
+    return [code for codes, _ in decode_regions(cascade, gray_frame, tasks) for code in codes]
+
+
+def recorded_frames(source, limit):
+    cap = open_source(source)
+    count = 0
+    while count < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        count += 1
+        yield frame, None
+    cap.release()
+
+
+def found(codes):
+    """{spot_id: bus_number} for the decoded codes that land in a zone."""
+    result = {}
+    for bus_number, points in codes:
+        spot_id = get_spot_for_qr(points, PARKING_SPOT_ZONES)
+        if spot_id:
+            result[spot_id] = bus_number
+    return result
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROI vs. full-frame detection latency and recall.")
+    parser.add_argument("--video", help="recorded video file")
+    parser.add_argument("--images", help="directory of recorded frames")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--padding", type=int, default=ROI_PADDING)
+    args = parser.parse_args()
+
+    if args.video or args.images:
+        frames = recorded_frames(args.video or args.images, args.frames)
+    else:
+        frames = synthetic.yard_sequence(PARKING_SPOT_ZONES, args.frames)
+
+    cascade = DecodeCascade()
+    rois = None
+    latency = {"full": [], "roi": []}
+    hits = {"full": 0, "roi": 0}
+    expected_total = 0
+
+    for frame, truth in frames:
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if rois is None:
+            rois = merge_zone_rois(PARKING_SPOT_ZONES, gray_frame.shape, args.padding)
+            covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois)
+            print(f"{len(rois)} ROIs covering {100 * covered / gray_frame.size:.0f}% of the frame")
+
+        start = time.perf_counter()
+        full = found(decode(cascade, gray_frame, [None]))
+        latency["full"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        roi = found(decode(cascade, gray_frame, rois))
+        latency["roi"].append(time.perf_counter() - start)
+
+        if truth is None:
+            # No ground truth: score both modes against everything either found.
+            truth = {**full, **roi}
+        expected_total += len(truth)
+        for mode, result in (("full", full), ("roi", roi)):
+            hits[mode] += sum(1 for spot, bus in truth.items() if result.get(spot) == bus)
+
+    print(f"{'mode':>6} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'recall':>8}")
+    for mode in ("full", "roi"):
+        values = latency[mode]
+        recall = hits[mode] / expected_total if expected_total else 1.0
+        print(f"{mode:>6} {statistics.median(values) * 1000:>8.2f} {percentile(values, 0.95) * 1000:>8.2f} "
+              f"{statistics.mean(values) * 1000:>8.2f} {recall:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
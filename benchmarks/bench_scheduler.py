@@ -0,0 +1,128 @@
+# benchmarks/bench_scheduler.py
+#
+# Description:
+# Simulates a yard of cameras on a virtual clock and compares the old fixed
+# 10 frames/s sampling with the adaptive SamplingScheduler. Each camera sees
+# bus arrivals at random (its zones change for a few seconds each time), and
+# halfway through every camera becomes busy at once for a "rush" period. A
+# sample costs --decode-ms when zones changed and --plan-ms when the motion
+# gate skipped it. Reports:
+#   - average and peak (per second) decode load in cores, against the budget
+#   - samples taken, and how many of them fell while zones were changing
+#   - how long after a change started its first sample was taken
+#
+# How to Run:
+#   python benchmarks/bench_scheduler.py [--cameras 16] [--seconds 600] [--budget 2]
+
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+from scheduler import SamplingScheduler
+
+FIXED_INTERVAL = 0.1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def activity(cameras, seconds, seed, mean_gap=120.0, motion_seconds=8.0, rush=(0.5, 30.0)):
+    """{camera: [(start, end)]} periods in which each camera's zones are changing."""
+    rng = random.Random(seed)
+    rush_start = seconds * rush[0]
+    periods = {}
+    for camera in cameras:
+        spans = [(rush_start, rush_start + rush[1])]
+        t = rng.expovariate(1 / mean_gap)
+        while t < seconds:
+            spans.append((t, t + motion_seconds))
+            t += motion_seconds + rng.expovariate(1 / mean_gap)
+        periods[camera] = sorted(spans)
+    return periods
+
+
+def moving(spans, t):
+    return any(start <= t < end for start, end in spans)
+
+
+def simulate(periods, seconds, decode_cost, plan_cost, scheduler=None, clock=None):
+    """Runs every camera's sampling loop on a virtual clock; returns the measurements."""
+    queue = [(0.0, camera) for camera in periods]
+    heapq.heapify(queue)
+    busy_seconds = [0.0] * (int(seconds) + 1)
+    samples = samples_moving = 0
+    first_sample_delay = []
+    pending = {camera: list(spans) for camera, spans in periods.items()}
+    while queue:
+        t, camera = heapq.heappop(queue)
+        if t >= seconds:
+            continue
+        if clock is not None:
+            clock.now = t
+        motion = moving(periods[camera], t)
+        spans = pending[camera]
+        while spans and spans[0][1] <= t:
+            spans.pop(0)
+        if motion and spans and spans[0][0] <= t:
+            first_sample_delay.append(t - spans[0][0])
+            spans.pop(0)
+        cost = decode_cost if motion else plan_cost
+        samples += 1
+        samples_moving += motion
+        busy_seconds[int(t)] += cost
+        if scheduler is not None:
+            scheduler.record_sample(camera, motion)
+            scheduler.record_cost(camera, cost, motion)
+            interval = scheduler.interval(camera)
+        else:
+            interval = FIXED_INTERVAL
+        heapq.heappush(queue, (t + interval, camera))
+    delays = sorted(first_sample_delay)
+    return {
+        "load": sum(busy_seconds) / seconds,
+        "peak": max(busy_seconds),
+        "samples": samples,
+        "moving": samples_moving,
+        "delay_mean": sum(delays) / len(delays) if delays else 0.0,
+        "delay_max": delays[-1] if delays else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed vs. adaptive per-camera sampling on a simulated yard.")
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--budget", type=float, default=2.0, help="decode cores for the adaptive scheduler")
+    parser.add_argument("--decode-ms", type=float, default=30.0)
+    parser.add_argument("--plan-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    cameras = [f"cam_{i:02d}" for i in range(args.cameras)]
+    periods = activity(cameras, args.seconds, seed=1)
+    decode_cost, plan_cost = args.decode_ms / 1000, args.plan_ms / 1000
+
+    clock = Clock()
+    scheduler = SamplingScheduler(args.budget, clock=clock)
+    for camera in cameras:
+        scheduler.add_camera(camera, FIXED_INTERVAL, 1.0)
+
+    print(f"{args.cameras} cameras, {args.seconds:.0f} s, budget {args.budget} cores")
+    print(f"{'sampling':>9} {'load':>6} {'peak':>6} {'samples':>8} {'moving':>7} {'delay ms':>9} {'max ms':>7}")
+    runs = (("fixed", simulate(periods, args.seconds, decode_cost, plan_cost)),
+            ("adaptive", simulate(periods, args.seconds, decode_cost, plan_cost, scheduler, clock)))
+    for name, r in runs:
+        print(f"{name:>9} {r['load']:>6.2f} {r['peak']:>6.2f} {r['samples']:>8} {r['moving']:>7} "
+              f"{r['delay_mean'] * 1000:>9.0f} {r['delay_max'] * 1000:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
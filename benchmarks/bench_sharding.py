@@ -0,0 +1,179 @@
+# benchmarks/bench_sharding.py
+#
+# Description:
+# Local multi-process harness for sharded ingest. For 1, 2 and 4 shards it
+# starts that many backend replicas (uvicorn subprocesses, each with its own
+# SQLite database and NJT_SHARDS / NJT_SHARD_INDEX set), then runs one load
+# generator process per shard. Every generator plays a set of cameras and
+# sends each camera's uploads straight to its owner (sharding.shard_for), a
+# full snapshot followed by deltas, for a fixed time. Reports total ingest
+# req/s, the speedup over one shard and the per-shard efficiency.
+#
+# It also checks the routing: an upload sent to the wrong replica must be
+# answered with a 307 to the owner, and /api/status/global must merge every
+# shard's spots.
+#
+# Scaling is bounded by the machine: replicas and load generators share its
+# cores, so near-linear scaling needs at least 2 x shards cores.
+#
+# How to Run:
+#   python benchmarks/bench_sharding.py [--shards 1 2 4] [--cameras 32] [--seconds 5]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='njt_bench_'), 'unused.db')}")
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.sharding import shard_for
+
+BASE_PORT = 8800
+SPOTS_PER_CAMERA = 8
+
+
+def camera_ids(count):
+    return [f"cam_{i:03d}" for i in range(count)]
+
+
+def seed(database_url, cameras):
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all([
+            models.Spot(spot_id=f"{camera}_S{i}", camera_id=camera, depot_id=f"depot_{int(camera[-3:]) % 3}")
+            for camera in cameras for i in range(SPOTS_PER_CAMERA)
+        ])
+        db.commit()
+    engine.dispose()
+
+
+def start_replicas(shards, cameras):
+    urls = [f"http://127.0.0.1:{BASE_PORT + i}" for i in range(shards)]
+    tmpdir = tempfile.mkdtemp(prefix="njt_bench_")
+    replicas = []
+    for index in range(shards):
+        database_url = f"sqlite:///{os.path.join(tmpdir, f'shard{index}.db')}"
+        seed(database_url, cameras)
+        env = dict(os.environ, DATABASE_URL=database_url, NJT_SHARDS=",".join(urls), NJT_SHARD_INDEX=str(index))
+        replicas.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+             "--port", str(BASE_PORT + index), "--log-level", "warning", "--backlog", "4096"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    deadline = time.time() + 30
+    for url in urls:
+        while True:
+            try:
+                httpx.get(url + "/api/status", timeout=1.0)
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline:
+                    stop(replicas)
+                    raise RuntimeError(f"replica {url} did not start")
+                time.sleep(0.1)
+    return urls, replicas
+
+
+def stop(replicas):
+    for replica in replicas:
+        replica.terminate()
+    for replica in replicas:
+        replica.wait()
+
+
+async def drive(urls, cameras, seconds):
+    """Uploads for `cameras`, each to its owner, until `seconds` pass; returns requests sent."""
+    sent = 0
+    deadline = time.perf_counter() + seconds
+
+    async def camera_loop(client, camera):
+        nonlocal sent
+        url = urls[shard_for(camera, len(urls))]
+        spots = [f"{camera}_S{i}" for i in range(SPOTS_PER_CAMERA)]
+        await client.post(url + "/api/detections", json={
+            "camera_id": camera, "seq": 0, "detections": [{"spot_id": s, "bus_number": "100"} for s in spots],
+        })
+        seq = 0
+        while time.perf_counter() < deadline:
+            response = await client.post(url + "/api/detections/delta", json={
+                "camera_id": camera, "seq": seq + 1, "base_seq": seq,
+                "upserts": [{"spot_id": spots[seq % len(spots)], "bus_number": str(100 + seq % 50)}],
+            })
+            if response.status_code == 200:
+                seq += 1
+            sent += 1
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        await asyncio.gather(*(camera_loop(client, camera) for camera in cameras))
+    return sent
+
+
+def generator(urls, cameras, seconds, results):
+    results.put(asyncio.run(drive(urls, cameras, seconds)))
+
+
+def check_routing(urls, cameras):
+    camera = cameras[0]
+    owner = shard_for(camera, len(urls))
+    wrong = urls[(owner + 1) % len(urls)]
+    payload = {"camera_id": camera, "detections": []}
+    response = httpx.post(wrong + "/api/detections", json=payload)
+    redirected = response.status_code == 307 and response.headers["location"].startswith(urls[owner])
+    followed = httpx.post(wrong + "/api/detections", json=payload, follow_redirects=True).status_code == 200
+    status = httpx.get(urls[0] + "/api/status/global").json()
+    merged = len(status["spots"]) == len(cameras) * SPOTS_PER_CAMERA and all(s["ok"] for s in status["shards"])
+    return redirected and followed, merged, status["depots"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest scaling across backend shards.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--cameras", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cameras = camera_ids(args.cameras)
+    print(f"{os.cpu_count()} CPU(s)")
+    print(f"{'shards':>7} {'req/s':>8} {'speedup':>8} {'efficiency':>11}")
+    baseline = None
+    for shards in args.shards:
+        urls, replicas = start_replicas(shards, cameras)
+        try:
+            results = multiprocessing.Queue()
+            # One load generator per shard, each driving an equal slice of the cameras.
+            workers = [
+                multiprocessing.Process(target=generator, args=(urls, cameras[i::shards], args.seconds, results))
+                for i in range(shards)
+            ]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            sent = sum(results.get() for _ in workers)
+            elapsed = time.perf_counter() - start
+            for worker in workers:
+                worker.join()
+            rate = sent / elapsed
+            baseline = baseline or rate
+            print(f"{shards:>7} {rate:>8.0f} {rate / baseline:>7.2f}x {rate / baseline / shards:>10.0%}")
+            if shards > 1:
+                routed, merged, depots = check_routing(urls, cameras)
+                print(f"{'':>7} routing 307 to owner: {'ok' if routed else 'FAILED'}; "
+                      f"global status merged: {'ok' if merged else 'FAILED'} {depots}")
+        finally:
+            stop(replicas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_startup.py
+#
+# Description:
+# Cold start of the backend and the detection engine, to catch startup
+# regressions:
+#   - import time of backend.main and of qr_code_engine, each in a fresh
+#     interpreter (median of --runs)
+#   - for the backend started with uvicorn: seconds from spawning the process
+#     to the first 200 from /health/live, /api/status and /health/ready
+#     (health endpoints that do not exist are reported as "-")
+# The backend runs against a throwaway SQLite database seeded with --spots
+# spots (70% occupied), so loading the status snapshot has real work to do.
+# Pass --database-url to measure against Postgres instead.
+#
+# How to Run:
+#   python benchmarks/bench_startup.py [--runs 5] [--spots 5000]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PORT = 8768
+BASE_URL = f"http://127.0.0.1:{PORT}"
+PROBES = ("/health/live", "/api/status", "/health/ready")
+
+
+def import_seconds(module, cwd, env):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def seed(database_url, spot_count):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    code = (
+        "from backend import database, migrate, models\n"
+        "migrate.run(database.engine)\n"
+        "db = database.SessionLocal()\n"
+        f"db.add_all([models.Spot(spot_id=f'S{{i:05d}}', camera_id=f'cam_{{i // 8:04d}}', "
+        f"coordinates_json=[i, i, i + 100, i + 100]) for i in range({spot_count})])\n"
+        f"db.add_all([models.BusLocation(spot_id=f'S{{i:05d}}', detected_bus_id=str(1000 + i), "
+        f"camera_id=f'cam_{{i // 8:04d}}') for i in range({spot_count}) if i % 10 < 7])\n"
+        "db.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def time_to_first_success(env):
+    """Seconds from spawning uvicorn to the first 200 of each probe (None if it never answered 200)."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(PORT),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    found = {}
+    missing = set()
+    try:
+        with httpx.Client(base_url=BASE_URL, timeout=1.0) as client:
+            while len(found) + len(missing) < len(PROBES) and time.perf_counter() - start < 60:
+                for probe in PROBES:
+                    if probe in found or probe in missing:
+                        continue
+                    try:
+                        status = client.get(probe).status_code
+                    except httpx.HTTPError:
+                        break  # not listening yet
+                    if status == 200:
+                        found[probe] = time.perf_counter() - start
+                    elif status == 404:
+                        missing.add(probe)
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    return {probe: found.get(probe) for probe in PROBES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first successful request.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--spots", type=int, default=5000)
+    parser.add_argument("--database-url", help="default: a throwaway SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='njt_bench_'), 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url)
+    if not args.database_url:
+        seed(database_url, args.spots)
+
+    print(f"{'import':>24} {'median ms':>10} {'min ms':>8}")
+    for module, cwd in (("backend.main", ROOT), ("qr_code_engine", os.path.join(ROOT, "detection"))):
+        samples = [import_seconds(module, cwd, env) * 1000 for _ in range(args.runs)]
+        print(f"{module:>24} {statistics.median(samples):>10.1f} {min(samples):>8.1f}")
+
+    print()
+    print(f"backend start, {args.spots} spots: seconds from spawn to first 200")
+    print(f"{'run':>4} " + " ".join(f"{probe:>14}" for probe in PROBES))
+    results = []
+    for run in range(args.runs):
+        r = time_to_first_success(env)
+        results.append(r)
+        print(f"{run:>4} " + " ".join(f"{r[p]:>14.3f}" if r[p] is not None else f"{'-':>14}" for p in PROBES))
+    medians = []
+    for probe in PROBES:
+        values = [r[probe] for r in results if r[probe] is not None]
+        medians.append(f"{statistics.median(values):>14.3f}" if values else f"{'-':>14}")
+    print(f"{'med':>4} " + " ".join(medians))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# benchmarks/bench_stream.py
+#
+# Description:
+# Load test for GET /api/status/stream. Starts the backend on a local port with
+# a throwaway SQLite database, connects N concurrent SSE subscribers (500 by
+# default, a few of which read deliberately slowly), posts a series of
+# detection changes and reports how long each change took to reach every
+# subscriber.
+#
+# How to Run:
+#   python benchmarks/bench_stream.py [--subscribers 500] [--changes 20]
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+_tmpdir = tempfile.mkdtemp(prefix="njt_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+
+import httpx
+import uvicorn
+
+from backend import database, migrate, models
+from backend.main import app, broadcaster
+
+CAMERA_ID = "cam_bench_01"
+SPOTS = [f"S{i:03d}" for i in range(50)]
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def seed_spots():
+    db = database.SessionLocal()
+    try:
+        db.add_all([models.Spot(spot_id=s, camera_id=CAMERA_ID) for s in SPOTS])
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_server():
+    config = uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def subscriber(client, index, sent_at, latencies, connected, slow):
+    """Reads the stream and records when each posted bus number first shows up."""
+    seen = set()
+    async with client.stream("GET", f"{BASE_URL}/api/status/stream") as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "snapshot" and not connected.done():
+                    connected.set_result(index)
+                for spot in data:
+                    bus = spot["actualBus"]
+                    if bus in sent_at and bus not in seen:
+                        seen.add(bus)
+                        latencies.append(time.perf_counter() - sent_at[bus])
+                if slow:
+                    await asyncio.sleep(0.5)
+
+
+async def run(args):
+    sent_at = {}
+    latencies = []
+    limits = httpx.Limits(max_connections=args.subscribers + 10, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        connected = [loop.create_future() for _ in range(args.subscribers)]
+        tasks = [
+            asyncio.create_task(subscriber(client, i, sent_at, latencies, connected[i], i < args.slow))
+            for i in range(args.subscribers)
+        ]
+        await asyncio.gather(*connected)
+        print(f"{args.subscribers} subscribers connected in {time.perf_counter() - start:.2f}s "
+              f"(server sees {broadcaster.subscriber_count})")
+
+        async with httpx.AsyncClient(timeout=10) as poster:
+            for i in range(args.changes):
+                bus = f"bus-{i}"
+                detections = [{"spot_id": SPOTS[i % len(SPOTS)], "bus_number": bus}]
+                sent_at[bus] = time.perf_counter()
+                response = await poster.post(f"{BASE_URL}/api/detections",
+                                             json={"camera_id": CAMERA_ID, "detections": detections})
+                response.raise_for_status()
+                await asyncio.sleep(args.interval)
+
+        # Let the slow readers catch up, then stop everyone.
+        await asyncio.sleep(2.0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    expected = args.subscribers * args.changes
+    fast = sorted(latencies)
+    print(f"deliveries: {len(latencies)} / {expected} "
+          f"(slow readers may see coalesced updates instead of every change)")
+    if fast:
+        p99 = fast[max(0, int(len(fast) * 0.99) - 1)]
+        print(f"delivery latency ms: p50 {statistics.median(fast) * 1000:.1f}  "
+              f"p99 {p99 * 1000:.1f}  max {fast[-1] * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--slow", type=int, default=5, help="subscribers that read slowly")
+    parser.add_argument("--changes", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.25)
+    args = parser.parse_args()
+
+    migrate.run(database.engine)
+    seed_spots()
+    server = start_server()
+    try:
+        asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
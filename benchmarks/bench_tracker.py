@@ -0,0 +1,125 @@
+# benchmarks/bench_tracker.py
+#
+# Description:
+# Replays generated sighting sequences through the spot tracker and through
+# the old persistence dict (every sighting overwrote the bus's spot, every
+# frame rescanned all buses for a 35 s cutoff). No images are involved: each
+# frame is the (bus_number, spot_id) list the pipeline would have produced for
+# a yard where buses arrive and leave, with decoder noise on top:
+#   - missed decodes (a parked bus is not seen in a frame)
+#   - misreads (a wrong bus number for one frame)
+#   - double sightings (a bus is also reported in the neighbouring spot, as
+#     when a code sits on a zone boundary)
+# For each yard size it reports precision/recall of the reported state against
+# the truth, how many spot changes would have been uploaded (each one is a
+# backend write) and the per-frame update cost.
+#
+# How to Run:
+#   python benchmarks/bench_tracker.py [--seconds 120] [--fps 10] [--sizes 10 100 1000]
+#       [--confirm-hits 2] [--confirm-window 1.0] [--clear-seconds 10]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+from tracker import SpotTracker
+
+LEGACY_SECONDS = 35.0
+
+
+class LegacyPersistence:
+    """The per-bus dict the tracker replaced, kept here as the baseline."""
+
+    def __init__(self, persistence_seconds=LEGACY_SECONDS):
+        self.persistence_seconds = persistence_seconds
+        self.buses = {}
+
+    def update(self, sightings, current_time):
+        for bus_number, spot_id in sightings:
+            self.buses[bus_number] = {"spot_id": spot_id, "timestamp": current_time}
+        stale_buses = [bus for bus, data in self.buses.items() if current_time - data["timestamp"] > self.persistence_seconds]
+        for bus in stale_buses:
+            del self.buses[bus]
+        return {data["spot_id"]: bus for bus, data in self.buses.items()}
+
+
+def generate(spots, seconds, fps, seed, miss=0.3, misread=0.01, double=0.03, dwell=300.0, vacancy=60.0):
+    """Yields (sightings, truth) per frame for a yard of `spots` spots."""
+    rng = random.Random(seed)
+    spot_ids = [f"S{i:05d}" for i in range(spots)]
+    parked = {}
+    changes_at = {spot: rng.expovariate(1 / dwell) for spot in spot_ids}
+    next_bus = 1000
+    for spot in spot_ids:
+        if rng.random() < dwell / (dwell + vacancy):
+            parked[spot] = str(next_bus)
+            next_bus += 1
+    for frame in range(int(seconds * fps)):
+        now = frame / fps
+        for spot in spot_ids:
+            if changes_at[spot] <= now:
+                if spot in parked:
+                    del parked[spot]
+                    changes_at[spot] = now + rng.expovariate(1 / vacancy)
+                else:
+                    parked[spot] = str(next_bus)
+                    next_bus += 1
+                    changes_at[spot] = now + rng.expovariate(1 / dwell)
+        sightings = []
+        for i, spot in enumerate(spot_ids):
+            bus = parked.get(spot)
+            if bus is None or rng.random() < miss:
+                continue
+            if rng.random() < misread:
+                bus = str(rng.randrange(1000, next_bus + 1000))
+            sightings.append((bus, spot))
+            if rng.random() < double:
+                sightings.append((bus, spot_ids[(i + 1) % spots]))
+        yield sightings, dict(parked)
+
+
+def score(tracker, frames, fps):
+    tp = fp = fn = writes = 0
+    elapsed = 0.0
+    state = {}
+    for index, (sightings, truth) in enumerate(frames):
+        start = time.perf_counter()
+        new_state = tracker.update(sightings, index / fps)
+        elapsed += time.perf_counter() - start
+        if new_state is not state:
+            writes += sum(1 for s, b in new_state.items() if state.get(s) != b)
+            writes += sum(1 for s in state if s not in new_state)
+        state = new_state
+        predicted, actual = set(state.items()), set(truth.items())
+        tp += len(predicted & actual)
+        fp += len(predicted - actual)
+        fn += len(actual - predicted)
+    return tp / max(tp + fp, 1), tp / max(tp + fn, 1), writes, elapsed / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spot tracker vs. the old persistence dict on replayed sightings.")
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--fps", type=float, default=10.0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--confirm-hits", type=int, default=2)
+    parser.add_argument("--confirm-window", type=float, default=1.0)
+    parser.add_argument("--clear-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'spots':>6} {'tracker':>8} {'precision':>10} {'recall':>7} {'writes':>7} {'us/frame':>9}")
+    for size in args.sizes:
+        frames = list(generate(size, args.seconds, args.fps, seed=size))
+        spot_tracker = SpotTracker(args.confirm_hits, args.confirm_window, args.clear_seconds)
+        for name, tracker in (("legacy", LegacyPersistence()), ("spot", spot_tracker)):
+            precision, recall, writes, us = score(tracker, frames, args.fps)
+            print(f"{size:>6} {name:>8} {precision:>10.1%} {recall:>7.1%} {writes:>7} {us:>9.1f}")
+        print(f"{'':>6} {'':>8} {spot_tracker.counters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# benchmarks/bench_uploader.py
+#
+# Description:
+# Exercises detection/uploader.py against a local stub of the detections API
+# that adds latency and can simulate an outage.
+#   1. Slow backend: a simulated decode loop submits a changing state at a
+#      fixed rate while every request takes --latency seconds. Reports submit()
+#      latency (what the decode thread pays), the decode rate achieved, how many
+#      states were coalesced and how many TCP connections were opened, next to
+#      the old blocking requests.post per frame.
+#   2. Outage: the backend answers 503 for a while; every state change made
+#      meanwhile must reach it afterwards, in order, followed by the live state.
+#   3. Restart: the engine stops during an outage; a new uploader on the same
+#      spool file must deliver the spooled changes once the backend is back.
+#   4. Refused: the backend answers 422; the refused state must be posted once,
+#      not on every submit, and the next change must get through.
+# Exits non-zero if a check fails.
+#
+# How to Run:
+#   python benchmarks/bench_uploader.py [--latency 0.3] [--seconds 5]
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+from delta_sync import CameraSync
+from uploader import BackendUploader
+
+
+class StubBackend:
+    """Minimal /api/detections and /api/detections/delta with the backend's seq rules."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.down = False
+        self.refuse = False
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.states = {}  # camera_id -> {spot_id: bus_number}
+        self.seqs = {}
+        self.history = []  # (camera_id, state) after every accepted request that changed it
+        self.connections = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stub.latency)
+                with stub.lock:
+                    stub.requests += 1
+                status = 503 if stub.down else 422 if stub.refuse else stub.handle(self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/detections"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, path, body):
+        camera_id = body["camera_id"]
+        with self.lock:
+            state = self.states.get(camera_id, {})
+            if path.endswith("/delta"):
+                last = self.seqs.get(camera_id)
+                if last is None or body["base_seq"] != last or body["seq"] <= last:
+                    return 409
+                new_state = dict(state)
+                for spot in body["removals"]:
+                    new_state.pop(spot, None)
+                new_state.update({d["spot_id"]: d["bus_number"] for d in body["upserts"]})
+            else:
+                new_state = {d["spot_id"]: d["bus_number"] for d in body["detections"]}
+            self.seqs[camera_id] = body.get("seq")
+            if new_state != state:
+                self.history.append((camera_id, new_state))
+            self.states[camera_id] = new_state
+            return 200
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def state_at(step, spots=20):
+    """A yard where one spot changes bus every step."""
+    state = {f"S{i}": str(1000 + i) for i in range(spots)}
+    for s in range(1, step + 1):
+        state[f"S{s % spots}"] = str(2000 + s)
+    return state
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def slow_backend(args, spool_dir):
+    stub = StubBackend(args.latency)
+    uploader = BackendUploader(stub.url, timeout=5.0, spool_path=os.path.join(spool_dir, "slow.jsonl"))
+    sync = CameraSync("cam_bench")
+    submit_times = []
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        frame_start = time.perf_counter()
+        t = time.perf_counter()
+        uploader.submit(sync, state_at(frames), time.time())
+        submit_times.append(time.perf_counter() - t)
+        frames += 1
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - frame_start)))
+    rate = frames / (time.perf_counter() - start)
+    uploader.close(timeout=10.0)
+    stats = uploader.stats()
+    final_ok = stub.states.get("cam_bench") == state_at(frames - 1)
+    connections = stub.connections
+    stub.close()
+
+    # The old path: one blocking POST without a session per frame.
+    stub = StubBackend(args.latency)
+    blocking_frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        frame_start = time.perf_counter()
+        requests.post(stub.url, data=json.dumps({"camera_id": "cam_bench", "detections": []}),
+                      headers={"Content-Type": "application/json"})
+        blocking_frames += 1
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - frame_start)))
+    blocking_rate = blocking_frames / (time.perf_counter() - start)
+    blocking_connections = stub.connections
+    stub.close()
+
+    print(f"Slow backend ({args.latency * 1000:.0f} ms per request), decode loop at {1 / args.interval:.0f} frames/s:")
+    print(f"  uploader: {rate:.1f} frames/s, submit p50 {statistics.median(submit_times) * 1e6:.0f} us, "
+          f"p99 {percentile(submit_times, 0.99) * 1e6:.0f} us, {stats['sent']} sent, "
+          f"{stats['coalesced']} coalesced, {connections} connection(s)")
+    print(f"  blocking: {blocking_rate:.1f} frames/s, {blocking_connections} connection(s)")
+    return final_ok and rate > 0.9 / args.interval
+
+
+def outage(args, spool_dir):
+    stub = StubBackend(0.01)
+    uploader = BackendUploader(stub.url, timeout=2.0, spool_path=os.path.join(spool_dir, "outage.jsonl"),
+                               backoff_initial=0.1, backoff_max=0.5)
+    sync = CameraSync("cam_bench")
+    uploader.submit(sync, state_at(0), time.time())
+    time.sleep(0.3)
+
+    stub.down = True
+    changes = []
+    for step in range(1, 11):
+        changes.append(state_at(step))
+        # Each state repeats for a few frames, like a parked yard between changes.
+        for _ in range(3):
+            uploader.submit(sync, changes[-1], time.time())
+            time.sleep(0.05)
+    spooled = uploader.stats()["spooled"]
+    stub.down = False
+    live = state_at(11)
+    uploader.submit(sync, live, time.time())
+    uploader.close(timeout=10.0)
+
+    received = [state for camera_id, state in stub.history if camera_id == "cam_bench"]
+    # Everything after the pre-outage state, in order, ending with the live state.
+    ok = received[1:] == changes + [live]
+    print(f"Outage: {len(changes)} changes during the outage, {spooled} spooled, "
+          f"{uploader.stats()['replayed']} replayed, received in order: {ok}")
+    stub.close()
+    return ok
+
+
+def restart(args, spool_dir):
+    stub = StubBackend(0.01)
+    spool_path = os.path.join(spool_dir, "restart.jsonl")
+    uploader = BackendUploader(stub.url, timeout=2.0, spool_path=spool_path, backoff_initial=0.1, backoff_max=0.5)
+    sync = CameraSync("cam_bench")
+    uploader.submit(sync, state_at(0), time.time())
+    time.sleep(0.3)
+
+    stub.down = True
+    changes = [state_at(step) for step in range(1, 6)]
+    for state in changes:
+        uploader.submit(sync, state, time.time())
+        time.sleep(0.05)
+    uploader.close(timeout=0.5)
+    spooled = len(open(spool_path).readlines())
+
+    # A new engine process: fresh CameraSync, same spool file.
+    stub.down = False
+    uploader = BackendUploader(stub.url, timeout=2.0, spool_path=spool_path, backoff_initial=0.1, backoff_max=0.5)
+    uploader.submit(CameraSync("cam_bench"), changes[-1], time.time())
+    uploader.close(timeout=10.0)
+
+    received = [state for camera_id, state in stub.history if camera_id == "cam_bench"]
+    ok = received[1:] == changes and not open(spool_path).read()
+    print(f"Restart: {spooled} states spooled across the restart, {uploader.stats()['replayed']} replayed, "
+          f"received in order and spool emptied: {ok}")
+    stub.close()
+    return ok
+
+
+def refused(args, spool_dir):
+    stub = StubBackend(0.0)
+    uploader = BackendUploader(stub.url, timeout=2.0, spool_path=os.path.join(spool_dir, "refused.jsonl"))
+    sync = CameraSync("cam_bench")
+    stub.refuse = True
+    state = state_at(0)
+    for _ in range(20):
+        uploader.submit(sync, state, time.time())
+        time.sleep(0.02)
+    requests_while_refused = stub.requests
+    stub.refuse = False
+    uploader.submit(sync, state_at(1), time.time())
+    uploader.close(timeout=10.0)
+
+    ok = requests_while_refused == 1 and stub.states.get("cam_bench") == state_at(1)
+    print(f"Refused: 20 submits of a refused state cost {requests_while_refused} request(s), "
+          f"{uploader.stats()['refused']} refused, next change delivered: {ok}")
+    stub.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background uploader against a slow or failing stub backend.")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds the stub takes per request")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between simulated decoded frames")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    spool_dir = tempfile.mkdtemp(prefix="njt_spool_")
+    results = [slow_backend(args, spool_dir), outage(args, spool_dir), restart(args, spool_dir),
+               refused(args, spool_dir)]
+    print("PASS" if all(results) else "FAIL")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/bench_wire.py
+#
+# Description:
+# Bytes on the wire and serialize/parse CPU per payload for the status and
+# upload formats in backend/wire.py, for yards of 10 to 5000 spots (70% of
+# them occupied). Status formats:
+#   - verbose: the old /api/status JSON, with every spot's coordinates
+#   - json: the current /api/status JSON (geometry moved to /api/layout)
+#   - compact / msgpack / packed: buses only, in layout order
+# each raw and gzipped (level 6, as the backend serves them). Encode is the
+# server's cost per version, decode the client's cost per poll; for the
+# compact formats decode includes joining the buses back onto the layout.
+# Uploads compare a full snapshot of every occupied spot (one engine's state, as
+# spooled replays send it) and a one-spot delta as JSON and as interned
+# msgpack; parse is the backend's wire.decode_upload.
+#
+# How to Run:
+#   python benchmarks/bench_wire.py [--spots 10 100 1000 5000]
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import msgpack
+
+from backend import wire
+
+
+def yard(spot_count, seed=1):
+    """(layout spots, occupancy) for a yard of `spot_count` spots over 8-spot cameras."""
+    rng = random.Random(seed)
+    spots = []
+    for i in range(spot_count):
+        camera = f"depot{i // 1000:02d}_cam_{i // 8:04d}"
+        x, y = rng.randrange(0, 1200), rng.randrange(0, 700)
+        spots.append({"spotId": f"{camera}_S{i % 8}", "cameraId": camera,
+                      "depotId": f"depot{i // 1000:02d}", "coordinates": [x, y, x + 160, y + 150]})
+    occupancy = {s["spotId"]: str(rng.randrange(1000, 9999)) for s in spots if rng.random() < 0.7}
+    return spots, occupancy
+
+
+def timed(fn, budget=0.2):
+    """Mean seconds per call of fn()."""
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget and runs >= 3:
+            return elapsed / runs
+
+
+def status_formats(spots, occupancy, layout_version):
+    spot_ids = [s["spotId"] for s in spots]
+    buses = [occupancy.get(spot_id) for spot_id in spot_ids]
+
+    def verbose():
+        return json.dumps([{"spotId": s["spotId"], "actualBus": occupancy.get(s["spotId"]), "cameraId": s["cameraId"],
+                            "depotId": s["depotId"], "coordinates": s["coordinates"]} for s in spots]).encode()
+
+    def plain():
+        return json.dumps([{"spotId": s["spotId"], "actualBus": occupancy.get(s["spotId"]), "cameraId": s["cameraId"],
+                            "depotId": s["depotId"]} for s in spots]).encode()
+
+    def join(version_and_buses):
+        _, decoded = version_and_buses
+        return dict(zip(spot_ids, decoded))
+
+    def compact_decode(body):
+        data = json.loads(body)
+        return join((data["layout"], data["buses"]))
+
+    def msgpack_decode(body):
+        data = msgpack.unpackb(body)
+        return join((data["layout"], data["buses"]))
+
+    return [
+        ("verbose", verbose, json.loads),
+        ("json", plain, json.loads),
+        ("compact", lambda: wire.encode_status(wire.COMPACT_JSON, layout_version, buses), compact_decode),
+        ("msgpack", lambda: wire.encode_status(wire.MSGPACK, layout_version, buses), msgpack_decode),
+        ("packed", lambda: wire.encode_status(wire.PACKED, layout_version, buses),
+         lambda body: join(wire.unpack_status(body))),
+    ]
+
+
+def upload_payloads(spots, occupancy):
+    """(name, JSON payload) for a full snapshot of every spot and a one-spot delta."""
+    camera = spots[-1]["cameraId"]
+    state = {s["spotId"]: occupancy[s["spotId"]] for s in spots if s["spotId"] in occupancy}
+    first = next(iter(state))
+    return [
+        ("full", {"camera_id": camera, "seq": 7,
+                  "detections": [{"spot_id": s, "bus_number": b} for s, b in state.items()]}),
+        ("delta", {"camera_id": camera, "seq": 8, "base_seq": 7,
+                   "upserts": [{"spot_id": first, "bus_number": "4321"}], "removals": []}),
+    ]
+
+
+def intern(payload, numbers, layout_version):
+    compact = {key: value for key, value in payload.items() if key not in ("detections", "upserts", "removals")}
+    compact["layout"] = layout_version
+    for key in ("detections", "upserts"):
+        if key in payload:
+            compact[key] = [[numbers[d["spot_id"]], d["bus_number"]] for d in payload[key]]
+    if "removals" in payload:
+        compact["removals"] = [numbers[s] for s in payload["removals"]]
+    return msgpack.packb(compact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire size and codec CPU of the status and upload formats.")
+    parser.add_argument("--spots", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    print("status (per poll)")
+    print(f"{'spots':>6} {'format':>8} {'bytes':>8} {'gzip':>7} {'encode us':>10} {'gzip us':>8} {'decode us':>10}")
+    for count in args.spots:
+        spots, occupancy = yard(count)
+        layout_version = 12345
+        for name, encode, decode in status_formats(spots, occupancy, layout_version):
+            body = encode()
+            zipped = gzip.compress(body, compresslevel=6, mtime=0)
+            print(f"{count:>6} {name:>8} {len(body):>8} {len(zipped):>7} {timed(encode) * 1e6:>10.1f} "
+                  f"{timed(lambda: gzip.compress(body, compresslevel=6, mtime=0)) * 1e6:>8.1f} "
+                  f"{timed(lambda: decode(body)) * 1e6:>10.1f}")
+        layout = json.dumps({"version": layout_version, "spots": spots}, separators=(",", ":")).encode()
+        print(f"{count:>6} {'layout':>8} {len(layout):>8} {len(gzip.compress(layout, 6, mtime=0)):>7}   (fetched once, cached)")
+
+    print()
+    print("uploads (per payload; the snapshot reports every occupied spot)")
+    print(f"{'spots':>6} {'payload':>8} {'format':>8} {'bytes':>7} {'encode us':>10} {'parse us':>9}")
+    for count in args.spots:
+        spots, occupancy = yard(count)
+        spot_ids = [s["spotId"] for s in spots]
+        numbers = {spot_id: i for i, spot_id in enumerate(spot_ids)}
+        for kind, payload in upload_payloads(spots, occupancy):
+            as_json = json.dumps(payload).encode()
+            as_msgpack = intern(payload, numbers, 12345)
+            for name, body, encode, content_type in (
+                    ("json", as_json, lambda: json.dumps(payload).encode(), wire.JSON),
+                    ("msgpack", as_msgpack, lambda: intern(payload, numbers, 12345), wire.MSGPACK)):
+                parse = timed(lambda: wire.decode_upload(body, content_type, 12345, spot_ids))
+                print(f"{count:>6} {kind:>8} {name:>8} {len(body):>7} {timed(encode) * 1e6:>10.1f} {parse * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
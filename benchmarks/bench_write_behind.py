@@ -0,0 +1,155 @@
+# benchmarks/bench_write_behind.py
+#
+# Description:
+# Committed detection payloads per second with and without the write-behind
+# group commit (backend/write_behind.py). Starts the backend with uvicorn in a
+# subprocess, once with DETECTION_FLUSH_MS=0 (every payload commits itself)
+# and once with the default flush interval, and drives it with 1, 16 and 128
+# concurrent cameras, each sending a full snapshot and then delta uploads
+# that change one spot. Reports payloads/second, p50/p99 latency, errors and
+# the INSERT/DELETE statements the database ran per payload.
+#
+# After each run the server is stopped with SIGTERM, which flushes whatever is
+# still staged, and bus_locations is compared with the last state every camera
+# had acknowledged: nothing acknowledged may be missing.
+#
+# By default this uses a throwaway SQLite file; pass --database-url to run it
+# against Postgres.
+#
+# How to Run:
+#   python benchmarks/bench_write_behind.py [--requests 4000] [--concurrency 1 16 128] [--flush-ms 50]
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine, text
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PORT = 8767
+BASE_URL = f"http://127.0.0.1:{PORT}"
+SPOTS_PER_CAMERA = 8
+
+
+def start_server(database_url, flush_ms):
+    env = dict(os.environ, DATABASE_URL=database_url, DETECTION_FLUSH_MS=str(flush_ms))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(PORT), "--log-level", "warning", "--backlog", "4096"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(BASE_URL + "/api/status", timeout=1.0)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("backend did not start")
+
+
+def write_statements():
+    body = httpx.get(BASE_URL + "/metrics").text
+    return sum(float(value) for value in re.findall(r'njt_db_statements_total\{operation="(?:INSERT|DELETE)"\} (\S+)', body))
+
+
+async def camera_client(client, camera_id, requests, latencies, errors, acknowledged):
+    spots = [f"{camera_id}_S{i}" for i in range(SPOTS_PER_CAMERA)]
+    state = {spot: "100" for spot in spots}
+    # SQLite can time out under the per-request load; the engines retry too.
+    for _ in range(5):
+        response = await client.post("/api/detections", json={
+            "camera_id": camera_id, "seq": 0,
+            "detections": [{"spot_id": spot, "bus_number": bus} for spot, bus in state.items()],
+        })
+        if response.status_code < 500:
+            break
+    response.raise_for_status()
+    acknowledged.update(state)
+    seq = 0
+    for i in range(requests):
+        spot, bus = spots[i % len(spots)], str(100 + i % 50)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/detections/delta", json={
+                "camera_id": camera_id, "seq": seq + 1, "base_seq": seq,
+                "upserts": [{"spot_id": spot, "bus_number": bus}],
+            })
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if ok:
+            seq += 1
+            acknowledged[spot] = bus
+        else:
+            errors.append(i)
+
+
+async def run_level(concurrency, total_requests, run_id, acknowledged):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=30.0) as client:
+        latencies, errors = [], []
+        per_client = max(1, total_requests // concurrency)
+        statements = write_statements()
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            camera_client(client, f"cam_{run_id}_{concurrency}_{c}", per_client, latencies, errors, acknowledged)
+            for c in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+        statements = write_statements() - statements
+    latencies.sort()
+    return {
+        "pps": (len(latencies) - len(errors)) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": len(errors),
+        "statements": statements / max(1, len(latencies) - len(errors)),
+    }
+
+
+def missing_rows(database_url, acknowledged):
+    """Acknowledged spot states that are not in bus_locations."""
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        stored = dict(conn.execute(text("SELECT spot_id, detected_bus_id FROM bus_locations")).all())
+    engine.dispose()
+    return sum(1 for spot, bus in acknowledged.items() if stored.get(spot) != bus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection ingest with and without write-behind group commit.")
+    parser.add_argument("--requests", type=int, default=4000, help="delta uploads per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--flush-ms", type=float, default=50.0, help="write-behind flush interval")
+    parser.add_argument("--database-url", help="default: a throwaway SQLite file per mode")
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'clients':>8} {'payloads/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'stmts/payload':>14}")
+    for flush_ms in (0, args.flush_ms):
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='njt_bench_'), 'bench.db')}"
+        mode = f"flush {flush_ms:g}ms" if flush_ms else "per-request"
+        acknowledged = {}
+        server = start_server(database_url, flush_ms)
+        try:
+            for concurrency in args.concurrency:
+                r = asyncio.run(run_level(concurrency, args.requests, "wb" if flush_ms else "direct", acknowledged))
+                print(f"{mode:>12} {concurrency:>8} {r['pps']:>11.0f} {r['p50_ms']:>8.1f} "
+                      f"{r['p99_ms']:>8.1f} {r['errors']:>7} {r['statements']:>14.2f}")
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:>12} after shutdown: {missing_rows(database_url, acknowledged)} of "
+              f"{len(acknowledged)} acknowledged spot states missing from bus_locations")
+
+
+if __name__ == "__main__":
+    main()
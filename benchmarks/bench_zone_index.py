@@ -0,0 +1,82 @@
+# benchmarks/bench_zone_index.py
+#
+# Description:
+# Microbenchmark for assigning decoded QR codes to parking spots. Builds
+# synthetic depot layouts (a grid of rectangular spots, or the same grid as
+# slightly rotated polygons) and compares the linear get_spot_for_qr scan with
+# the grid-backed ZoneIndex for a frame's worth of codes. Both must agree on
+# every code.
+#
+# How to Run:
+#   python benchmarks/bench_zone_index.py [--codes 100]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'detection')))
+
+import numpy as np
+
+from zones import ZoneIndex, get_spot_for_qr
+
+SPOT_W, SPOT_H, GAP = 40, 90, 6
+
+
+def make_layout(count, polygons):
+    columns = int(np.ceil(np.sqrt(count * SPOT_H / SPOT_W)))
+    zones = {}
+    for n in range(count):
+        x0 = (n % columns) * (SPOT_W + GAP)
+        y0 = (n // columns) * (SPOT_H + GAP)
+        if polygons:
+            # A parallelogram, as painted bays often look from a tilted camera.
+            zones[f"S{n:05d}"] = [[x0 + 4, y0], [x0 + SPOT_W, y0], [x0 + SPOT_W - 4, y0 + SPOT_H], [x0, y0 + SPOT_H]]
+        else:
+            zones[f"S{n:05d}"] = (x0, y0, x0 + SPOT_W, y0 + SPOT_H)
+    width = columns * (SPOT_W + GAP)
+    height = (count // columns + 1) * (SPOT_H + GAP)
+    return zones, width, height
+
+
+def make_codes(count, width, height, rng):
+    centers = rng.uniform((0, 0), (width, height), size=(count, 2))
+    offsets = np.array([[-8, -8], [8, -8], [8, 8], [-8, 8]], dtype=np.float32)
+    return [(f"bus{i}", (c + offsets).astype(np.float32)) for i, c in enumerate(centers)]
+
+
+def time_per_frame(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Linear zone scan vs. ZoneIndex.")
+    parser.add_argument("--codes", type=int, default=100, help="decoded codes per frame")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'layout':>9} {'spots':>6} {'build ms':>9} {'linear us':>10} {'index us':>9} {'speedup':>8}")
+    for polygons in (False, True):
+        for size in args.sizes:
+            zones, width, height = make_layout(size, polygons)
+            codes = make_codes(args.codes, width, height, rng)
+
+            start = time.perf_counter()
+            index = ZoneIndex(zones)
+            build = time.perf_counter() - start
+
+            repeat = max(1, 2000 // size)
+            linear, expected = time_per_frame(lambda: [get_spot_for_qr(p, zones) for _, p in codes], repeat)
+            indexed, found = time_per_frame(lambda: index.lookup_codes(codes), max(repeat, 20))
+            assert found == expected, "ZoneIndex disagrees with get_spot_for_qr"
+            print(f"{'polygon' if polygons else 'rect':>9} {size:>6} {build * 1000:>9.1f} "
+                  f"{linear * 1e6:>10.0f} {indexed * 1e6:>9.0f} {linear / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# detection/capture.py
+#
+# Description:
+# Building blocks for recording datasets (training images, replay footage)
+# without holding up the capture loop, used by imageCollector.py:
+#   - FrameDecimator decides which frames are worth keeping: at most one per
+#     `interval` seconds and, with `motion`, only frames that differ from the
+#     last kept one (still forcing one every `max_interval` seconds).
+#   - DatasetWriter encodes kept frames to JPEG or PNG on a pool of encoder
+#     threads (cv2.imencode releases the GIL). Frames wait in a bounded queue;
+#     when the encoders fall behind new frames are dropped and counted instead
+#     of blocking capture. Files go into shard directories of `shard_size`
+#     frames, optionally with one crop per parking zone next to each frame,
+#     and every written frame gets a line in manifest.jsonl:
+#       {"file": "00000/cam_..._000000.jpg", "timestamp": ..., "camera": ...,
+#        "frame": 0, "width": 640, "height": 480,
+#        "crops": {"A1": {"file": "00000/..._A1.jpg", "box": [x0, y0, x1, y1]}}}
+#     Lines are appended as encoders finish, so they are not strictly in frame
+#     order; sort by "frame" (or "timestamp") when reading.
+
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from telemetry import get_logger
+from zones import zone_bounds
+
+logger = get_logger("njt.capture")
+
+MANIFEST_FILE = "manifest.jsonl"
+FORMATS = ("jpg", "png")
+
+
+class FrameDecimator:
+    def __init__(self, interval=0.0, motion=False, max_interval=None, scale=0.25, blur=5,
+                 pixel_threshold=25, changed_fraction=0.01):
+        """
+        A frame counts as moved when more than `changed_fraction` of the pixels
+        of a blurred, `scale`d grayscale copy differ from the last kept frame by
+        more than `pixel_threshold` gray levels (the same test ZoneMotionGate
+        applies per zone).
+        """
+        self.interval = interval
+        self.motion = motion
+        self.max_interval = max_interval
+        self.scale = scale
+        self.blur = blur
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.kept = 0
+        self.skipped = 0
+        self._last_kept = float("-inf")
+        self._reference = None
+
+    def _shrink(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (self.blur, self.blur), 0) if self.blur else small
+
+    def keep(self, frame, now):
+        """True if `frame`, captured at `now`, should be saved."""
+        elapsed = now - self._last_kept
+        if elapsed < self.interval:
+            self.skipped += 1
+            return False
+        if self.motion:
+            small = self._shrink(frame)
+            forced = self.max_interval is not None and elapsed >= self.max_interval
+            if self._reference is not None and not forced and small.shape == self._reference.shape:
+                diff = cv2.absdiff(small, self._reference)
+                changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+                if changed <= self.changed_fraction * diff.size:
+                    self.skipped += 1
+                    return False
+            self._reference = small
+        self._last_kept = now
+        self.kept += 1
+        return True
+
+
+class DatasetWriter:
+    def __init__(self, output_dir, camera_id="camera", image_format="jpg", quality=95, zones=None,
+                 workers=2, queue_size=64, shard_size=1000):
+        """
+        `zones` ({spot_id: zone}) turns on per-zone crop export. `quality` is
+        the JPEG quality, or the PNG compression level (0-9) for png.
+        """
+        if image_format not in FORMATS:
+            raise ValueError(f"image_format must be one of {FORMATS}")
+        self.output_dir = output_dir
+        self.camera_id = camera_id
+        self.extension = "." + image_format
+        self.params = ([cv2.IMWRITE_JPEG_QUALITY, quality] if image_format == "jpg"
+                       else [cv2.IMWRITE_PNG_COMPRESSION, min(9, quality)])
+        self.zones = {spot_id: zone_bounds(zone) for spot_id, zone in (zones or {}).items()}
+        self.shard_size = shard_size
+        # Files of one run share a prefix so a later run into the same directory never overwrites them.
+        self._prefix = f"{camera_id}_{int(time.time() * 1000)}"
+        os.makedirs(output_dir, exist_ok=True)
+        self._manifest = open(os.path.join(output_dir, MANIFEST_FILE), "a")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.encode_seconds = 0.0
+        self._workers = [
+            threading.Thread(target=self._run, name=f"dataset-encoder-{i}", daemon=True) for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, frame, timestamp, frame_number=None, block=False):
+        """
+        Queues `frame` for writing and returns at once: False (and counted as
+        dropped) if the queue is full. With `block`, waits for room instead,
+        for sources that can be read at any pace. The frame must not be
+        modified afterwards.
+        """
+        try:
+            self._queue.put((frame, timestamp, frame_number), block=block)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "queued": self._queue.qsize(),
+                "bytes": self.bytes_written,
+                "encode_seconds": round(self.encode_seconds, 3),
+            }
+
+    def close(self):
+        """Writes everything still queued, then stops the encoders."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._manifest.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except (cv2.error, OSError) as e:
+                with self._lock:
+                    self.failed += 1
+                    failed = self.failed
+                # A full disk fails every frame; the logger's rate limit keeps this from flooding.
+                logger.warning("could not write frame", extra={"fields": {"error": str(e), "failed": failed}})
+
+    def _encode(self, image, path):
+        start = time.perf_counter()
+        ok, encoded = cv2.imencode(self.extension, image, self.params)
+        if not ok:
+            raise OSError(f"encoding {path} failed")
+        with open(os.path.join(self.output_dir, path), "wb") as f:
+            f.write(encoded)
+        return len(encoded), time.perf_counter() - start
+
+    def _write(self, frame, timestamp, frame_number):
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        shard = f"{index // self.shard_size:05d}"
+        os.makedirs(os.path.join(self.output_dir, shard), exist_ok=True)
+        name = f"{self._prefix}_{index:06d}"
+        path = f"{shard}/{name}{self.extension}"
+        size, seconds = self._encode(frame, path)
+        height, width = frame.shape[:2]
+        crops = {}
+        for spot_id, (x0, y0, x1, y1) in self.zones.items():
+            box = [max(0, int(x0)), max(0, int(y0)), min(width, int(x1)), min(height, int(y1))]
+            if box[2] <= box[0] or box[3] <= box[1]:
+                continue
+            crop_path = f"{shard}/{name}_{spot_id}{self.extension}"
+            crop_size, crop_seconds = self._encode(frame[box[1]:box[3], box[0]:box[2]], crop_path)
+            size += crop_size
+            seconds += crop_seconds
+            crops[spot_id] = {"file": crop_path, "box": box}
+        entry = {
+            "file": path, "timestamp": round(timestamp, 3), "camera": self.camera_id,
+            "frame": index if frame_number is None else frame_number, "width": width, "height": height,
+        }
+        if self.zones:
+            entry["crops"] = crops
+        with self._lock:
+            self._manifest.write(json.dumps(entry) + "\n")
+            self._manifest.flush()
+            self.written += 1
+            self.bytes_written += size
+            self.encode_seconds += seconds
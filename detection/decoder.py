@@ -0,0 +1,241 @@
+# detection/decoder.py
+#
+# Description:
+# The QR decoding cascade shared by the live single-camera engine and the
+# multi-camera worker processes. A region is tried with progressively more
+# expensive stages and the cascade stops at the first stage by which every
+# expected code has been decoded:
+#   gray      - detectAndDecodeMulti on the plain grayscale image
+#   threshold - the same on a global Otsu threshold (cheap contrast boost)
+#   bilateral - bilateral filter + adaptive threshold (the original chain)
+#   wechat    - OpenCV's CNN-based WeChat detector with super-resolution, using
+#               the Caffe models in detection/models (needs opencv-contrib-python)
+# CascadePolicy learns, per region, which stage usually succeeds and starts
+# there, and keeps per-stage hit rates and timings.
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from telemetry import get_logger
+
+STAGES = ("gray", "threshold", "bilateral", "wechat")
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+
+logger = get_logger("njt.decoder")
+
+
+def parse_bus_number(data):
+    """QR codes may hold a bare bus number or a URL ending in one."""
+    return data.split('/')[-1] if data.startswith('http') else data
+
+
+def preprocess(gray_frame, filtered=None, dst=None):
+    """
+    Returns the bilateral-filtered, adaptively thresholded image. `filtered`
+    and `dst` are optional preallocated buffers of the frame's shape.
+    """
+    # Apply a bilateral filter to reduce noise while preserving sharp edges.
+    filtered_frame = cv2.bilateralFilter(gray_frame, 9, 75, 75, dst=filtered)
+    # Apply adaptive thresholding to the filtered image to create a high-contrast version.
+    return cv2.adaptiveThreshold(filtered_frame, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=dst)
+
+
+class ScratchBuffers:
+    """
+    Reusable uint8 images keyed by purpose and shape. Zone ROIs and frames keep
+    the same sizes from frame to frame, so after the first frame every
+    intermediate image is written into an existing buffer instead of a fresh
+    allocation. Not thread-safe: one per decoding thread or process.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape):
+        key = (name, shape)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+
+_wechat_warned = False
+
+
+def wechat_available():
+    return hasattr(cv2, "wechat_qrcode_WeChatQRCode")
+
+
+def available_stages(stages=STAGES):
+    """`stages` minus any this OpenCV build cannot run."""
+    global _wechat_warned
+    if "wechat" in stages and not wechat_available():
+        if not _wechat_warned:
+            _wechat_warned = True
+            logger.warning("wechat stage disabled: this OpenCV build has no wechat_qrcode "
+                           "(install opencv-contrib-python)", extra={"fields": {"opencv": cv2.__version__}})
+        return [s for s in stages if s != "wechat"]
+    return list(stages)
+
+
+class DecodeCascade:
+    """Runs decode stages on an image; holds the (per-thread) detectors and scratch buffers."""
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.detector = cv2.QRCodeDetector()
+        self.models_dir = models_dir
+        self._wechat = None
+        self.scratch = ScratchBuffers()
+
+    def _stage_image(self, stage, gray):
+        if stage == "threshold":
+            dst = self.scratch.get("threshold", gray.shape)
+            return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)[1]
+        if stage == "bilateral":
+            return preprocess(gray, self.scratch.get("filtered", gray.shape), self.scratch.get("bilateral", gray.shape))
+        return gray
+
+    def _detect(self, stage, image):
+        # Wrap detection calls in try/except blocks to prevent crashes from low-level OpenCV errors.
+        try:
+            if stage == "wechat":
+                if self._wechat is None:
+                    m = self.models_dir
+                    self._wechat = cv2.wechat_qrcode_WeChatQRCode(
+                        os.path.join(m, "detect.prototxt"), os.path.join(m, "detect.caffemodel"),
+                        os.path.join(m, "sr.prototxt"), os.path.join(m, "sr.caffemodel"),
+                    )
+                decoded_info, points = self._wechat.detectAndDecode(image)
+                ok = len(decoded_info) > 0
+            else:
+                ok, decoded_info, points, _ = self.detector.detectAndDecodeMulti(image)
+        except cv2.error as e:
+            logger.warning("opencv error", extra={"fields": {"stage": stage, "error": str(e)}})
+            return []
+        if not ok or points is None:
+            return []
+        return [
+            (parse_bus_number(data), points[i].reshape(-1, 2))
+            for i, data in enumerate(decoded_info) if data
+        ]
+
+    def run(self, gray, order, expected=1, max_stages=None, debug_frame=None):
+        """
+        Tries the stages in `order` on `gray` until at least `expected` distinct
+        codes have been decoded (or `max_stages` stages ran). Returns
+        (codes, log): codes as [(bus_number, 4x2 points)], and log as
+        [(stage, seconds, decoded_anything)] for each stage that ran.
+        """
+        found = {}
+        log = []
+        for stage in order[:max_stages]:
+            start = time.perf_counter()
+            image = self._stage_image(stage, gray)
+            codes = self._detect(stage, image)
+            log.append((stage, time.perf_counter() - start, bool(codes)))
+            for bus_number, points in codes:
+                found.setdefault(bus_number, points)
+            if debug_frame is not None:
+                debug_frame[...] = image
+            if len(found) >= expected:
+                break
+        return list(found.items()), log
+
+
+def decode_regions(cascade, gray_frame, tasks, debug_frame=None):
+    """
+    Runs the cascade on each task (roi, order, expected, max_stages), where roi
+    is (x_start, y_start, x_end, y_end) or None for the whole frame. Points are
+    mapped back to frame coordinates. If `debug_frame` is given, the image of
+    the last stage tried on each region is pasted into it. Returns one
+    (codes, log) pair per task.
+    """
+    results = []
+    for roi, order, expected, max_stages in tasks:
+        if roi is None:
+            x_start = y_start = 0
+            crop, debug_crop = gray_frame, debug_frame
+        else:
+            x_start, y_start, x_end, y_end = roi
+            crop = gray_frame[y_start:y_end, x_start:x_end]
+            debug_crop = None if debug_frame is None else debug_frame[y_start:y_end, x_start:x_end]
+        codes, log = cascade.run(crop, order, expected, max_stages, debug_crop)
+        results.append(([(bus, points + (x_start, y_start)) for bus, points in codes], log))
+    return results
+
+
+class CascadePolicy:
+    """
+    Decides the stage order for each region from what succeeded there before,
+    and accumulates per-stage statistics. Lives with the engine (not in decode
+    workers) so learning is shared by every worker decoding that camera.
+    """
+
+    def __init__(self, stages=STAGES, empty_region_stages=2, full_scan_every=10):
+        """
+        A region whose last scan found nothing is probably an empty spot; it
+        only gets the first `empty_region_stages` stages of its order so empty
+        bays do not pay for the expensive stages every frame. The cap only
+        applies to regions where one of those cheap stages has decoded a code
+        before (otherwise a bus only the later stages can read would never be
+        found), never to scans the caller marks as `full` (the motion gate saw
+        the region change), and lifts every `full_scan_every`-th scan.
+        """
+        self.stages = available_stages(stages)
+        self.empty_region_stages = empty_region_stages
+        self.full_scan_every = full_scan_every
+        self.wins = {}  # region -> {stage: times it was the stage that finished the region}
+        self.last_found = {}  # region -> codes decoded at its last scan
+        self.capped_scans = {}  # region -> capped scans since its last full one
+        self.stage_stats = {s: {"runs": 0, "hits": 0, "seconds": 0.0} for s in self.stages}
+
+    def _may_cap(self, region, wins, full):
+        if full or not wins or not any(wins.get(s) for s in self.stages[:self.empty_region_stages]):
+            self.capped_scans[region] = 0
+            return False
+        capped = self.capped_scans.get(region, 0) + 1
+        if self.full_scan_every and capped >= self.full_scan_every:
+            self.capped_scans[region] = 0
+            return False
+        self.capped_scans[region] = capped
+        return True
+
+    def plan(self, region, capacity, full=False):
+        """
+        Returns (order, expected, max_stages) for a region holding `capacity`
+        zones. `full` asks for every stage even if the region looks empty.
+        """
+        wins = self.wins.get(region)
+        order = self.stages
+        if wins:
+            # Most successful stage first; the rest keep their cheap-to-expensive order.
+            order = sorted(self.stages, key=lambda s: (-wins.get(s, 0), self.stages.index(s)))
+        expected = self.last_found.get(region, capacity)
+        if expected == 0:
+            return order, 1, self.empty_region_stages if self._may_cap(region, wins, full) else None
+        return order, min(expected, capacity) if capacity else expected, None
+
+    def record(self, region, found, log):
+        self.last_found[region] = found
+        for stage, seconds, hit in log:
+            stats = self.stage_stats.setdefault(stage, {"runs": 0, "hits": 0, "seconds": 0.0})
+            stats["runs"] += 1
+            stats["hits"] += hit
+            stats["seconds"] += seconds
+        if found and log:
+            wins = self.wins.setdefault(region, {})
+            wins[log[-1][0]] = wins.get(log[-1][0], 0) + 1
+
+    def report(self):
+        """Per-stage runs, hit rate and mean latency in milliseconds."""
+        return {
+            stage: {
+                "runs": s["runs"],
+                "hit_rate": s["hits"] / s["runs"] if s["runs"] else 0.0,
+                "mean_ms": 1000 * s["seconds"] / s["runs"] if s["runs"] else 0.0,
+            }
+            for stage, s in self.stage_stats.items()
+        }
@@ -0,0 +1,93 @@
+# detection/delta_sync.py
+#
+# Description:
+# Tracks what the backend has acknowledged for a camera so the detection engine
+# only uploads what changed. The first upload (and any upload after the backend
+# rejects a delta) is a full snapshot; after that each upload carries just the
+# spots that were added, moved or emptied, or is an empty heartbeat when nothing
+# changed for a while. The uploads themselves are sent by uploader.py.
+
+import time
+
+
+def state_fingerprint(state):
+    """Cheap order-independent fingerprint of a {spot_id: bus_number} map."""
+    return hash(frozenset(state.items()))
+
+
+class CameraSync:
+    """
+    Per-camera record of the last state the backend acknowledged.
+
+    Call `build_update()` with the current {spot_id: bus_number} map. It returns
+    None when there is nothing worth sending, or a (kind, payload) pair where
+    kind is "full" or "delta". After the POST, call `acknowledge()` on a 2xx
+    response or `reset()` on a 409, which forces the next update to be a full
+    snapshot. Network errors need no call: the same diff is rebuilt next time.
+
+    States are treated as immutable once passed in (the spot tracker replaces
+    its dict on every change), so the dict that was acknowledged last is known
+    to be unchanged without fingerprinting it again.
+    """
+
+    def __init__(self, camera_id, heartbeat_seconds=5.0):
+        self.camera_id = camera_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.seq = 0
+        self.acked_state = None
+        self.acked_fingerprint = None
+        self.acked_source = None
+        self.last_ack_time = 0.0
+
+    def reset(self):
+        self.acked_state = None
+        self.acked_fingerprint = None
+        self.acked_source = None
+
+    def build_update(self, state, now=None):
+        now = time.time() if now is None else now
+        next_seq = self.seq + 1
+
+        if self.acked_state is None:
+            return "full", {
+                "camera_id": self.camera_id,
+                "seq": next_seq,
+                "detections": [{"spot_id": s, "bus_number": b} for s, b in state.items()],
+            }
+
+        if state is self.acked_source or state_fingerprint(state) == self.acked_fingerprint:
+            if now - self.last_ack_time < self.heartbeat_seconds:
+                return None
+            # Heartbeat: no changes, but lets the backend know we are alive and
+            # lets us notice quickly if it restarted and lost our sequence.
+            return "delta", {
+                "camera_id": self.camera_id,
+                "seq": next_seq,
+                "base_seq": self.seq,
+                "upserts": [],
+                "removals": [],
+            }
+
+        # Added buses and buses that moved both show up as a spot whose bus
+        # changed; a moved bus's old spot shows up as a removal.
+        upserts = [
+            {"spot_id": s, "bus_number": b}
+            for s, b in state.items()
+            if self.acked_state.get(s) != b
+        ]
+        removals = [s for s in self.acked_state if s not in state]
+        return "delta", {
+            "camera_id": self.camera_id,
+            "seq": next_seq,
+            "base_seq": self.seq,
+            "upserts": upserts,
+            "removals": removals,
+        }
+
+    def acknowledge(self, seq, state, now=None):
+        self.seq = seq
+        self.acked_state = dict(state)
+        self.acked_fingerprint = state_fingerprint(self.acked_state)
+        self.acked_source = state
+        self.last_ack_time = time.time() if now is None else now
+
@@ -0,0 +1,116 @@
+# detection/frame_ring.py
+#
+# Description:
+# Fixed rings of preallocated frame slots. The capture thread reads camera
+# frames straight into a free slot and hands the slot *index* to the decoder;
+# the slot goes back to the free list once its results have been merged, so no
+# frame is copied or allocated per capture.
+#   FrameRing       - slots in process memory, for a decode thread. Also does
+#                     latest-frame-wins handoff: a published frame the decoder
+#                     has not started on yet is dropped when a newer one arrives.
+#   SharedFrameRing - slots in one shared-memory block, mapped by name in decode
+#                     processes, so frames are never pickled between processes.
+
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class FrameRing:
+    def __init__(self, slots, shape, dtype=np.uint8):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frames = self._allocate()
+        self._free = deque(range(slots))
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._published = None  # (slot, stamp) waiting for the decoder
+        self._stopped = False
+        self.dropped = 0
+
+    def _allocate(self):
+        return np.empty((self.slots,) + self.shape, dtype=self.dtype)
+
+    def acquire(self, timeout=0.0):
+        """Returns a free slot index, or None if every slot is still in flight."""
+        with self._available:
+            if not self._free and timeout:
+                self._available.wait_for(lambda: self._free, timeout)
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        with self._available:
+            self._free.append(slot)
+            self._available.notify_all()
+
+    def in_flight(self):
+        with self._lock:
+            return self.slots - len(self._free)
+
+    def publish(self, slot, stamp=None):
+        """
+        Hands `slot` to the decoder together with `stamp` (e.g. its capture
+        time). If the previously published slot was not taken yet it is stale:
+        it is released and counted as dropped.
+        """
+        with self._available:
+            if self._published is not None:
+                self._free.append(self._published[0])
+                self.dropped += 1
+            self._published = (slot, stamp)
+            self._available.notify_all()
+
+    def take_latest(self, timeout=None):
+        """
+        Waits for a published slot and returns (slot, stamp); the caller owns
+        the slot until it calls release(). Returns None once stop() was called
+        or on timeout.
+        """
+        with self._available:
+            self._available.wait_for(lambda: self._published is not None or self._stopped, timeout)
+            if self._stopped or self._published is None:
+                return None
+            published, self._published = self._published, None
+            return published
+
+    def stop(self):
+        """Wakes take_latest() callers for shutdown."""
+        with self._available:
+            self._stopped = True
+            self._available.notify_all()
+
+
+class SharedFrameRing(FrameRing):
+    def _allocate(self):
+        slot_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes * self.slots)
+        return np.ndarray((self.slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """What a worker process needs to map this ring: (name, slots, shape, dtype)."""
+        return self.shm.name, self.slots, self.shape, self.dtype.str
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_ring(spec):
+    """
+    Maps a ring created in another process. Returns (shm, frames); keep the shm
+    object alive for as long as the frames array is used.
+    """
+    name, slots, shape, dtype = spec
+    # Pool workers share the engine's resource tracker, so attaching here does
+    # not make the block get unlinked when a worker exits.
+    shm = shared_memory.SharedMemory(name=name)
+    frames = np.ndarray((slots,) + tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+    return shm, frames
@@ -0,0 +1,72 @@
+# detection/frame_sources.py
+#
+# Description:
+# Opens the different kinds of camera sources the engines accept: a webcam
+# index, a video file / stream URL, or a directory of still images (played in
+# filename order). Everything is wrapped to look like cv2.VideoCapture.read().
+
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ImageDirectorySource:
+    """Plays the images in a directory as if they were video frames."""
+
+    def __init__(self, path, loop=False):
+        self.paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.loop = loop
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self, image=None):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            return True, image
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.paths)
+        return 0
+
+    def release(self):
+        pass
+
+
+def open_source(source, width=640, height=480):
+    """
+    Opens `source`: an int (or digit string) is a webcam index, a directory is
+    an image sequence, anything else goes to cv2.VideoCapture as a file or URL.
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, int):
+        # DirectShow is often more compatible with USB webcams on Windows.
+        cap = cv2.VideoCapture(source, cv2.CAP_DSHOW) if os.name == "nt" else cv2.VideoCapture(source)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        return cap
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return cv2.VideoCapture(source)
+
+
+def is_live(source):
+    """Live sources drop frames when busy; files are read at decode speed."""
+    return isinstance(source, int) or (isinstance(source, str) and (source.isdigit() or "://" in source))
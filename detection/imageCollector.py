@@ -1,89 +1,175 @@
 # detection/image_collector.py
 #
 # Description:
-# This script captures video from a connected webcam, displays the live feed,
-# and allows the user to save the current frame as a high-quality image file
-# by pressing the 's' key. Pressing 'q' will quit the program.
+# This script captures video from a connected webcam (or a video file, stream
+# URL or image directory), displays the live feed, and saves frames as
+# high-quality image files for training and replay datasets.
+#
+# Saving never happens on the capture/display thread: frames are handed to a
+# pool of encoder threads through a bounded queue (see capture.py), and when
+# the encoders fall behind frames are dropped and counted rather than stalling
+# the preview. Images go into sharded subdirectories of SAVE_PATH with a
+# manifest.jsonl describing every frame (timestamp, camera, zone crops).
+#
+# Keys in the preview window:
+#   's'  save the current frame
+#   'c'  toggle continuous capture (decimated by --interval / --motion)
+#   'q'  quit
 #
 # How to Run:
 # 1. Make sure your Python virtual environment is active.
-# 2. Run the script from your terminal: python detection/image_collector.py
+# 2. Run the script from your terminal: python detection/imageCollector.py
+#    Continuous capture, only frames that changed, at most 2 per second, with
+#    one crop per parking zone next to each frame:
+#      python detection/imageCollector.py --continuous --interval 0.5 --motion --crops
+#    Headless from a video file (captures continuously until the file ends):
+#      python detection/imageCollector.py --source clip.avi --headless --interval 1
+#    Files are read no faster than the encoders keep up, so nothing is dropped;
+#    --drop-when-busy makes them drop frames like a live camera does.
+
+import argparse
+import json
+import time
 
 import cv2
-import os
-import time
+
+from capture import FORMATS, DatasetWriter, FrameDecimator
+from frame_sources import is_live, open_source
 
 # --- Configuration ---
 # The folder where you want to save your captured images.
 # This folder will be created if it doesn't exist.
 SAVE_PATH = "training_images"
 
-# The source of your video camera. 
+# The source of your video camera.
 # '0' is usually the default for a built-in or USB webcam.
 # If you have multiple cameras, you might need to change this to 1, 2, etc.
 CAMERA_SOURCE = 2 # Keep trying 1, if it fails, try 0, 2, 3...
+CAMERA_ID = "cam_main_01"
+
+# Frame rate assumed for video files that do not report one. Timestamps of
+# recorded footage follow the video's own clock, so decimation by interval
+# keeps the same frames however fast the file is read.
+DEFAULT_FILE_FPS = 10.0
+
+
+def load_zones(path):
+    """{spot_id: zone} from a JSON file, or the engine's PARKING_SPOT_ZONES."""
+    if path is None:
+        from qr_code_engine import PARKING_SPOT_ZONES
+        return PARKING_SPOT_ZONES
+    with open(path) as f:
+        return json.load(f)
+
 
 def main():
     """
     Main function to run the image collection process.
     """
-    # Create the save directory if it doesn't already exist.
-    if not os.path.exists(SAVE_PATH):
-        os.makedirs(SAVE_PATH)
-        print(f"Created directory: {SAVE_PATH}")
-
-    # Initialize the camera capture object using OpenCV.
-    # --- FIX APPLIED HERE ---
-    # We are adding `cv2.CAP_DSHOW` to force OpenCV to use the DirectShow
-    # backend, which is often more compatible with USB webcams on Windows.
-    cap = cv2.VideoCapture(CAMERA_SOURCE, cv2.CAP_DSHOW)
+    parser = argparse.ArgumentParser(description="Capture frames for training and replay datasets.")
+    parser.add_argument("--source", default=str(CAMERA_SOURCE), help="webcam index, video file, stream URL or image directory")
+    parser.add_argument("--output", default=SAVE_PATH, help="directory to save images and manifest.jsonl in")
+    parser.add_argument("--camera-id", default=CAMERA_ID, help="camera name recorded in file names and the manifest")
+    parser.add_argument("--continuous", action="store_true", help="start capturing continuously")
+    parser.add_argument("--headless", action="store_true", help="no preview window; captures continuously until the source ends")
+    parser.add_argument("--interval", type=float, default=1.0, help="continuous: at least this many seconds between saved frames")
+    parser.add_argument("--motion", action="store_true", help="continuous: only save frames that changed since the last saved one")
+    parser.add_argument("--max-interval", type=float, help="with --motion: save a frame at least this often anyway")
+    parser.add_argument("--crops", action="store_true", help="also save one crop per parking zone")
+    parser.add_argument("--zones", help="JSON file of {spot_id: zone} for --crops (default: PARKING_SPOT_ZONES)")
+    parser.add_argument("--format", choices=FORMATS, default="jpg")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality, or PNG compression level")
+    parser.add_argument("--workers", type=int, default=2, help="encoder threads")
+    parser.add_argument("--queue-size", type=int, default=64, help="frames waiting for an encoder before new ones are dropped")
+    parser.add_argument("--shard-size", type=int, default=1000, help="frames per output subdirectory")
+    parser.add_argument("--drop-when-busy", action="store_true",
+                        help="drop frames when the encoders are behind for files too, as for live cameras")
+    parser.add_argument("--frames", type=int, help="stop after reading this many frames")
+    args = parser.parse_args()
+
+    # Initialize the capture object; webcams use DirectShow on Windows.
+    cap = open_source(args.source)
 
     # Check if the camera was successfully opened.
     if not cap.isOpened():
-        print(f"Error: Could not open camera at index {CAMERA_SOURCE}.")
+        print(f"Error: Could not open source {args.source!r}.")
         print("If you have multiple cameras, try changing CAMERA_SOURCE to another number.")
         return
 
-    print("\n--- Live Camera Feed ---")
-    print("Press 's' to save the current frame as an image.")
-    print("Press 'q' to quit.")
-    
-    image_count = 0
-
-    while True:
-        # Read a new frame from the camera.
-        ret, frame = cap.read()
-
-        if not ret:
-            print("Error: Could not read frame. Exiting...")
-            break
-
-        # Display the live video frame in a window named "Live Feed".
-        cv2.imshow("Live Feed - Press 's' to save, 'q' to quit", frame)
-
-        # Wait for a key press for 1 millisecond.
-        key = cv2.waitKey(1) & 0xFF
-
-        # If the 's' key is pressed, save the frame.
-        if key == ord('s'):
-            # Create a unique filename using a timestamp to prevent overwriting files.
-            timestamp = int(time.time() * 1000)
-            filename = os.path.join(SAVE_PATH, f"bus_image_{timestamp}.jpg")
-            
-            cv2.imwrite(filename, frame)
-            
-            image_count += 1
-            print(f"Saved {filename} ({image_count} images captured)")
-
-        # If the 'q' key is pressed, break the loop and exit.
-        elif key == ord('q'):
-            print("Quitting program.")
-            break
-
-    # Release the camera and destroy all OpenCV windows to clean up resources.
-    cap.release()
-    cv2.destroyAllWindows()
+    live = is_live(args.source)
+    fps = (cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FILE_FPS) if not live else None
+    writer = DatasetWriter(args.output, args.camera_id, args.format, args.quality,
+                           load_zones(args.zones) if args.crops else None,
+                           args.workers, args.queue_size, args.shard_size)
+    decimator = FrameDecimator(args.interval, args.motion, args.max_interval)
+    continuous = args.continuous or args.headless
+    # A live camera keeps going whether we keep up or not; a file can wait.
+    block = not live and not args.drop_when_busy
+
+    if not args.headless:
+        print("\n--- Live Camera Feed ---")
+        print("Press 's' to save the current frame as an image.")
+        print("Press 'c' to start or stop continuous capture.")
+        print("Press 'q' to quit.")
+
+    start = time.time()
+    frame_number = 0
+    try:
+        while args.frames is None or frame_number < args.frames:
+            # Read a new frame from the camera.
+            ret, frame = cap.read()
+
+            if not ret:
+                if live:
+                    print("Error: Could not read frame. Exiting...")
+                break
+            now = time.time() if live else start + frame_number / fps
+
+            if continuous and decimator.keep(frame, now):
+                writer.submit(frame, now, frame_number, block)
+            frame_number += 1
+
+            if args.headless:
+                continue
+
+            # Display the live video frame, with what has been saved so far.
+            stats = writer.stats()
+            preview = frame.copy()
+            cv2.putText(preview, f"{'REC ' if continuous else ''}saved {stats['written']} dropped {stats['dropped']}",
+                        (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255) if continuous else (0, 255, 0), 2)
+            cv2.imshow("Live Feed - 's' save, 'c' continuous, 'q' quit", preview)
+
+            # Wait for a key press for 1 millisecond.
+            key = cv2.waitKey(1) & 0xFF
+
+            # If the 's' key is pressed, save the frame.
+            if key == ord('s'):
+                if writer.submit(frame, now, frame_number - 1):
+                    print(f"Saving frame {frame_number - 1} ({stats['written'] + stats['queued'] + 1} images so far)")
+                else:
+                    print("Encoders are busy, frame dropped.")
+            elif key == ord('c'):
+                continuous = not continuous
+                print("Continuous capture " + ("started." if continuous else "stopped."))
+            # If the 'q' key is pressed, break the loop and exit.
+            elif key == ord('q'):
+                print("Quitting program.")
+                break
+    except KeyboardInterrupt:
+        print("Stopping.")
+    finally:
+        # Release the camera, finish writing and destroy all OpenCV windows.
+        cap.release()
+        writer.close()
+        if not args.headless:
+            cv2.destroyAllWindows()
+
+    elapsed = time.time() - start
+    stats = writer.stats()
+    print(f"Read {frame_number} frames in {elapsed:.1f} s ({frame_number / max(elapsed, 1e-9):.1f} frames/s); "
+          f"kept {decimator.kept}, skipped {decimator.skipped} by decimation")
+    print(f"Wrote {stats['written']} frames ({stats['bytes'] / 1e6:.1f} MB) to {args.output}, "
+          f"dropped {stats['dropped']}, failed {stats['failed']}, encoding took {stats['encode_seconds']:.1f} s")
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,105 @@
+# detection/motion_gate.py
+#
+# Description:
+# Cheap per-zone change detection so the engine only re-decodes parking spots
+# whose pixels actually changed. Each frame is shrunk to a small grayscale
+# image and every zone is compared with what that zone looked like the last
+# time it was decoded. Zones that look the same are skipped and simply repeat
+# the buses they last decoded, which keeps their persistence timestamps fresh.
+
+import threading
+
+import cv2
+
+from zones import zone_bounds
+
+
+class ZoneMotionGate:
+    def __init__(self, zones, frame_shape, scale=0.25, blur=5, pixel_threshold=25,
+                 changed_fraction=0.02, max_skip_seconds=30.0, confirm_empty_scans=3):
+        """
+        The small image is blurred with a `blur` x `blur` kernel so sensor noise
+        and a pixel of camera shake on the fine QR pattern do not count as change.
+        `pixel_threshold` is the gray-level difference that counts a small-image
+        pixel as changed, and a zone is re-scanned once more than
+        `changed_fraction` of its pixels changed, or after `max_skip_seconds`
+        regardless. A scan that finds nothing is only believed after
+        `confirm_empty_scans` in a row, so one missed decode cannot lock a
+        parked bus out until the scene changes again.
+        """
+        height, width = frame_shape[:2]
+        self.scale = scale
+        self.blur = blur
+        self.small_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skip_seconds = max_skip_seconds
+        self.confirm_empty_scans = confirm_empty_scans
+        self.zone_slices = {
+            spot_id: (slice(int(y0 * scale), max(int(y0 * scale) + 1, int(y1 * scale))),
+                      slice(int(x0 * scale), max(int(x0 * scale) + 1, int(x1 * scale))))
+            for spot_id, (x0, y0, x1, y1) in ((s, zone_bounds(z)) for s, z in zones.items())
+        }
+        self._lock = threading.Lock()
+        self._reference = {}  # spot_id -> small gray crop at the last accepted scan
+        self._reference_time = {}
+        self._last_buses = {spot_id: [] for spot_id in zones}
+        self._empty_scans = {spot_id: 0 for spot_id in zones}
+        self.scan_counts = {spot_id: 0 for spot_id in zones}
+        self.skip_counts = {spot_id: 0 for spot_id in zones}
+
+    def shrink(self, frame):
+        small = cv2.resize(frame, self.small_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (self.blur, self.blur), 0) if self.blur else small
+
+    def plan(self, frame, now):
+        """
+        Decides which zones to decode in `frame` (BGR or grayscale). Returns
+        (scan_zones, carried_sightings, small): the zone ids to decode, the
+        (bus_number, spot_id) sightings repeated for skipped zones, and the small
+        image to hand back to record() once the scan finished.
+        """
+        small = self.shrink(frame)
+        scan_zones = []
+        carried = []
+        with self._lock:
+            for spot_id, (rows, cols) in self.zone_slices.items():
+                reference = self._reference.get(spot_id)
+                stale = now - self._reference_time.get(spot_id, float("-inf")) > self.max_skip_seconds
+                if reference is None or stale or self._changed(reference, small[rows, cols]):
+                    scan_zones.append(spot_id)
+                    self.scan_counts[spot_id] += 1
+                else:
+                    self.skip_counts[spot_id] += 1
+                    carried.extend((bus, spot_id) for bus in self._last_buses[spot_id])
+        return scan_zones, carried, small
+
+    def _changed(self, reference, current):
+        diff = cv2.absdiff(reference, current)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        return changed > self.changed_fraction * diff.size
+
+    def record(self, scan_zones, sightings, small, now):
+        """Stores the result of decoding `scan_zones` from the frame `small` came from."""
+        with self._lock:
+            for spot_id in scan_zones:
+                buses = [bus for bus, spot in sightings if spot == spot_id]
+                if not buses:
+                    self._empty_scans[spot_id] += 1
+                    if self._empty_scans[spot_id] < self.confirm_empty_scans:
+                        continue
+                else:
+                    self._empty_scans[spot_id] = 0
+                rows, cols = self.zone_slices[spot_id]
+                self._reference[spot_id] = small[rows, cols].copy()
+                self._reference_time[spot_id] = now
+                self._last_buses[spot_id] = buses
+
+    def stats(self):
+        with self._lock:
+            return {
+                spot_id: {"scanned": self.scan_counts[spot_id], "skipped": self.skip_counts[spot_id]}
+                for spot_id in self.zone_slices
+            }
@@ -0,0 +1,373 @@
+# detection/multi_camera_engine.py
+#
+# Description:
+# Headless detection engine for many cameras in one process. Each camera gets a
+# capture thread that reads frames straight into a shared-memory frame ring;
+# decoding runs in a pool of worker processes that map the same rings, so the
+# GIL-bound OpenCV chain scales with cores and frames are handed over by slot
+# index instead of being pickled. Results are merged back into a per-camera
+# spot tracker (tracker.py) here and uploaded as deltas by a background
+# uploader. Live cameras are sampled at adaptive rates (scheduler.py): fast
+# while their zones change, a slow heartbeat while the yard is static, with
+# the decode load of all cameras kept within a CPU budget.
+#
+# How to Run:
+# 1. Copy detection/cameras.example.json and list your cameras and their zones.
+# 2. python detection/multi_camera_engine.py --config detection/cameras.json
+#
+# Video files and image directories work as sources too, which is how the
+# throughput benchmark (benchmarks/bench_multi_camera.py) drives it.
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import cv2
+
+from decoder import STAGES, DecodeCascade, decode_regions
+from delta_sync import CameraSync
+from frame_ring import SharedFrameRing, attach_ring
+from frame_sources import is_live, open_source
+from pipeline import DetectionPipeline
+from scheduler import SamplingScheduler
+from telemetry import DECISION_SECONDS, EngineCollector, FrameTracer, get_logger, observe_timings, start_exporter
+from tracker import SpotTracker
+from uploader import DEFAULT_SPOOL_PATH, BackendUploader
+
+DEFAULT_CONFIG = {
+    "backend_url": "http://localhost:8000/api/detections",
+    "workers": os.cpu_count() or 1,
+    "confirm_hits": 2, # Decodes of a bus in a spot needed before it is reported there...
+    "confirm_window": 1.0, # ...within this many seconds
+    "clear_seconds": 10.0, # Seconds a reported bus may go unseen before its spot is cleared
+    "heartbeat_seconds": 5.0,
+    "upload_interval": 0.1,
+    "upload_timeout": 2.0,
+    "spool_path": DEFAULT_SPOOL_PATH, # Unsent states survive backend outages and restarts here
+    "wire_format": "json", # "msgpack" sends compact uploads numbered by the backend's /api/layout
+    "metrics_port": None, # Serve Prometheus metrics on this port (e.g. 9108)
+    "trace_sample_rate": 0.0, # Fraction of frames logged as a span with every step's timing
+    "ring_slots": 4,
+    "cpu_budget": None, # Decode CPU seconds per second across all cameras (default: one per worker)
+    "active_hold": 5.0, # Seconds a camera stays at its fast rate after zones last changed
+}
+DEFAULT_CAMERA = {
+    "interval": 0.1, # Seconds between samples on live sources while zones are changing
+    "idle_interval": 1.0, # Seconds between samples while the camera's zones are static
+    "roi_mode": True, # Scan only the padded zone areas instead of the whole frame
+    "roi_padding": 16,
+    "motion_gating": True, # Skip zones whose pixels have not changed since their last decode
+    "decode_stages": list(STAGES), # Decode cascade stages, cheapest first
+    "width": 640,
+    "height": 480,
+}
+
+
+logger = get_logger("njt.engine")
+
+
+def load_config(path):
+    with open(path) as f:
+        config = {**DEFAULT_CONFIG, **json.load(f)}
+    config["cameras"] = [{**DEFAULT_CAMERA, **camera} for camera in config["cameras"]]
+    for camera in config["cameras"]:
+        camera["zones"] = {spot: tuple(zone) for spot, zone in camera["zones"].items()}
+    return config
+
+
+# --- Decode worker processes ---
+# Module-level state lives in each pool process, set up once by the initializer.
+_worker_rings = {}
+_worker_cascade = None
+
+
+def _init_worker(ring_specs):
+    global _worker_cascade
+    # The pool provides the parallelism; stop OpenCV from oversubscribing cores.
+    cv2.setNumThreads(1)
+    for spec in ring_specs:
+        _worker_rings[spec[0]] = attach_ring(spec)
+    _worker_cascade = DecodeCascade()
+
+
+def decode_slot(ring_name, slot, tasks):
+    """
+    Runs the decode cascade tasks (see decoder.decode_regions) on one frame
+    slot. Returns one ([(bus_number, [[x, y], ...]), ...], stage log) pair per
+    task.
+    """
+    _, frames = _worker_rings[ring_name]
+    gray_frame = cv2.cvtColor(frames[slot], cv2.COLOR_BGR2GRAY,
+                              dst=_worker_cascade.scratch.get("gray", frames.shape[1:3]))
+    return [
+        ([(bus, points.tolist()) for bus, points in codes], log)
+        for codes, log in decode_regions(_worker_cascade, gray_frame, tasks)
+    ]
+
+
+# --- Engine process ---
+
+class CameraRunner:
+    """Capture loop, frame ring and merged detection state for one camera."""
+
+    def __init__(self, camera, config, stop_event, scheduler, tracer=None):
+        self.camera_id = camera["camera_id"]
+        self.source = camera["source"]
+        self.zones = camera["zones"]
+        self.scheduler = scheduler
+        scheduler.add_camera(self.camera_id, camera["interval"], camera["idle_interval"])
+        self.width, self.height = camera["width"], camera["height"]
+        self.max_frames = camera.get("max_frames")
+        self.pipeline = DetectionPipeline(
+            self.zones, camera["roi_mode"], camera["roi_padding"], camera["motion_gating"],
+            stages=camera["decode_stages"],
+        )
+        self.ring = SharedFrameRing(config["ring_slots"], (self.height, self.width, 3))
+        self.tracker = SpotTracker(config["confirm_hits"], config["confirm_window"], config["clear_seconds"])
+        self.sync = CameraSync(self.camera_id, config["heartbeat_seconds"])
+        self.stop_event = stop_event
+        self.state_lock = threading.Lock()
+        self.stable_state = {}
+        self.last_applied_time = 0.0
+        self.frames_captured = 0
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.frames_decoded = 0
+        self.frames_skipped = 0 # Nothing changed in any zone, so nothing was decoded
+        self.decode_errors = 0
+        self.finished = threading.Event()
+        self.tracer = tracer or FrameTracer()
+
+    def capture_loop(self, pool):
+        cap = open_source(self.source, self.width, self.height)
+        if not cap.isOpened():
+            print(f"Error: Could not open source {self.source!r} for {self.camera_id}.")
+            self.finished.set()
+            return
+        live = is_live(self.source)
+        scratch = None
+        last_submit_time = 0.0
+        try:
+            while not self.stop_event.is_set():
+                if self.max_frames is not None and self.frames_submitted + self.frames_skipped >= self.max_frames:
+                    break
+                now = time.time()
+                # Live cameras are read continuously so their buffer never goes
+                # stale, but only sampled at the interval the scheduler picks.
+                # Files have no real-time clock, so every frame is decoded as
+                # fast as possible.
+                due = not live or now - last_submit_time >= self.scheduler.interval(self.camera_id)
+                slot = self.ring.acquire(timeout=0 if live else 1.0) if due else None
+                if slot is None:
+                    ok, scratch = cap.read(scratch)
+                    if not ok:
+                        break
+                    self.frames_captured += 1
+                    if due:
+                        self.frames_dropped += 1
+                        self.scheduler.record_drop(self.camera_id)
+                    continue
+
+                target = self.ring.frames[slot]
+                ok, frame = cap.read(target)
+                if not ok:
+                    self.ring.release(slot)
+                    break
+                self.frames_captured += 1
+                if frame.ctypes.data != target.ctypes.data or frame.shape != target.shape:
+                    # The source delivered a different size; scale into the slot.
+                    cv2.resize(frame, (self.width, self.height), dst=target)
+                last_submit_time = now
+
+                # The motion gate runs here on a shrunken copy; only zones that
+                # changed are sent to a worker, and a static frame never is.
+                plan_start = time.perf_counter()
+                plan = self.pipeline.plan(target, now)
+                timings = {"plan": [time.perf_counter() - plan_start]}
+                self.scheduler.record_sample(self.camera_id, bool(plan.scan_zones))
+                if not plan.scan_zones:
+                    self.ring.release(slot)
+                    self.frames_skipped += 1
+                    self.scheduler.record_cost(self.camera_id, timings["plan"][0], False)
+                    self._apply(plan, [], now)
+                    self._observe(timings, now)
+                    continue
+                # The stage order is learned here, so every worker decoding
+                # this camera benefits from what the others found.
+                regions = self.pipeline.regions_for(plan.scan_zones, target.shape)
+                future = pool.submit(decode_slot, self.ring.name, slot, self.pipeline.decode_tasks(regions))
+                self.frames_submitted += 1
+                future.add_done_callback(partial(self._on_decoded, slot, plan, regions, now, timings))
+        finally:
+            cap.release()
+            self.finished.set()
+
+    def _on_decoded(self, slot, plan, regions, captured_at, timings, future):
+        self.ring.release(slot)
+        try:
+            results = future.result()
+        except Exception as e:
+            self.decode_errors += 1
+            logger.warning("decode failed", extra={"fields": {"camera_id": self.camera_id, "error": str(e)}})
+            return
+        assign_start = time.perf_counter()
+        codes = self.pipeline.collect(regions, results)
+        decoded = [(bus_number, spot_id) for bus_number, spot_id, _ in self.pipeline.assign(codes)]
+        self.pipeline.record(plan, decoded, captured_at)
+        timings["assign"] = [time.perf_counter() - assign_start]
+        decode_seconds = 0.0
+        for _, log in results:
+            for stage, seconds, _ in log:
+                timings.setdefault("stage:" + stage, []).append(seconds)
+                decode_seconds += seconds
+        self.scheduler.record_cost(self.camera_id, timings["plan"][0] + decode_seconds, True)
+        with self.state_lock:
+            self.frames_decoded += 1
+        self._apply(plan, decoded, captured_at)
+        self._observe(timings, captured_at)
+
+    def _observe(self, timings, captured_at):
+        DECISION_SECONDS.labels(self.camera_id).observe(time.time() - captured_at)
+        if self.tracer.sampled():
+            self.tracer.emit(self.camera_id, captured_at, timings)
+        observe_timings(self.camera_id, timings)
+
+    def metrics(self):
+        """(camera_id, frame counters, queue depths) for the metrics exporter."""
+        counters = {
+            "captured": self.frames_captured,
+            "dropped": self.frames_dropped,
+            "submitted": self.frames_submitted,
+            "decoded": self.frames_decoded,
+            "skipped": self.frames_skipped,
+            "decode_error": self.decode_errors,
+        }
+        return self.camera_id, counters, {"ring_in_flight": self.ring.in_flight()}
+
+    def _apply(self, plan, decoded, captured_at):
+        with self.state_lock:
+            # With several workers a camera's frames can finish out of order;
+            # an older frame must not overwrite newer state.
+            if captured_at < self.last_applied_time:
+                return
+            self.last_applied_time = captured_at
+            self.stable_state = self.tracker.update(decoded + plan.carried_sightings, captured_at)
+
+    def snapshot(self):
+        # The tracker replaces its state dict on change instead of mutating it,
+        # so the current one can be handed out without a copy.
+        with self.state_lock:
+            return self.stable_state
+
+    def close(self):
+        self.ring.close()
+
+
+def upload_loop(runners, uploader, config, stop_event):
+    """Periodically hands each camera's merged state to the uploader."""
+    while not stop_event.wait(config["upload_interval"]):
+        now = time.time()
+        for runner in runners:
+            uploader.submit(runner.sync, runner.snapshot(), now)
+
+
+def run(config, upload=True, report_interval=5.0):
+    """
+    Runs the engine until every file source is exhausted (live cameras run until
+    interrupted). Returns a summary dict with frame counts and frames/second.
+    """
+    stop_event = threading.Event()
+    tracer = FrameTracer(config["trace_sample_rate"])
+    scheduler = SamplingScheduler(config["cpu_budget"] or config["workers"], config["active_hold"])
+    runners = [CameraRunner(camera, config, stop_event, scheduler, tracer) for camera in config["cameras"]]
+    ring_specs = [runner.ring.spec() for runner in runners]
+
+    # Workers only start at the first submit(), when capture, upload and
+    # exporter threads are already running; forking then could copy a lock
+    # some thread holds. The forkserver (spawn where there is none) starts
+    # them from a clean process instead.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    pool = ProcessPoolExecutor(
+        max_workers=config["workers"], mp_context=multiprocessing.get_context(start_method),
+        initializer=_init_worker, initargs=(ring_specs,),
+    )
+    threads = [threading.Thread(target=r.capture_loop, args=(pool,), daemon=True) for r in runners]
+    uploader = None
+    if upload:
+        uploader = BackendUploader(config["backend_url"], config["upload_timeout"], config["spool_path"],
+                                   wire_format=config["wire_format"])
+        threads.append(threading.Thread(target=upload_loop, args=(runners, uploader, config, stop_event), daemon=True))
+    if config["metrics_port"]:
+        start_exporter(config["metrics_port"], EngineCollector(lambda: [r.metrics() for r in runners], uploader, scheduler))
+
+    print(f"--- Multi-camera engine started: {len(runners)} cameras, {config['workers']} decode workers ---")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        last_report = start
+        while not all(r.finished.is_set() for r in runners):
+            time.sleep(0.2)
+            if report_interval and time.perf_counter() - last_report >= report_interval:
+                last_report = time.perf_counter()
+                processed = sum(r.frames_decoded + r.frames_skipped for r in runners)
+                print(f"{processed / (last_report - start):.1f} frames/s processed across all cameras")
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        stop_event.set()
+        pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - start
+        for runner in runners:
+            runner.close()
+        if uploader is not None:
+            uploader.close()
+
+    processed = sum(r.frames_decoded + r.frames_skipped for r in runners)
+    return {
+        "cameras": len(runners),
+        "workers": config["workers"],
+        "elapsed_seconds": elapsed,
+        "frames_captured": sum(r.frames_captured for r in runners),
+        "frames_dropped": sum(r.frames_dropped for r in runners),
+        "frames_decoded": sum(r.frames_decoded for r in runners),
+        "frames_skipped": sum(r.frames_skipped for r in runners),
+        "decode_errors": sum(r.decode_errors for r in runners),
+        "frames_per_second": processed / elapsed if elapsed else 0.0,
+        "zone_scans": {r.camera_id: r.pipeline.gate.stats() for r in runners if r.pipeline.gate},
+        "decode_stages": {r.camera_id: r.pipeline.policy.report() for r in runners},
+        "sampling": scheduler.stats(),
+        "upload": uploader.stats() if uploader else None,
+        "states": {r.camera_id: r.snapshot() for r in runners},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-camera QR detection engine.")
+    parser.add_argument("--config", default="detection/cameras.json")
+    parser.add_argument("--workers", type=int, help="decode processes (default: config or CPU count)")
+    parser.add_argument("--max-frames", type=int, help="stop each camera after this many frames")
+    parser.add_argument("--no-upload", action="store_true", help="do not send anything to the backend")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.metrics_port:
+        config["metrics_port"] = args.metrics_port
+    if args.workers:
+        config["workers"] = args.workers
+    if args.max_frames:
+        for camera in config["cameras"]:
+            camera["max_frames"] = args.max_frames
+
+    summary = run(config, upload=not args.no_upload)
+    print(json.dumps({k: v for k, v in summary.items() if k != "states"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# detection/pipeline.py
+#
+# Description:
+# The per-frame detection pipeline shared by the engines:
+#   plan   - motion gate decides which zones need decoding this frame
+#   decode - decode cascade over those zones (ROI crops or full frame), with
+#            the stage order for each region chosen by a CascadePolicy
+#   assign - map decoded codes to parking spots
+#   record - feed the results back to the motion gate
+# The multi-camera engine runs plan/assign/record in the engine process and
+# decode in a worker process; the single-camera engine calls process().
+
+import time
+from typing import List, NamedTuple
+
+import cv2
+
+from decoder import STAGES, CascadePolicy, decode_regions
+from motion_gate import ZoneMotionGate
+from zones import ZoneIndex, merge_zone_rois
+
+
+class FramePlan(NamedTuple):
+    scan_zones: List[str]
+    carried_sightings: list  # (bus_number, spot_id) repeated for skipped zones
+    small: object  # motion gate image, handed back to record()
+
+
+class DetectionPipeline:
+    def __init__(self, zones, roi_mode=True, roi_padding=16, motion_gating=True, gate_options=None,
+                 stages=STAGES):
+        self.zones = zones
+        self.zone_index = ZoneIndex(zones)
+        self._zone_centers = {
+            s: ((b[0] + b[2]) / 2, (b[1] + b[3]) / 2)
+            for s, b in zip(self.zone_index.spot_ids, self.zone_index.bounds.tolist())
+        }
+        self.roi_mode = roi_mode
+        self.roi_padding = roi_padding
+        self.motion_gating = motion_gating
+        self.gate_options = gate_options or {}
+        self.gate = None
+        self._all_rois = None
+        self.policy = CascadePolicy(stages)
+        self.last_scan_zones = []  # zones process() decoded in its latest frame
+
+    def prepare(self, frame_shape):
+        """Builds the motion gate and zone ROIs for `frame_shape` ahead of the first frame."""
+        if self.motion_gating and self.gate is None:
+            self.gate = ZoneMotionGate(self.zones, frame_shape, **self.gate_options)
+        if self.roi_mode and self._all_rois is None:
+            self._all_rois = merge_zone_rois(self.zones, frame_shape, self.roi_padding)
+
+    def plan(self, frame, now):
+        if not self.motion_gating:
+            return FramePlan(list(self.zones), [], None)
+        if self.gate is None:
+            self.gate = ZoneMotionGate(self.zones, frame.shape, **self.gate_options)
+        return FramePlan(*self.gate.plan(frame, now))
+
+    def rois_for(self, scan_zones, frame_shape):
+        """ROIs covering `scan_zones`, or None to scan the full frame."""
+        if not self.roi_mode:
+            return None
+        if len(scan_zones) == len(self.zones):
+            if self._all_rois is None:
+                self._all_rois = merge_zone_rois(self.zones, frame_shape, self.roi_padding)
+            return self._all_rois
+        return merge_zone_rois({z: self.zones[z] for z in scan_zones}, frame_shape, self.roi_padding)
+
+    def regions_for(self, scan_zones, frame_shape):
+        """
+        The regions to decode for `scan_zones` as [(roi, key, capacity)]: roi as
+        in rois_for (None for the full frame), key identifying the region to the
+        cascade policy, and capacity the number of zones it covers.
+        """
+        rois = self.rois_for(scan_zones, frame_shape)
+        if rois is None:
+            return [(None, "frame", len(scan_zones))]
+        # Every zone's padded box lies inside exactly one merged ROI, so the
+        # ROI holding a zone's center is the one that decodes it.
+        roi_index = ZoneIndex(dict(enumerate(rois)))
+        centers = [self._zone_centers[z] for z in scan_zones]
+        members = [[] for _ in rois]
+        for spot_id, i in zip(scan_zones, roi_index.lookup_centers(centers)):
+            if i is not None:
+                members[i].append(spot_id)
+        return [(roi, tuple(key), len(key)) for roi, key in zip(rois, members)]
+
+    def decode_tasks(self, regions):
+        """The cascade tasks (roi, order, expected, max_stages) for `regions`."""
+        # With the motion gate every scanned zone is new, stale or changed, so
+        # it gets the full cascade even if it looked empty last time; without
+        # it the policy lifts its cap on empty regions periodically instead.
+        full = self.motion_gating
+        return [(roi,) + tuple(self.policy.plan(key, capacity, full)) for roi, key, capacity in regions]
+
+    def collect(self, regions, results):
+        """Feeds decode_regions results back to the policy; returns all codes."""
+        codes = []
+        for (_, key, _), (region_codes, log) in zip(regions, results):
+            self.policy.record(key, len(region_codes), log)
+            codes.extend(region_codes)
+        return codes
+
+    def assign(self, codes):
+        """Returns [(bus_number, spot_id, points)] for codes that fall in a zone."""
+        spot_ids = self.zone_index.lookup_codes(codes)
+        return [
+            (bus_number, spot_id, points)
+            for (bus_number, points), spot_id in zip(codes, spot_ids) if spot_id
+        ]
+
+    def record(self, plan, sightings, now):
+        if self.gate is not None and plan.scan_zones:
+            self.gate.record(plan.scan_zones, sightings, plan.small, now)
+
+    def process(self, cascade, frame, now, debug_frame=None, timings=None):
+        """
+        Runs the whole pipeline on one BGR frame in this thread with `cascade`
+        (a decoder.DecodeCascade). Returns (sightings, assigned): the
+        (bus_number, spot_id) sightings to feed the spot tracker, and
+        this frame's freshly decoded codes for drawing. If `timings` is a dict,
+        the seconds spent in each step are appended to its lists under "plan",
+        "decode", "assign" and "record", and every cascade stage run under
+        "stage:<name>".
+        """
+        start = time.perf_counter()
+        plan = self.plan(frame, now)
+        self.last_scan_zones = plan.scan_zones
+        planned = time.perf_counter()
+        codes = []
+        results = []
+        if plan.scan_zones:
+            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=cascade.scratch.get("gray", frame.shape[:2]))
+            regions = self.regions_for(plan.scan_zones, gray_frame.shape)
+            results = decode_regions(cascade, gray_frame, self.decode_tasks(regions), debug_frame)
+            codes = self.collect(regions, results)
+        decoded_at = time.perf_counter()
+        assigned = self.assign(codes)
+        decoded = [(bus_number, spot_id) for bus_number, spot_id, _ in assigned]
+        assigned_at = time.perf_counter()
+        self.record(plan, decoded, now)
+        if timings is not None:
+            steps = (("plan", planned - start), ("decode", decoded_at - planned),
+                     ("assign", assigned_at - decoded_at), ("record", time.perf_counter() - assigned_at))
+            for name, seconds in steps:
+                timings.setdefault(name, []).append(seconds)
+            for _, log in results:
+                for stage, seconds, _ in log:
+                    timings.setdefault("stage:" + stage, []).append(seconds)
+        return decoded + plan.carried_sightings, assigned
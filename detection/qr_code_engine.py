@@ -3,21 +3,27 @@
 # Description:
 # This script uses multithreading for smooth video display. The main thread handles
 # capturing and showing video frames, while a separate worker thread handles the
-# slow QR code detection and network requests in the background. It now includes
-# persistence logic to prevent flickering detections.
+# slow QR code detection and network requests in the background. Sightings are
+# smoothed by a per-spot tracker (tracker.py) to prevent flickering detections.
 #
 # How to Run:
 # 1. Make sure your Python virtual environment is active.
 # 2. Update the BACKEND_URL and PARKING_SPOT_ZONES with your specific configuration.
 # 3. Run the script from your terminal: python detection/qr_code_engine.py
+#
+# cv2, numpy, the decoder and the uploader (requests) take a few hundred
+# milliseconds to import, so they are imported where they are used: tools that
+# only read this file's configuration (replay.py, imageCollector.py) never
+# load them, and main() loads the decoder and builds the detection pipeline on
+# a background thread while the camera is still opening.
 
-import cv2
-import requests
-import json
 import time
 import threading
-from queue import Queue
-import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from delta_sync import CameraSync
+from scheduler import SamplingScheduler
+from tracker import SpotTracker
 
 # --- Configuration ---
 
@@ -31,167 +37,241 @@ PARKING_SPOT_ZONES = {
     "B2": (380, 160, 541, 300),
     "B3": (381, 9, 542, 156),
 }
+# When True, only the areas around PARKING_SPOT_ZONES are filtered and scanned
+# instead of the whole frame. ROI_PADDING widens each zone so codes that poke
+# over a zone edge are still seen whole.
+ROI_MODE = True
+ROI_PADDING = 16
+# When True, zones whose pixels have not changed since they were last decoded
+# are skipped and keep reporting the bus they last decoded.
+MOTION_GATING = True
 
 # --- Threading & Persistence Setup ---
-frame_queue = Queue(maxsize=1) 
+# Frames are read straight into preallocated ring slots and handed to the
+# detection thread by slot index: one slot being decoded, one waiting, one
+# being captured into. A waiting frame is dropped when a newer one arrives.
+FRAME_RING_SLOTS = 3
+# Capture-to-decision latencies of recent frames, reported on exit.
+decision_latencies = deque(maxlen=1000)
 # This list will only contain detections from the CURRENT frame for drawing
 latest_detections_for_drawing = []
 detections_lock = threading.Lock()
 
 # --- DEBUGGING SETUP ---
-# A queue to pass the processed debug frame back to the main thread
-debug_frame_queue = Queue(maxsize=1)
-
-bus_persistence = {}
-PERSISTENCE_SECONDS = 35.0 
-
-
-def get_spot_for_qr(points):
-    """Determines which parking spot a QR code is in."""
-    if points is None or len(points) == 0:
-        return None
-    x_coords = [p[0] for p in points]
-    y_coords = [p[1] for p in points]
-    x_min, x_max = min(x_coords), max(x_coords)
-    y_min, y_max = min(y_coords), max(y_coords)
-    qr_center_x = (x_min + x_max) / 2
-    qr_center_y = (y_min + y_max) / 2
-
-    for spot_id, zone in PARKING_SPOT_ZONES.items():
-        x_start, y_start, x_end, y_end = zone
-        if x_start < qr_center_x < x_end and y_start < qr_center_y < y_end:
-            return spot_id
-    return None
-
-def detection_worker():
+# Debug views go back to the main thread through their own two-slot ring.
+DEBUG_RING_SLOTS = 2
+
+# A bus is reported in a spot once it has been decoded there CONFIRM_HITS times
+# within CONFIRM_WINDOW_SECONDS, and cleared after CLEAR_SECONDS unseen.
+CONFIRM_HITS = 2
+CONFIRM_WINDOW_SECONDS = 1.0
+CLEAR_SECONDS = 10.0
+spot_tracker = SpotTracker(CONFIRM_HITS, CONFIRM_WINDOW_SECONDS, CLEAR_SECONDS)
+
+# Frames are sampled every ACTIVE_INTERVAL_SECONDS while zones are changing and
+# every IDLE_INTERVAL_SECONDS once nothing has moved for ACTIVE_HOLD_SECONDS,
+# within CPU_BUDGET decode seconds per second (one detection thread).
+ACTIVE_INTERVAL_SECONDS = 0.1
+IDLE_INTERVAL_SECONDS = 1.0
+ACTIVE_HOLD_SECONDS = 5.0
+CPU_BUDGET = 1.0
+scheduler = SamplingScheduler(CPU_BUDGET, ACTIVE_HOLD_SECONDS)
+scheduler.add_camera(CAMERA_ID, ACTIVE_INTERVAL_SECONDS, IDLE_INTERVAL_SECONDS)
+
+# Only changes are uploaded; when nothing changes a heartbeat is sent this often.
+HEARTBEAT_SECONDS = 5.0
+camera_syncs = {CAMERA_ID: CameraSync(CAMERA_ID, HEARTBEAT_SECONDS)}
+# Uploads run on their own thread so a slow backend never holds up decoding.
+# States the backend could not take are spooled here and replayed later.
+UPLOAD_TIMEOUT_SECONDS = 2.0
+UPLOAD_SPOOL_PATH = None # None: uploader.DEFAULT_SPOOL_PATH, next to this script
+# "msgpack" sends compact uploads that refer to spots by their number in the
+# backend's /api/layout; "json" is readable in logs and proxies.
+UPLOAD_WIRE_FORMAT = "json"
+
+# --- Metrics ---
+# Set to a port (e.g. 9108) to serve Prometheus metrics while the engine runs.
+METRICS_PORT = None
+# Fraction of frames logged as a JSON span with every pipeline step's timing.
+TRACE_SAMPLE_RATE = 0.0
+frame_counters = {"captured": 0, "published": 0, "decoded": 0}
+
+
+def build_pipeline():
+    """Imports the decoder stack and builds the decode cascade and the zone layout (zone index)."""
+    from decoder import DecodeCascade
+    from pipeline import DetectionPipeline
+    return DecodeCascade(), DetectionPipeline(PARKING_SPOT_ZONES, ROI_MODE, ROI_PADDING, MOTION_GATING)
+
+
+def start_uploader():
+    from uploader import DEFAULT_SPOOL_PATH, BackendUploader
+    return BackendUploader(BACKEND_URL, UPLOAD_TIMEOUT_SECONDS, UPLOAD_SPOOL_PATH or DEFAULT_SPOOL_PATH,
+                           wire_format=UPLOAD_WIRE_FORMAT)
+
+
+def detection_worker(uploader, frame_ring, debug_ring, warm_pipeline):
     """
     This function runs in a separate thread. It processes frames for QR codes,
-    maintains a persistent list of recently seen buses, and sends the stable
-    data to the backend.
+    tracks which bus is confirmed in each spot, and sends the stable data to
+    the backend. `warm_pipeline` is the future of build_pipeline().
     """
     global latest_detections_for_drawing
-    detector = cv2.QRCodeDetector()
-    
+    from telemetry import DECISION_SECONDS, FrameTracer, observe_timings
+
+    cascade, pipeline = warm_pipeline.result()
+    # Motion gate and zone ROIs depend on the frame size, known now.
+    pipeline.prepare(frame_ring.frames.shape[1:])
+    tracer = FrameTracer(TRACE_SAMPLE_RATE)
+    timings = {}
+
     while True:
-        frame = frame_queue.get()
-        if frame is None: # Sentinel value to stop the thread
+        handoff = frame_ring.take_latest()
+        if handoff is None: # The ring was stopped
             break
-        
+        slot, captured_at = handoff
+
         current_time = time.time()
-        
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Apply a bilateral filter to reduce noise while preserving sharp edges.
-        filtered_frame = cv2.bilateralFilter(gray_frame, 9, 75, 75)
-        
-        # Apply adaptive thresholding to the filtered image to create a high-contrast version.
-        thresh_frame = cv2.adaptiveThreshold(filtered_frame, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-
-        if not debug_frame_queue.full():
-            debug_frame_queue.put(thresh_frame)
-
-        ok = False
-        decoded_info = None
-        points = None
-
-        # --- FIX APPLIED HERE ---
-        # Wrap detection calls in try/except blocks to prevent crashes from low-level OpenCV errors.
-        try:
-            # First, attempt to detect on the clean, processed image.
-            ok, decoded_info, points, _ = detector.detectAndDecodeMulti(thresh_frame)
-        except cv2.error as e:
-            print(f"OpenCV error on thresholded frame: {e}")
-            ok = False
-
-        try:
-            # If that fails, fall back to the simple grayscale image.
-            if not ok or points is None:
-                ok, decoded_info, points, _ = detector.detectAndDecodeMulti(gray_frame)
-        except cv2.error as e:
-            print(f"OpenCV error on grayscale frame: {e}")
-            ok = False
 
+        # The debug view is drawn straight into a free debug slot, if there is one.
+        debug_slot = debug_ring.acquire()
+        debug_view = None if debug_slot is None else debug_ring.frames[debug_slot]
+
+        # Sightings include buses carried over from zones the motion gate skipped;
+        # `assigned` only holds codes actually decoded in this frame.
+        process_start = time.perf_counter()
+        sightings, assigned = pipeline.process(cascade, frame_ring.frames[slot], current_time, debug_view, timings)
+        frame_ring.release(slot)
+        motion = bool(pipeline.last_scan_zones)
+        scheduler.record_sample(CAMERA_ID, motion)
+        scheduler.record_cost(CAMERA_ID, time.perf_counter() - process_start, motion)
+
+        if debug_slot is not None:
+            debug_ring.publish(debug_slot)
 
         # This list will only contain detections from this specific frame
-        current_frame_draw_data = []
-
-        if ok and points is not None:
-            for i, bus_data in enumerate(decoded_info):
-                if bus_data:
-                    bus_number = bus_data.split('/')[-1] if bus_data.startswith('http') else bus_data
-                    qr_points = points[i]
-                    spot_id = get_spot_for_qr(qr_points)
-                    if spot_id:
-                        # Update the persistence tracker for stable backend data
-                        bus_persistence[bus_number] = { "spot_id": spot_id, "timestamp": current_time }
-                        # Add to the list for drawing in this frame
-                        current_frame_draw_data.append({
-                            "spot_id": spot_id,
-                            "bus_number": bus_number,
-                            "points": qr_points.astype(int).reshape(-1, 1, 2)
-                        })
-
-        stale_buses = [bus for bus, data in bus_persistence.items() if current_time - data["timestamp"] > PERSISTENCE_SECONDS]
-        for bus in stale_buses:
-            del bus_persistence[bus]
-
-        # The data sent to the server is based on the stable, persisted list
-        final_detections_for_server = [{"spot_id": data["spot_id"], "bus_number": bus} for bus, data in bus_persistence.items()]
-        
+        current_frame_draw_data = [
+            {
+                "spot_id": spot_id,
+                "bus_number": bus_number,
+                "points": qr_points.astype(int).reshape(-1, 1, 2)
+            }
+            for bus_number, spot_id, qr_points in assigned
+        ]
+
+        # The data sent to the server is based on the stable, tracked state
+        stable_state = spot_tracker.update(sightings, current_time)
+        latency = time.perf_counter() - captured_at
+        decision_latencies.append(latency)
+        DECISION_SECONDS.labels(CAMERA_ID).observe(latency)
+        frame_counters["decoded"] += 1
+        if tracer.sampled():
+            tracer.emit(CAMERA_ID, current_time, timings)
+        observe_timings(CAMERA_ID, timings)
+
         # The data for drawing is based ONLY on the current frame
         with detections_lock:
             latest_detections_for_drawing = current_frame_draw_data
 
-        payload = { "camera_id": CAMERA_ID, "detections": final_detections_for_server }
-        try:
-            requests.post(BACKEND_URL, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
-            print(f"Sent {len(final_detections_for_server)} stable detections to server.")
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending data to server: {e}")
+        uploader.submit(camera_syncs[CAMERA_ID], stable_state, current_time)
 
 def main():
     """
     Main function to run the video capture and display loop.
     """
+    # The decoder, the zone layout and the uploader (whose sender thread also
+    # fetches the backend's spot layout) are set up while the camera opens.
+    warmup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+    warm_pipeline = warmup.submit(build_pipeline)
+    warm_uploader = warmup.submit(start_uploader)
+    warmup.shutdown(wait=False)
+
+    import cv2
+    import numpy as np
+    from frame_ring import FrameRing
+
     cap = cv2.VideoCapture(CAMERA_SOURCE, cv2.CAP_DSHOW)
     if not cap.isOpened():
         print(f"Error: Could not open camera at index {CAMERA_SOURCE}.")
+        warm_uploader.result().close(timeout=0)
         return
         
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
+    # The first frame tells us the real capture size to allocate for.
+    ret, first_frame = cap.read()
+    if not ret:
+        print("Error: Could not read frame.")
+        warm_uploader.result().close(timeout=0)
+        return
+    frame_ring = FrameRing(FRAME_RING_SLOTS, first_frame.shape)
+    debug_ring = FrameRing(DEBUG_RING_SLOTS, first_frame.shape[:2])
+    debug_ring.frames[...] = 0
+    display = np.empty_like(first_frame)
+
     print("--- Live QR Code Detection Engine Started ---")
     
     cv2.namedWindow("Live Feed", cv2.WINDOW_NORMAL)
     cv2.namedWindow("Debug View (What the Detector Sees)", cv2.WINDOW_NORMAL) # New debug window
     
-    worker_thread = threading.Thread(target=detection_worker, daemon=True)
+    uploader = warm_uploader.result()
+    worker_thread = threading.Thread(
+        target=detection_worker, args=(uploader, frame_ring, debug_ring, warm_pipeline), daemon=True
+    )
     worker_thread.start()
+    if METRICS_PORT:
+        from telemetry import EngineCollector, start_exporter
+
+        def camera_metrics():
+            counters = {**frame_counters, "dropped": frame_ring.dropped}
+            return [(CAMERA_ID, counters, {"ring_in_flight": frame_ring.in_flight()})]
+        start_exporter(METRICS_PORT, EngineCollector(camera_metrics, uploader, scheduler))
 
     last_frame_sent_time = time.time()
-    frame_send_interval = 0.1 # Process up to 10 frames per second
 
     while True:
-        ret, frame = cap.read()
+        # One slot is in the worker and one waiting, so a third is normally
+        # free; if not (the worker is releasing late), the frame is read into
+        # the display buffer and shown but not sampled.
+        slot = frame_ring.acquire(timeout=1.0)
+        target = display if slot is None else frame_ring.frames[slot]
+        ret, frame = cap.read(target)
         if not ret:
+            if slot is not None:
+                frame_ring.release(slot)
             print("Error: Could not read frame.")
             break
-        
+        if frame.ctypes.data != target.ctypes.data or frame.shape != target.shape:
+            cv2.resize(frame, (target.shape[1], target.shape[0]), dst=target)
+        frame_counters["captured"] += 1
+
+        with detections_lock:
+            local_detections = latest_detections_for_drawing
+
         current_time = time.time()
-        if (current_time - last_frame_sent_time) > frame_send_interval:
-            if not frame_queue.full():
-                frame_queue.put(frame.copy())
-                last_frame_sent_time = current_time
+        frame = target
+        if slot is not None and (current_time - last_frame_sent_time) > scheduler.interval(CAMERA_ID):
+            # A frame still waiting for the worker is dropped in favour of this one.
+            dropped = frame_ring.dropped
+            frame_ring.publish(slot, time.perf_counter())
+            if frame_ring.dropped != dropped:
+                scheduler.record_drop(CAMERA_ID)
+            frame_counters["published"] += 1
+            last_frame_sent_time = current_time
+            # The worker owns the slot now and may be reading it, so boxes are
+            # drawn on a copy; with nothing to draw the slot is shown as is.
+            if local_detections:
+                np.copyto(display, target)
+                frame = display
+            slot = None
 
         # Display the debug frame if available
-        if not debug_frame_queue.empty():
-            debug_frame = debug_frame_queue.get()
-            cv2.imshow("Debug View (What the Detector Sees)", debug_frame)
+        debug_handoff = debug_ring.take_latest(timeout=0)
+        if debug_handoff is not None:
+            cv2.imshow("Debug View (What the Detector Sees)", debug_ring.frames[debug_handoff[0]])
+            debug_ring.release(debug_handoff[0])
 
-        with detections_lock:
-            local_detections = latest_detections_for_drawing
-            
         # This loop now only draws boxes for QR codes seen in the current frame
         for detection in local_detections:
              points = detection["points"]
@@ -201,15 +281,23 @@ def main():
              cv2.putText(frame, f"{bus_number} @ {spot_id}", (points[0][0][0], points[0][0][1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
         cv2.imshow("Live Feed", frame)
+        if slot is not None:
+            frame_ring.release(slot)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
     # Clean up
-    frame_queue.put(None)
+    frame_ring.stop()
     worker_thread.join()
+    uploader.close()
     cap.release()
     cv2.destroyAllWindows()
+    if decision_latencies:
+        latencies = sorted(decision_latencies)
+        print(f"Capture-to-decision latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms; "
+              f"{frame_ring.dropped} stale frames dropped.")
 
 if __name__ == "__main__":
     main()
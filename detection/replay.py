@@ -0,0 +1,289 @@
+# detection/replay.py
+#
+# Description:
+# Headless replay harness for the detection engine. Feeds a video file, an
+# image directory, or generated synthetic footage through the same pipeline
+# the live worker runs (motion gate, decode cascade, zone assignment, spot
+# tracker) without any windows, and reports:
+#   - frames/second over the whole run
+#   - a latency histogram and percentiles for every pipeline step and every
+#     decode cascade stage
+#   - precision/recall against ground truth, both for what each frame decoded
+#     and for the tracked state the engine would upload
+#   - how often that state changed (each change is a backend write) and the
+#     tracker's commit/clear/move/conflict counters
+# The report can be saved as JSON and compared with an earlier run.
+#
+# Ground truth comes with synthetic footage, from a truth.jsonl inside an image
+# directory (see synthetic.write_image_sequence), or from --truth. The replay
+# clock advances 1/--fps per frame, so tracker and motion-gate timeouts
+# behave as they would live regardless of how fast frames are processed.
+#
+# How to Run:
+#   python detection/replay.py --synthetic 300 --output run.json
+#   python detection/replay.py --images frames/ --compare run.json
+#   python detection/replay.py --synthetic 300 --export-images frames/   (write footage only)
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+import synthetic
+from decoder import STAGES, DecodeCascade
+from frame_sources import open_source
+from pipeline import DetectionPipeline
+from qr_code_engine import CLEAR_SECONDS, CONFIRM_HITS, CONFIRM_WINDOW_SECONDS, PARKING_SPOT_ZONES, ROI_PADDING
+from tracker import SpotTracker
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def recorded_frames(source, truth=None, limit=None):
+    """Yields (frame, assignments or None) from a video file or image directory."""
+    if truth is None and os.path.isdir(source) and os.path.exists(os.path.join(source, synthetic.TRUTH_FILE)):
+        truth = synthetic.load_truth(os.path.join(source, synthetic.TRUTH_FILE))
+    cap = open_source(source)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open source {source!r}.")
+    index = 0
+    try:
+        while limit is None or index < limit:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame, (truth[index] if truth is not None and index < len(truth) else None)
+            index += 1
+    finally:
+        cap.release()
+
+
+def summarize(seconds):
+    """Count, mean, percentiles and histogram (in ms) of a list of durations."""
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {"count": 0}
+    histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for v in values:
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if v <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[-1] += 1
+
+    def pct(q):
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": values[-1],
+        "histogram": {
+            **{f"<={b}ms": n for b, n in zip(HISTOGRAM_BUCKETS_MS, histogram)},
+            f">{HISTOGRAM_BUCKETS_MS[-1]}ms": histogram[-1],
+        },
+    }
+
+
+class Score:
+    """Precision/recall of {spot_id: bus_number} predictions against ground truth."""
+
+    def __init__(self):
+        self.true_positives = 0
+        self.false_positives = 0
+        self.false_negatives = 0
+
+    def add(self, predicted, truth):
+        predicted = set(predicted.items())
+        truth = set(truth.items())
+        self.true_positives += len(predicted & truth)
+        self.false_positives += len(predicted - truth)
+        self.false_negatives += len(truth - predicted)
+
+    def report(self):
+        tp, fp, fn = self.true_positives, self.false_positives, self.false_negatives
+        return {
+            "precision": tp / (tp + fp) if tp + fp else 1.0,
+            "recall": tp / (tp + fn) if tp + fn else 1.0,
+            "true_positives": tp,
+            "false_positives": fp,
+            "false_negatives": fn,
+        }
+
+
+def replay(frames, zones, roi_mode=True, roi_padding=ROI_PADDING, motion_gating=True,
+           stages=STAGES, fps=10.0, confirm_hits=CONFIRM_HITS, confirm_window=CONFIRM_WINDOW_SECONDS,
+           clear_seconds=CLEAR_SECONDS):
+    """Runs `frames` ((frame, truth or None) pairs) through the worker pipeline; returns the report dict."""
+    cascade = DecodeCascade()
+    pipeline = DetectionPipeline(zones, roi_mode, roi_padding, motion_gating, stages=stages)
+    tracker = SpotTracker(confirm_hits, confirm_window, clear_seconds)
+    stable_state = {}
+    state_changes = 0
+    timings = {}
+    decode_score = Score()
+    stable_score = Score()
+    frame_count = 0
+    judged = 0
+    start = time.perf_counter()
+    for frame, truth in frames:
+        frame_start = time.perf_counter()
+        now = frame_count / fps
+        sightings, _ = pipeline.process(cascade, frame, now, timings=timings)
+        tracked_at = time.perf_counter()
+        previous_state, stable_state = stable_state, tracker.update(sightings, now)
+        finished = time.perf_counter()
+        timings.setdefault("tracker", []).append(finished - tracked_at)
+        if stable_state is not previous_state:
+            state_changes += 1
+        timings.setdefault("frame", []).append(finished - frame_start)
+        frame_count += 1
+        if truth is not None:
+            judged += 1
+            decode_score.add({spot: bus for bus, spot in sightings}, truth)
+            stable_score.add(stable_state, truth)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "config": {
+            "zones": len(zones),
+            "roi_mode": roi_mode,
+            "roi_padding": roi_padding,
+            "motion_gating": motion_gating,
+            "stages": list(pipeline.policy.stages),
+            "fps": fps,
+            "confirm_hits": confirm_hits,
+            "confirm_window": confirm_window,
+            "clear_seconds": clear_seconds,
+            "opencv": cv2.__version__,
+        },
+        "frames": frame_count,
+        "elapsed_seconds": elapsed,
+        "frames_per_second": frame_count / elapsed if elapsed else 0.0,
+        "latency": {name: summarize(values) for name, values in sorted(timings.items())},
+        "accuracy": {
+            "frames_judged": judged,
+            "decode": decode_score.report() if judged else None,
+            "stable": stable_score.report() if judged else None,
+        },
+        "tracker": {"state_changes": state_changes, **tracker.counters},
+        "cascade": pipeline.policy.report(),
+        "zone_scans": pipeline.gate.stats() if pipeline.gate else None,
+    }
+
+
+def print_report(report):
+    print(f"{report['frames']} frames in {report['elapsed_seconds']:.2f} s: "
+          f"{report['frames_per_second']:.1f} frames/s")
+    print(f"\n{'step':>16} {'count':>6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, s in report["latency"].items():
+        if s["count"]:
+            print(f"{name:>16} {s['count']:>6} {s['mean_ms']:>8.2f} {s['p50_ms']:>8.2f} "
+                  f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f}")
+    accuracy = report["accuracy"]
+    if accuracy["frames_judged"]:
+        print(f"\nAgainst ground truth on {accuracy['frames_judged']} frames:")
+        for kind in ("decode", "stable"):
+            a = accuracy[kind]
+            print(f"  {kind:>6}: precision {a['precision']:.1%}, recall {a['recall']:.1%}")
+    else:
+        print("\nNo ground truth; precision/recall not measured.")
+    tracker = report["tracker"]
+    print(f"\nTracked state changed {tracker['state_changes']} times "
+          f"({tracker['commits']} commits, {tracker['clears']} clears, {tracker['moves']} moves, "
+          f"{tracker['conflicts_held']} conflicting sightings held back)")
+
+
+def compare(report, baseline):
+    """Prints how `report` differs from an earlier run's report."""
+    def line(label, new, old, unit="", higher_is_better=True):
+        if new is None or old is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        better = change >= 0 if higher_is_better else change <= 0
+        print(f"  {label:>24}: {old:>9.2f}{unit} -> {new:>9.2f}{unit} ({change:+.1f}%{'' if better else ' worse'})")
+
+    print("\nCompared with baseline:")
+    line("frames/s", report["frames_per_second"], baseline["frames_per_second"])
+    for name, s in report["latency"].items():
+        old = baseline["latency"].get(name)
+        if s["count"] and old and old.get("count"):
+            line(f"{name} p99", s["p99_ms"], old["p99_ms"], " ms", higher_is_better=False)
+    for kind in ("decode", "stable"):
+        new, old = report["accuracy"][kind], baseline["accuracy"].get(kind)
+        if new and old:
+            line(f"{kind} precision", 100 * new["precision"], 100 * old["precision"], "%")
+            line(f"{kind} recall", 100 * new["recall"], 100 * old["recall"], "%")
+    if "tracker" in baseline:
+        line("state changes", report["tracker"]["state_changes"], baseline["tracker"]["state_changes"],
+             higher_is_better=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless replay and throughput report for the detection pipeline.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--video", help="video file to replay")
+    source.add_argument("--images", help="directory of frames (with an optional truth.jsonl)")
+    source.add_argument("--synthetic", type=int, metavar="FRAMES", default=300,
+                        help="generate this many frames of synthetic yard footage (default)")
+    parser.add_argument("--truth", help="truth.jsonl with one {spot_id: bus_number} line per frame")
+    parser.add_argument("--zones", help="JSON file of {spot_id: zone} (default: PARKING_SPOT_ZONES)")
+    parser.add_argument("--frames", type=int, help="stop after this many frames")
+    parser.add_argument("--fps", type=float, default=10.0, help="sampling rate the footage stands for")
+    parser.add_argument("--no-roi", action="store_true", help="scan full frames instead of zone ROIs")
+    parser.add_argument("--no-motion-gating", action="store_true", help="decode every zone on every frame")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="decode cascade stages")
+    parser.add_argument("--confirm-hits", type=int, default=CONFIRM_HITS,
+                        help="decodes of a bus in a spot needed before it is reported there")
+    parser.add_argument("--confirm-window", type=float, default=CONFIRM_WINDOW_SECONDS,
+                        help="seconds within which --confirm-hits decodes must fall")
+    parser.add_argument("--clear-seconds", type=float, default=CLEAR_SECONDS,
+                        help="seconds a reported bus may go unseen before its spot is cleared")
+    parser.add_argument("--background", help="synthetic: background image (default: parking lot screenshot)")
+    parser.add_argument("--change-every", type=int, default=20, help="synthetic: frames between yard changes")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic: random seed")
+    parser.add_argument("--export-images", metavar="DIR", help="synthetic: write the frames and truth.jsonl here and exit")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="REPORT", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    zones = PARKING_SPOT_ZONES
+    if args.zones:
+        with open(args.zones) as f:
+            zones = {spot: tuple(zone) if not isinstance(zone[0], list) else zone for spot, zone in json.load(f).items()}
+
+    if args.video or args.images:
+        truth = synthetic.load_truth(args.truth) if args.truth else None
+        frames = recorded_frames(args.video or args.images, truth, args.frames)
+    else:
+        background = synthetic.load_background(args.background)
+        frames = synthetic.yard_sequence(zones, args.frames or args.synthetic, background,
+                                         seed=args.seed, change_every=args.change_every)
+        if args.export_images:
+            count = synthetic.write_image_sequence(args.export_images, frames)
+            print(f"Wrote {count} frames and {synthetic.TRUTH_FILE} to {args.export_images}")
+            return
+        # Render up front so compositing is not counted as pipeline time.
+        frames = list(frames)
+
+    report = replay(frames, zones, not args.no_roi, ROI_PADDING, not args.no_motion_gating,
+                    args.stages, args.fps, args.confirm_hits, args.confirm_window, args.clear_seconds)
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
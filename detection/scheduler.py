@@ -0,0 +1,145 @@
+# detection/scheduler.py
+#
+# Description:
+# Per-camera adaptive sampling. Instead of decoding every camera at a fixed
+# 10 frames/s, each camera is sampled at its fast `active_interval` while the
+# motion gate keeps finding changed zones, and drops to a slow
+# `idle_interval` heartbeat once nothing near its zones has moved for
+# `active_hold` seconds. The first changed frame seen at the heartbeat rate
+# switches the camera straight back to the fast rate.
+#
+# The scheduler also keeps the decode load of all cameras together within
+# `cpu_budget` (decode CPU seconds per second, i.e. cores). Each camera's cost
+# per sample is tracked as two moving averages of what its samples actually
+# took, one for samples with changed zones and one for static samples (which
+# the motion gate skips, so they cost almost nothing); when the chosen rates
+# would need more than the budget, active cameras are slowed down first, in
+# proportion, and idle heartbeats only when they alone exceed it.
+
+import threading
+import time
+
+
+class CameraSampling:
+    """Sampling state of one camera; read through SamplingScheduler.stats()."""
+
+    def __init__(self, active_interval, idle_interval):
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.interval = active_interval
+        self.last_motion = None
+        self.cost = {True: None, False: None}  # moving average of seconds per sample, with and without motion
+        self.samples = 0
+        self.dropped = 0
+
+    def active(self, now, hold):
+        return self.last_motion is not None and now - self.last_motion < hold
+
+
+class SamplingScheduler:
+    def __init__(self, cpu_budget=1.0, active_hold=5.0, smoothing=0.2, rebalance_seconds=1.0, clock=time.monotonic):
+        """
+        A `cpu_budget` of None leaves the rates unbounded. `smoothing` is the
+        weight of the newest sample in each camera's cost average. Rates are
+        rebalanced at most every `rebalance_seconds`, and right away when a
+        camera turns active.
+        """
+        self.cpu_budget = cpu_budget
+        self.active_hold = active_hold
+        self.smoothing = smoothing
+        self.rebalance_seconds = rebalance_seconds
+        self.clock = clock
+        self.cameras = {}
+        self._lock = threading.Lock()
+        self._rebalanced_at = None
+        self.load = 0.0  # decode CPU seconds per second the current rates are expected to take
+
+    def add_camera(self, camera_id, active_interval=0.1, idle_interval=1.0):
+        with self._lock:
+            self.cameras[camera_id] = CameraSampling(active_interval, idle_interval)
+            self._rebalanced_at = None
+
+    def interval(self, camera_id):
+        """Seconds the camera should wait between samples right now."""
+        with self._lock:
+            now = self.clock()
+            if self._rebalanced_at is None or now - self._rebalanced_at >= self.rebalance_seconds:
+                self._rebalance(now)
+            return self.cameras[camera_id].interval
+
+    def record_sample(self, camera_id, motion):
+        """Called for every sampled frame; `motion` is whether any zone changed."""
+        with self._lock:
+            now = self.clock()
+            camera = self.cameras[camera_id]
+            camera.samples += 1
+            if motion:
+                was_active = camera.active(now, self.active_hold)
+                camera.last_motion = now
+                if not was_active:
+                    self._rebalance(now)
+
+    def record_cost(self, camera_id, seconds, motion):
+        """Called once a sample is finished with the CPU seconds it took (plan plus decode)."""
+        with self._lock:
+            costs = self.cameras[camera_id].cost
+            if costs[motion] is None:
+                costs[motion] = seconds
+            else:
+                costs[motion] += self.smoothing * (seconds - costs[motion])
+
+    def record_drop(self, camera_id):
+        """A sample was due but could not be taken (no free frame slot)."""
+        with self._lock:
+            self.cameras[camera_id].dropped += 1
+
+    def _rebalance(self, now):
+        self._rebalanced_at = now
+        active, idle = [], []
+        for camera in self.cameras.values():
+            (active if camera.active(now, self.active_hold) else idle).append(camera)
+        # Until a camera has reported a cost it is assumed to be as expensive
+        # as the most expensive one seen so far.
+        default_cost = {
+            motion: max((c.cost[motion] for c in self.cameras.values() if c.cost[motion] is not None), default=0.0)
+            for motion in (True, False)
+        }
+
+        def cost(camera, motion):
+            return camera.cost[motion] if camera.cost[motion] is not None else default_cost[motion]
+
+        active_load = sum(cost(c, True) / c.active_interval for c in active)
+        idle_load = sum(cost(c, False) / c.idle_interval for c in idle)
+
+        spare = self.cpu_budget - idle_load if self.cpu_budget else float("inf")
+        idle_stretch = max(1.0, idle_load / self.cpu_budget) if self.cpu_budget else 1.0
+        if active_load <= spare:
+            active_stretch = 1.0
+        elif spare > 0:
+            active_stretch = active_load / spare
+        else:
+            active_stretch = float("inf")
+
+        for camera in idle:
+            camera.interval = camera.idle_interval * idle_stretch
+        for camera in active:
+            # An active camera is never sampled slower than its idle heartbeat.
+            camera.interval = min(camera.active_interval * active_stretch, camera.idle_interval * idle_stretch)
+        self.load = sum(cost(c, True) / c.interval for c in active) + sum(cost(c, False) / c.interval for c in idle)
+
+    def stats(self):
+        """{camera_id: {"rate", "interval", "active", "cost_seconds", "samples", "dropped"}}, plus the totals."""
+        with self._lock:
+            now = self.clock()
+            cameras = {
+                camera_id: {
+                    "rate": 1.0 / c.interval,
+                    "interval": c.interval,
+                    "active": c.active(now, self.active_hold),
+                    "cost_seconds": c.cost[c.active(now, self.active_hold)] or 0.0,
+                    "samples": c.samples,
+                    "dropped": c.dropped,
+                }
+                for camera_id, c in self.cameras.items()
+            }
+            return {"cameras": cameras, "cpu_budget": self.cpu_budget, "load": self.load}
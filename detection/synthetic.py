@@ -0,0 +1,127 @@
+# detection/synthetic.py
+#
+# Description:
+# Builds synthetic test footage by compositing QR codes for known bus numbers
+# into PARKING_SPOT_ZONES on top of a background image (by default the parking
+# lot screenshot). Used by the benchmarks so they have reproducible input and
+# ground truth without a live camera.
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+from zones import zone_bounds
+
+DEFAULT_BACKGROUND = os.path.join(os.path.dirname(__file__), "parking_lot_screenshot.jpg")
+TRUTH_FILE = "truth.jsonl"
+
+
+def render_qr(text, size):
+    """Returns a size x size BGR image of a QR code for `text`, with a white margin."""
+    code = cv2.QRCodeEncoder.create().encode(text)
+    code = cv2.copyMakeBorder(code, 3, 3, 3, 3, cv2.BORDER_CONSTANT, value=255)
+    # Whole-pixel modules keep the code crisp; pad with white up to `size`.
+    scale = max(1, size // code.shape[0])
+    code = cv2.resize(code, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    pad = max(0, size - code.shape[0])
+    code = cv2.copyMakeBorder(code, pad // 2, pad - pad // 2, pad // 2, pad - pad // 2, cv2.BORDER_CONSTANT, value=255)
+    return cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+
+
+def composite_frame(background, zones, assignments, rng=None, jitter=0, noise=0.0):
+    """
+    Draws a QR code for each {spot_id: bus_number} in `assignments` centered in
+    its zone. `jitter` shifts codes by up to that many pixels and `noise` adds
+    Gaussian sensor noise with that standard deviation.
+    """
+    rng = rng or np.random.default_rng(0)
+    frame = background.copy()
+    for spot_id, bus_number in assignments.items():
+        x_start, y_start, x_end, y_end = zone_bounds(zones[spot_id])
+        size = int(min(x_end - x_start, y_end - y_start) * 0.75)
+        dx, dy = (rng.integers(-jitter, jitter + 1, size=2) if jitter else (0, 0))
+        x = int((x_start + x_end - size) / 2 + dx)
+        y = int((y_start + y_end - size) / 2 + dy)
+        x = min(max(x, 0), frame.shape[1] - size)
+        y = min(max(y, 0), frame.shape[0] - size)
+        frame[y:y + size, x:x + size] = render_qr(str(bus_number), size)
+    if noise:
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def load_background(path=None):
+    background = cv2.imread(path or DEFAULT_BACKGROUND)
+    if background is None:
+        raise FileNotFoundError(f"Could not read background image '{path or DEFAULT_BACKGROUND}'.")
+    return background
+
+
+def write_video(path, frames, fps=10.0):
+    """Writes an iterable of BGR frames to an MJPG .avi file."""
+    writer = None
+    count = 0
+    for frame in frames:
+        if writer is None:
+            height, width = frame.shape[:2]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+        writer.write(frame)
+        count += 1
+    if writer is not None:
+        writer.release()
+    return count
+
+
+def write_image_sequence(directory, pairs):
+    """
+    Writes (frame, assignments) pairs as numbered PNGs plus a truth.jsonl with
+    one ground-truth {spot_id: bus_number} line per frame, in frame order.
+    Returns the number of frames written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open(os.path.join(directory, TRUTH_FILE), "w") as truth:
+        for frame, assignments in pairs:
+            cv2.imwrite(os.path.join(directory, f"frame_{count:06d}.png"), frame)
+            truth.write(json.dumps(assignments) + "\n")
+            count += 1
+    return count
+
+
+def load_truth(path):
+    """Reads a truth.jsonl written by write_image_sequence: one dict per frame."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parked_sequence(zones, frame_count, background=None, seed=0, noise=4.0):
+    """
+    Yields `frame_count` frames of a static yard with one bus per zone, the
+    simplest footage for throughput measurements.
+    """
+    background = load_background() if background is None else background
+    rng = np.random.default_rng(seed)
+    assignments = {spot_id: str(1000 + i) for i, spot_id in enumerate(zones)}
+    for _ in range(frame_count):
+        yield composite_frame(background, zones, assignments, rng, jitter=1, noise=noise)
+
+
+def yard_sequence(zones, frame_count, background=None, seed=0, change_every=20, occupancy=0.7, noise=4.0):
+    """
+    Yields (frame, assignments) pairs for a yard where buses come and go: every
+    `change_every` frames each zone is re-drawn as occupied (with probability
+    `occupancy`, by a random bus) or empty. `assignments` is the ground truth
+    {spot_id: bus_number} for that frame.
+    """
+    background = load_background() if background is None else background
+    rng = np.random.default_rng(seed)
+    assignments = {}
+    for index in range(frame_count):
+        if index % change_every == 0:
+            assignments = {
+                spot_id: str(rng.integers(1000, 9999))
+                for spot_id in zones if rng.random() < occupancy
+            }
+        yield composite_frame(background, zones, assignments, rng, jitter=1, noise=noise), dict(assignments)
@@ -0,0 +1,183 @@
+# detection/telemetry.py
+#
+# Description:
+# Metrics and logging for the detection engines. An embedded Prometheus
+# exporter (start_exporter) serves:
+#   - frame counters per camera (captured, dropped, decoded, skipped, errors),
+#     read from the engines' own counters at scrape time, so counting costs
+#     nothing per frame
+#   - per-step and per-cascade-stage decode latency histograms, and
+#     capture-to-decision latency
+#   - queue depths (frame ring slots in use, uploads pending and spooled) and
+#     upload lag
+#   - the sampling rate the scheduler picked for each camera, its decode cost
+#     and samples dropped, and the total decode load against the CPU budget
+# FrameTracer logs a sampled fraction of frames as one JSON span with every
+# step's timing. Log output goes through get_logger(), which writes JSON lines
+# and caps how often any one message may repeat.
+
+import json
+import logging
+import random
+import threading
+import time
+
+from prometheus_client import REGISTRY, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+STEP_SECONDS = Histogram(
+    "njt_engine_step_seconds",
+    "Time per detection pipeline step; cascade stages are labelled stage:<name>.",
+    ["camera", "step"],
+    buckets=LATENCY_BUCKETS,
+)
+DECISION_SECONDS = Histogram(
+    "njt_engine_capture_to_decision_seconds",
+    "Time from a frame being captured until its detections updated the camera state.",
+    ["camera"],
+    buckets=LATENCY_BUCKETS + (2.5, 5.0),
+)
+
+
+def observe_timings(camera_id, timings):
+    """Moves the step timings collected by DetectionPipeline.process into the histograms."""
+    for step, values in timings.items():
+        histogram = STEP_SECONDS.labels(camera_id, step)
+        for seconds in values:
+            histogram.observe(seconds)
+        values.clear()
+
+
+class EngineCollector:
+    """
+    Reads engine state when Prometheus scrapes. `cameras` is a callable
+    returning [(camera_id, counters, queue_depths)] with dicts of name -> value;
+    `uploader` is an optional uploader.BackendUploader and `scheduler` an
+    optional scheduler.SamplingScheduler.
+    """
+
+    def __init__(self, cameras, uploader=None, scheduler=None):
+        self.cameras = cameras
+        self.uploader = uploader
+        self.scheduler = scheduler
+
+    def collect(self):
+        frames = CounterMetricFamily("njt_engine_frames", "Frames by outcome.", labels=["camera", "outcome"])
+        queues = GaugeMetricFamily("njt_engine_queue_depth", "Items waiting in engine queues.", labels=["camera", "queue"])
+        for camera_id, counters, depths in self.cameras():
+            for outcome, value in counters.items():
+                frames.add_metric([camera_id, outcome], value)
+            for queue, value in depths.items():
+                queues.add_metric([camera_id, queue], value)
+        yield frames
+        if self.uploader is not None:
+            stats = self.uploader.stats()
+            for queue in ("pending", "spooled"):
+                queues.add_metric(["", "upload_" + queue], stats[queue])
+            uploads = CounterMetricFamily("njt_engine_uploads", "Upload attempts by result.", labels=["result"])
+            for result in ("sent", "failures", "coalesced", "replayed", "refused", "spool_dropped"):
+                uploads.add_metric([result], stats[result])
+            yield uploads
+            yield GaugeMetricFamily(
+                "njt_engine_upload_lag_seconds",
+                "Age of the oldest camera state the backend has not accepted yet.",
+                value=stats["lag_seconds"],
+            )
+        yield queues
+        if self.scheduler is not None:
+            yield from self._sampling(self.scheduler.stats())
+
+    def _sampling(self, stats):
+        rates = GaugeMetricFamily("njt_engine_sample_rate", "Frames/s the scheduler samples each camera at.", labels=["camera"])
+        active = GaugeMetricFamily("njt_engine_sampling_active", "1 while a camera's zones are changing.", labels=["camera"])
+        costs = GaugeMetricFamily("njt_engine_sample_cost_seconds", "Moving average of decode CPU seconds per sample.", labels=["camera"])
+        dropped = CounterMetricFamily("njt_engine_samples_dropped", "Samples that were due but had no free frame slot.", labels=["camera"])
+        for camera_id, camera in stats["cameras"].items():
+            rates.add_metric([camera_id], camera["rate"])
+            active.add_metric([camera_id], float(camera["active"]))
+            costs.add_metric([camera_id], camera["cost_seconds"])
+            dropped.add_metric([camera_id], camera["dropped"])
+        yield from (rates, active, costs, dropped)
+        yield GaugeMetricFamily("njt_engine_decode_load", "Decode CPU seconds per second the chosen rates need.",
+                                value=stats["load"])
+        if stats["cpu_budget"]:
+            yield GaugeMetricFamily("njt_engine_decode_budget", "Decode CPU seconds per second allowed.",
+                                    value=stats["cpu_budget"])
+
+
+def start_exporter(port, collector):
+    """Registers `collector` and serves /metrics on `port` from a background thread."""
+    REGISTRY.register(collector)
+    start_http_server(port)
+    get_logger("njt.engine").info("metrics exporter started", extra={"fields": {"port": port}})
+
+
+class FrameTracer:
+    """Logs one JSON span with all step timings for a `sample_rate` fraction of frames."""
+
+    def __init__(self, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self.logger = get_logger("njt.trace")
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def emit(self, camera_id, captured_at, timings):
+        """`timings` maps step -> list of seconds, as filled in by DetectionPipeline.process."""
+        self.logger.info("frame", extra={"fields": {
+            "camera_id": camera_id,
+            "captured_at": round(captured_at, 3),
+            "steps_ms": {step: [round(s * 1000, 3) for s in values] for step, values in timings.items()},
+        }})
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drops repeats of a message beyond `per_interval` per `interval` seconds;
+    the next one let through carries the number that were dropped, so a
+    per-frame message costs one formatted line per interval, not one per frame.
+    """
+
+    def __init__(self, per_interval=5, interval=10.0):
+        super().__init__()
+        self.per_interval = per_interval
+        self.interval = interval
+        self._windows = {}  # msg template -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(record.msg, [now, 0, 0])
+            if now - window[0] >= self.interval:
+                if window[2]:
+                    record.suppressed = window[2]
+                window[:] = [now, 0, 0]
+            if window[1] >= self.per_interval:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        return json.dumps(entry)
+
+
+def get_logger(name):
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
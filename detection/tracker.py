@@ -0,0 +1,126 @@
+# detection/tracker.py
+#
+# Description:
+# Temporal smoothing between per-frame sightings and the state uploaded to the
+# backend. Each spot commits to a bus only after it has been seen there
+# `confirm_hits` times within `confirm_window` seconds, and keeps it until it
+# has gone unseen for `clear_seconds` (hysteresis), so a single misread does
+# not reach the backend and a few missed decodes do not clear a spot.
+#
+# A bus can be committed to one spot only. When it is confirmed in a second
+# spot it moves there only once it has gone unseen in its current spot for the
+# confirmation window; a bus decoded in two overlapping zones therefore stays
+# put instead of flip-flopping, while a bus that really moved stops being seen
+# in its old spot and wins the new one.
+#
+# Expiry is driven by a heap of deadlines instead of scanning every spot on
+# every frame, sightings of already committed buses only refresh a timestamp,
+# and the returned state dict is only replaced when something changes, so
+# per-frame cost depends on the sightings, not on yard size.
+
+import heapq
+from collections import deque
+
+
+class SpotTracker:
+    def __init__(self, confirm_hits=2, confirm_window=1.0, clear_seconds=10.0):
+        self.confirm_hits = confirm_hits
+        self.confirm_window = confirm_window
+        self.clear_seconds = clear_seconds
+        self._state = {}  # spot_id -> committed bus_number; replaced, never mutated, once returned
+        self._bus_spot = {}  # bus_number -> spot_id it is committed to
+        self._last_seen = {}  # spot_id -> last time its committed bus was seen there
+        self._hits = {}  # (spot_id, bus_number) -> deque of recent sighting times, for uncommitted pairs
+        self._deadlines = []  # heap of (time, kind, spot_id, bus_number)
+        self._clear_scheduled = set()  # spots with a "clear" deadline in the heap
+        self._copied = False
+        self.counters = {"commits": 0, "clears": 0, "moves": 0, "conflicts_held": 0}
+
+    def update(self, sightings, current_time):
+        """
+        Records this frame's (bus_number, spot_id) sightings and returns the
+        committed {spot_id: bus_number} state. The same dict object is returned
+        until the state changes, and a returned dict is never modified.
+        """
+        self._copied = False
+        for bus_number, spot_id in set(sightings):
+            if self._state.get(spot_id) == bus_number:
+                self._last_seen[spot_id] = current_time
+            elif len(self._record_hit(spot_id, bus_number, current_time)) >= self.confirm_hits:
+                self._commit(spot_id, bus_number, current_time)
+        self._expire(current_time)
+        return self._state
+
+    def stable_state(self):
+        return self._state
+
+    def _record_hit(self, spot_id, bus_number, now):
+        key = (spot_id, bus_number)
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque()
+            heapq.heappush(self._deadlines, (now + self.confirm_window, "hits", spot_id, bus_number))
+        hits.append(now)
+        self._prune(hits, now)
+        return hits
+
+    def _prune(self, hits, now):
+        while hits and hits[0] + self.confirm_window <= now:
+            hits.popleft()
+
+    def _writable_state(self):
+        if not self._copied:
+            self._state = dict(self._state)
+            self._copied = True
+        return self._state
+
+    def _commit(self, spot_id, bus_number, now):
+        current_spot = self._bus_spot.get(bus_number)
+        if current_spot is not None:
+            if self._last_seen[current_spot] + self.confirm_window > now:
+                self.counters["conflicts_held"] += 1
+                return
+            self._clear(current_spot)
+            self.counters["moves"] += 1
+        state = self._writable_state()
+        displaced = state.get(spot_id)
+        if displaced is not None:
+            del self._bus_spot[displaced]
+        if spot_id not in self._clear_scheduled:
+            self._clear_scheduled.add(spot_id)
+            heapq.heappush(self._deadlines, (now + self.clear_seconds, "clear", spot_id, None))
+        state[spot_id] = bus_number
+        self._bus_spot[bus_number] = spot_id
+        self._last_seen[spot_id] = now
+        self.counters["commits"] += 1
+
+    def _clear(self, spot_id):
+        state = self._writable_state()
+        bus_number = state.pop(spot_id)
+        del self._bus_spot[bus_number]
+        del self._last_seen[spot_id]
+        self.counters["clears"] += 1
+
+    def _expire(self, now):
+        # Deadlines are pushed once and re-pushed when they turn out to have
+        # been extended, so each live spot or candidate costs O(log n) per
+        # clear_seconds / confirm_window rather than per frame.
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, kind, spot_id, bus_number = heapq.heappop(deadlines)
+            if kind == "clear":
+                last_seen = self._last_seen.get(spot_id)
+                if last_seen is not None and last_seen + self.clear_seconds <= now:
+                    self._clear(spot_id)
+                    last_seen = None
+                if last_seen is None:
+                    self._clear_scheduled.discard(spot_id)
+                else:
+                    heapq.heappush(deadlines, (last_seen + self.clear_seconds, "clear", spot_id, None))
+            else:
+                hits = self._hits[(spot_id, bus_number)]
+                self._prune(hits, now)
+                if hits:
+                    heapq.heappush(deadlines, (hits[0] + self.confirm_window, "hits", spot_id, bus_number))
+                else:
+                    del self._hits[(spot_id, bus_number)]
@@ -0,0 +1,405 @@
+# detection/uploader.py
+#
+# Description:
+# Background sender for camera state uploads, so a slow or unreachable backend
+# never stalls QR decoding. The detection side only calls submit(), which
+# records the camera's latest state and returns immediately. A sender thread
+# posts it over one pooled keep-alive session with a timeout:
+#   - latest state wins: a camera's newer state replaces any unsent older one,
+#     so the queue never holds more than one state per camera;
+#   - while the backend is failing, the sender backs off exponentially and
+#     appends every state *change* to an on-disk spool instead of dropping it;
+#   - once the backend answers again the spool is replayed oldest first, as
+#     full snapshots, before live updates resume. The spool also survives an
+#     engine restart.
+#   - a state the backend refuses with a 4xx (other than the 409 that asks for
+#     a resync) is dropped and counted, and not sent again until it changes.
+#
+# With wire_format="msgpack" uploads are sent in the backend's compact form
+# (backend/wire.py): msgpack, with spot ids replaced by their number in the
+# backend's layout (GET /api/layout), which is fetched once and again whenever
+# the backend answers 412 because its spots changed. Spots the layout does not
+# know yet are sent by name.
+#
+# With a sharded backend, a replica answers 307 for cameras it does not own.
+# The uploader remembers the owner the redirect names, sends that camera's
+# uploads there directly, and numbers them against the owner's layout.
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import get_logger
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_SPOOL_PATH = os.path.join(os.path.dirname(__file__), "upload_spool.jsonl")
+WIRE_FORMATS = ("json", "msgpack")
+MSGPACK_CONTENT_TYPE = "application/x-msgpack"
+# Backend replicas the session keeps a connection open to.
+MAX_SHARDS = 8
+
+logger = get_logger("njt.uploader")
+
+
+class DiskSpool:
+    """
+    Append-only JSON-lines file of states the backend has not accepted yet,
+    mirrored in memory. Entries are only removed from the head, and the file is
+    rewritten once the removed lines outweigh the remaining ones.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = deque()
+        self.dropped = 0
+        self._removed = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        pass  # a torn last line from a crash mid-write
+        self._file = open(path, "a") if path else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, entry):
+        if len(self.entries) >= self.max_entries:
+            # Keep the newest history; the backend ends up right either way
+            # because the live state is always sent after the spool.
+            self.entries.popleft()
+            self._removed += 1
+            self.dropped += 1
+        self.entries.append(entry)
+        if self._file:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def peek(self):
+        return self.entries[0] if self.entries else None
+
+    def pop(self):
+        self.entries.popleft()
+        self._removed += 1
+        if self._file and (not self.entries or self._removed > len(self.entries)):
+            self._rewrite()
+
+    def _rewrite(self):
+        self._file.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a")
+        self._removed = 0
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class BackendUploader:
+    """
+    Owns the upload thread for one engine. `backend_url` is the full-snapshot
+    endpoint; deltas go to `backend_url + "/delta"`, and the layout used for
+    the msgpack wire format is read from the backend's /api/layout. A camera
+    whose uploads were redirected to another replica uses that replica's
+    URL and layout instead.
+    """
+
+    def __init__(self, backend_url, timeout=2.0, spool_path=DEFAULT_SPOOL_PATH,
+                 backoff_initial=0.5, backoff_max=30.0, spool_max_entries=100000, wire_format="json"):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"wire_format must be one of {WIRE_FORMATS}")
+        if wire_format == "msgpack" and msgpack is None:
+            logger.warning("msgpack is not installed, uploading JSON")
+            wire_format = "json"
+        self.backend_url = backend_url
+        self.wire_format = wire_format
+        self._owners = {}  # camera_id -> backend_url of the replica a 307 pointed to
+        self._layouts = {}  # backend_url -> (layout version, {spot_id: number in that layout})
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        # One sender thread: a single kept-alive connection per host (one per
+        # shard when the backend is sharded) is enough. Retries are ours (with
+        # backoff and spooling), not urllib3's.
+        adapter = HTTPAdapter(pool_connections=MAX_SHARDS, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        self.spool = DiskSpool(spool_path, spool_max_entries)
+        self._cond = threading.Condition()
+        self._pending = {}  # camera_id -> (camera_sync, state, captured_at); insertion order = age
+        self._last_spooled = {}  # camera_id -> last state written to the spool
+        self._syncs = {}  # camera_id -> CameraSync, to resync cameras after a replay
+        self._refused = {}  # camera_id -> last state the backend refused
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stopping = False
+        self.sent = 0
+        self.failures = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.refused = 0
+        self._thread = threading.Thread(target=self._run, name="backend-uploader", daemon=True)
+        self._thread.start()
+
+    def submit(self, camera_sync, state, captured_at):
+        """
+        Queues `state` as the camera's latest state. Never blocks on the network.
+        `state` is kept as is, not copied: like CameraSync, the uploader relies
+        on the spot tracker replacing its dict on change instead of mutating it.
+        """
+        with self._cond:
+            self._syncs[camera_sync.camera_id] = camera_sync
+            if camera_sync.camera_id in self._pending:
+                self.coalesced += 1
+                # Re-insert so the dict stays ordered by how long a camera has waited.
+                del self._pending[camera_sync.camera_id]
+            self._pending[camera_sync.camera_id] = (camera_sync, state, captured_at)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "sent": self.sent,
+                "failures": self.failures,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "refused": self.refused,
+                "spooled": len(self.spool),
+                "spool_dropped": self.spool.dropped,
+                "pending": len(self._pending),
+                "lag_seconds": self._lag(),
+            }
+
+    def _lag(self):
+        """Seconds since the oldest state not yet accepted by the backend was captured."""
+        oldest = [captured_at for _, _, captured_at in self._pending.values()]
+        if self.spool.entries:
+            oldest.append(self.spool.entries[0]["captured_at"])
+        return max(0.0, time.time() - min(oldest)) if oldest else 0.0
+
+    def close(self, timeout=5.0):
+        """
+        Stops the sender after it had up to `timeout` seconds to drain. Whatever
+        is still unsent is spooled to disk for the next run.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self.spool.entries) and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        for camera_sync, state, captured_at in self._pending.values():
+            self._spool(camera_sync, state, captured_at)
+        self._pending.clear()
+        self.spool.close()
+        self.session.close()
+
+    # --- Sender thread ---
+
+    def _run(self):
+        if self.wire_format == "msgpack":
+            # Fetch the spot numbering before the first upload needs it.
+            self._fetch_layout(self.backend_url)
+        while True:
+            with self._cond:
+                while not self._stopping and not self._pending and not (
+                        self.spool.entries and time.monotonic() >= self._retry_at):
+                    self._cond.wait(max(0.0, self._retry_at - time.monotonic()) if self.spool.entries else None)
+                if self._stopping:
+                    return
+                backing_off = time.monotonic() < self._retry_at
+                if backing_off or self.spool.entries:
+                    # Keep history in order: while the backend is down, or
+                    # while older states are still being replayed, new states
+                    # join the end of the spool.
+                    for camera_sync, state, captured_at in self._pending.values():
+                        self._spool(camera_sync, state, captured_at)
+                    self._pending.clear()
+                    if backing_off:
+                        continue
+                    entry, item = self.spool.peek(), None
+                else:
+                    entry, item = None, self._pending.pop(next(iter(self._pending)))
+
+            if entry is not None:
+                ok = self._replay(entry)
+            else:
+                camera_sync, state, captured_at = item
+                ok = self._send(camera_sync, state, captured_at)
+
+            with self._cond:
+                if ok:
+                    self._backoff = 0.0
+                    if entry is not None:
+                        self.spool.pop()
+                        self.replayed += 1
+                else:
+                    self.failures += 1
+                    self._backoff = min(self.backoff_max, max(self.backoff_initial, self._backoff * 2))
+                    # Jitter so several engines do not retry a recovering backend in lockstep.
+                    self._retry_at = time.monotonic() + self._backoff * random.uniform(0.5, 1.0)
+                    if item is not None:
+                        self._spool(*item)
+                self._cond.notify_all()
+
+    def _spool(self, camera_sync, state, captured_at):
+        """Writes a state change to the spool; repeats of the last spooled or acknowledged state are skipped."""
+        last = self._last_spooled.get(camera_sync.camera_id, camera_sync.acked_state)
+        if state == last:
+            return
+        self._last_spooled[camera_sync.camera_id] = state
+        self.spool.append({"camera_id": camera_sync.camera_id, "captured_at": captured_at, "state": state})
+
+    def _fetch_layout(self, url):
+        """Loads the spot numbering of the backend at `url`; False if it could not be fetched."""
+        try:
+            response = self.session.get(url.split("/api/detections")[0] + "/api/layout", timeout=self.timeout)
+            response.raise_for_status()
+            layout = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("layout fetch failed", extra={"fields": {"url": url, "error": str(e)}})
+            return False
+        numbers = {spot["spotId"]: i for i, spot in enumerate(layout["spots"])}
+        self._layouts[url] = (layout["version"], numbers)
+        logger.info("layout loaded", extra={"fields": {"url": url, "version": layout["version"], "spots": len(numbers)}})
+        return True
+
+    def _encode(self, payload, url):
+        """(body, content type) of a payload in the configured wire format, for the backend at `url`."""
+        if self.wire_format == "json" or (url not in self._layouts and not self._fetch_layout(url)):
+            return json.dumps(payload), "application/json"
+        layout_version, numbers = self._layouts[url]
+        compact = {key: value for key, value in payload.items() if key not in ("detections", "upserts", "removals")}
+        compact["layout"] = layout_version
+        for key in ("detections", "upserts"):
+            if key in payload:
+                compact[key] = [[numbers.get(d["spot_id"], d["spot_id"]), d["bus_number"]] for d in payload[key]]
+        if "removals" in payload:
+            compact["removals"] = [numbers.get(spot_id, spot_id) for spot_id in payload["removals"]]
+        return msgpack.packb(compact), MSGPACK_CONTENT_TYPE
+
+    def _post(self, path, payload):
+        """
+        Posts `payload` to `path` ("" or "/delta") on the replica that owns its
+        camera. Returns the response, or None if the backend could not be reached.
+        """
+        camera_id = payload["camera_id"]
+        try:
+            # At most one redirect to the owner and one layout refresh.
+            for _ in range(3):
+                url = self._owners.get(camera_id, self.backend_url)
+                body, content_type = self._encode(payload, url)
+                response = self.session.post(url + path, data=body, headers={"Content-Type": content_type},
+                                             timeout=self.timeout, allow_redirects=False)
+                location = response.headers.get("Location", "")
+                if response.status_code == 307 and location:
+                    # Another replica owns this camera; its layout may differ,
+                    # so re-encode instead of letting requests resend the body.
+                    self._owners[camera_id] = location[:-len(path)] if path and location.endswith(path) else location
+                    logger.info("camera owned by another replica", extra={"fields": {
+                        "camera_id": camera_id, "owner": self._owners[camera_id],
+                    }})
+                    continue
+                if response.status_code == 412 and content_type == MSGPACK_CONTENT_TYPE:
+                    # The backend's spots changed since we fetched its layout.
+                    self._layouts.pop(url, None)
+                    continue
+                return response
+            return response
+        except requests.exceptions.RequestException as e:
+            logger.warning("upload failed", extra={"fields": {"error": str(e)}})
+            return None
+
+    def _send(self, camera_sync, state, captured_at):
+        """
+        Uploads the difference between `state` and what the backend last
+        acknowledged for this camera. Returns False if it should be retried
+        later; a rejected delta is resynced right away with a full snapshot.
+        """
+        refused = self._refused.get(camera_sync.camera_id)
+        if refused is not None and (refused is state or refused == state):
+            return True
+        for _ in range(3):
+            update = camera_sync.build_update(state, captured_at)
+            if update is None:
+                return True
+            kind, payload = update
+            response = self._post("" if kind == "full" else "/delta", payload)
+            if response is None or response.status_code >= 500:
+                return False
+            if response.status_code == 409 and kind == "delta":
+                # The backend lost track of our sequence (restart, or a delta was
+                # applied but its response got lost); resync with a full snapshot.
+                logger.info("delta rejected, resending full state", extra={"fields": {"camera_id": camera_sync.camera_id}})
+                camera_sync.reset()
+                continue
+            if response.status_code == 409:
+                # The backend applied a newer seq than ours (the engine restarted
+                # and counts from 0 again); continue numbering after it.
+                camera_sync.seq = max(camera_sync.seq, self._expected_seq(response))
+                continue
+            if response.ok:
+                camera_sync.acknowledge(payload["seq"], state, captured_at)
+                self._refused.pop(camera_sync.camera_id, None)
+                self.sent += 1
+                if kind == "full" or payload["upserts"] or payload["removals"]:
+                    logger.info("state uploaded", extra={"fields": {
+                        "camera_id": camera_sync.camera_id, "kind": kind, "spots": len(state),
+                        "upserts": len(payload.get("upserts", ())), "removals": len(payload.get("removals", ())),
+                    }})
+            else:
+                # A 4xx will not get better by retrying the same payload, so
+                # this state is dropped; the camera's next change is tried again.
+                self._refused[camera_sync.camera_id] = state
+                self.refused += 1
+                logger.warning("upload refused, dropping it", extra={"fields": {
+                    "camera_id": camera_sync.camera_id, "status": response.status_code, "kind": kind,
+                    "refused": self.refused,
+                }})
+            return True
+        return True
+
+    @staticmethod
+    def _expected_seq(response):
+        try:
+            return int(response.json()["detail"]["expected_base_seq"] or 0)
+        except (ValueError, KeyError, TypeError):
+            return 0
+
+    def _replay(self, entry):
+        """Sends one spooled state as a full snapshot."""
+        payload = {
+            "camera_id": entry["camera_id"],
+            "detections": [{"spot_id": s, "bus_number": b} for s, b in entry["state"].items()],
+        }
+        response = self._post("", payload)
+        if response is None or response.status_code >= 500:
+            return False
+        if not response.ok:
+            logger.warning("spooled state refused, dropping it", extra={"fields": {"status": response.status_code}})
+        camera_sync = self._syncs.get(entry["camera_id"])
+        if camera_sync is not None:
+            # The backend now holds the replayed state, not what was last acknowledged.
+            camera_sync.reset()
+        return True
@@ -0,0 +1,169 @@
+# detection/zones.py
+#
+# Description:
+# Parking spot zone helpers. A zone is either an (x_start, y_start, x_end, y_end)
+# rectangle in frame pixels, as printed by coordinatePicker.py, or a polygon
+# given as a list of three or more [x, y] corners.
+
+import cv2
+import numpy as np
+
+
+def is_polygon(zone):
+    return len(zone) >= 3 and hasattr(zone[0], "__len__")
+
+
+def zone_bounds(zone):
+    """(x_start, y_start, x_end, y_end) bounding box of a rectangle or polygon zone."""
+    if is_polygon(zone):
+        xs = [p[0] for p in zone]
+        ys = [p[1] for p in zone]
+        return min(xs), min(ys), max(xs), max(ys)
+    return tuple(zone)
+
+
+def get_spot_for_qr(points, zones):
+    """
+    Determines which parking spot a QR code is in. This scans every zone; for
+    many zones or many codes per frame use ZoneIndex instead.
+    """
+    if points is None or len(points) == 0:
+        return None
+    x_coords = [p[0] for p in points]
+    y_coords = [p[1] for p in points]
+    x_min, x_max = min(x_coords), max(x_coords)
+    y_min, y_max = min(y_coords), max(y_coords)
+    qr_center_x = (x_min + x_max) / 2
+    qr_center_y = (y_min + y_max) / 2
+
+    for spot_id, zone in zones.items():
+        if is_polygon(zone):
+            contour = np.asarray(zone, dtype=np.float32)
+            if cv2.pointPolygonTest(contour, (float(qr_center_x), float(qr_center_y)), False) > 0:
+                return spot_id
+            continue
+        x_start, y_start, x_end, y_end = zone
+        if x_start < qr_center_x < x_end and y_start < qr_center_y < y_end:
+            return spot_id
+    return None
+
+
+class ZoneIndex:
+    """
+    Uniform grid over the zones' bounding boxes, built once. Each grid cell
+    lists the zones that overlap it, so finding the zone for a point only tests
+    the handful of zones in that point's cell instead of every zone. Matches
+    get_spot_for_qr exactly, including "first zone in dict order wins" when
+    zones overlap.
+    """
+
+    def __init__(self, zones, cell_size=None):
+        self.spot_ids = list(zones)
+        self.bounds = np.array([zone_bounds(zones[s]) for s in self.spot_ids], dtype=np.float64).reshape(-1, 4)
+        self.polygons = {
+            i: np.asarray(zones[s], dtype=np.float32)
+            for i, s in enumerate(self.spot_ids) if is_polygon(zones[s])
+        }
+        if cell_size is None:
+            # About one zone per cell: the median zone's larger side.
+            sizes = np.maximum(self.bounds[:, 2] - self.bounds[:, 0], self.bounds[:, 3] - self.bounds[:, 1])
+            cell_size = float(np.median(sizes)) if len(sizes) else 1.0
+        self.cell_size = max(cell_size, 1.0)
+        self.cells = {}
+        for i, (x0, y0, x1, y1) in enumerate(self.bounds):
+            for cx in range(int(x0 // self.cell_size), int(x1 // self.cell_size) + 1):
+                for cy in range(int(y0 // self.cell_size), int(y1 // self.cell_size) + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    @staticmethod
+    def centers(points):
+        """Bounding-box centers of an (n, k, 2) array of code corner points."""
+        points = np.asarray(points, dtype=np.float64).reshape(len(points), -1, 2)
+        return (points.min(axis=1) + points.max(axis=1)) / 2
+
+    def _contains(self, i, x, y):
+        polygon = self.polygons.get(i)
+        if polygon is not None:
+            return cv2.pointPolygonTest(polygon, (x, y), False) > 0
+        x0, y0, x1, y1 = self.bounds[i]
+        return x0 < x < x1 and y0 < y < y1
+
+    def lookup_centers(self, centers):
+        """Spot id (or None) for each (x, y) row of `centers`."""
+        if len(centers) == 0:
+            return []
+        cells = np.floor(np.asarray(centers) / self.cell_size).astype(np.int64)
+        results = []
+        for (x, y), (cx, cy) in zip(np.asarray(centers).tolist(), cells.tolist()):
+            # Candidates are in zone order, so the first hit matches the linear scan.
+            match = None
+            for i in self.cells.get((cx, cy), ()):
+                if self._contains(i, x, y):
+                    match = self.spot_ids[i]
+                    break
+            results.append(match)
+        return results
+
+    def lookup(self, points):
+        """Spot id (or None) for a single code's corner points."""
+        if points is None or len(points) == 0:
+            return None
+        return self.lookup_centers(self.centers([points]))[0]
+
+    def lookup_codes(self, codes):
+        """Spot ids for a frame's [(bus_number, points), ...], computed in one pass."""
+        if not codes:
+            return []
+        return self.lookup_centers(self.centers([points for _, points in codes]))
+
+
+def merge_zone_rois(zones, frame_shape, padding=16):
+    """
+    Returns the regions of interest that cover every zone: each zone's bounds
+    padded by `padding` pixels (so a code straddling the zone edge is still
+    whole), clipped to the frame, and with overlapping boxes merged into their
+    union until no two overlap. Each ROI is (x_start, y_start, x_end, y_end).
+    """
+    height, width = frame_shape[:2]
+    rois = []
+    for zone in zones.values():
+        x0, y0, x1, y1 = zone_bounds(zone)
+        rois.append((max(0, int(x0) - padding), max(0, int(y0) - padding),
+                     min(width, int(x1) + padding), min(height, int(y1) + padding)))
+    return sorted(_merge_overlapping(rois), key=lambda r: (r[1], r[0]))
+
+
+def _merge_overlapping(boxes):
+    """
+    Replaces every group of overlapping boxes by its bounding box, repeating
+    until nothing overlaps. Overlaps are found with a sweep along x, so
+    thousands of zones merge in well under a second.
+    """
+    while True:
+        parent = list(range(len(boxes)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        active = []
+        for i in sorted(range(len(boxes)), key=lambda k: boxes[k][0]):
+            x0, y0, x1, y1 = boxes[i]
+            active = [j for j in active if boxes[j][2] > x0]
+            for j in active:
+                if boxes[j][1] < y1 and y0 < boxes[j][3]:
+                    parent[find(i)] = find(j)
+            active.append(i)
+
+        groups = {}
+        for i, box in enumerate(boxes):
+            root = find(i)
+            g = groups.get(root)
+            groups[root] = box if g is None else (
+                min(g[0], box[0]), min(g[1], box[1]), max(g[2], box[2]), max(g[3], box[3])
+            )
+        if len(groups) == len(boxes):
+            return boxes
+        boxes = list(groups.values())
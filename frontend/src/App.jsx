@@ -34,6 +34,80 @@ const StandardSpot = ({ spot, isFound }) => (
     </div>
 );
 
+// Hourly yard utilization for the last 24 hours as a bar chart, with the
+// average dwell and the usual peak hour. Served from the backend's rollups,
+// so polling once a minute is plenty.
+const ANALYTICS_URL = 'http://localhost:8000/api/analytics';
+
+const formatDuration = (seconds) => {
+    if (seconds == null) return '—';
+    const hours = Math.floor(seconds / 3600);
+    const minutes = Math.round((seconds % 3600) / 60);
+    return hours ? `${hours}h ${minutes}m` : `${minutes}m`;
+};
+
+const AnalyticsPanel = () => {
+    const [utilization, setUtilization] = useState(null);
+    const [dwell, setDwell] = useState(null);
+    const [peak, setPeak] = useState(null);
+
+    useEffect(() => {
+        const load = async () => {
+            try {
+                const [u, d, p] = await Promise.all(
+                    ['utilization?granularity=hour', 'dwell', 'peak-hours'].map(path =>
+                        fetch(`${ANALYTICS_URL}/${path}`).then(response => response.json()))
+                );
+                setUtilization(u);
+                setDwell(d);
+                setPeak(p);
+            } catch (error) {
+                console.error("Could not load analytics:", error);
+            }
+        };
+        load();
+        const interval = setInterval(load, 60000);
+        return () => clearInterval(interval);
+    }, []);
+
+    // One bar per hour of the last 24, including hours with no occupancy.
+    const bars = [];
+    if (utilization) {
+        const byStart = new Map(utilization.buckets.map(b => [new Date(b.start).getTime(), b.utilization]));
+        const first = new Date(utilization.start).getTime();
+        for (let i = 0; i < 24; i++) {
+            bars.push(byStart.get(first + i * 3600000) ?? 0);
+        }
+    }
+
+    return (
+        <div>
+            <h3 className="text-sm text-slate-400">Utilization (24h)</h3>
+            <svg className="w-full h-16 mt-1" viewBox="0 0 240 60" preserveAspectRatio="none">
+                {bars.map((value, i) => (
+                    <rect key={i} x={i * 10 + 1} width="8" y={60 - Math.min(value, 1) * 60}
+                          height={Math.min(value, 1) * 60} className="fill-cyan-400/70" />
+                ))}
+            </svg>
+            <p className="text-xs text-slate-500">
+                {utilization ? `${Math.round(utilization.utilization * 100)}% average` : 'Loading…'}
+            </p>
+            <div className="flex justify-between mt-3 text-sm">
+                <span className="text-slate-400">Avg dwell</span>
+                <span className="font-semibold">{formatDuration(dwell?.averageDwellSeconds)}</span>
+            </div>
+            <div className="flex justify-between text-sm">
+                <span className="text-slate-400">Peak hour</span>
+                <span className="font-semibold">
+                    {peak?.peakHour != null
+                        ? new Date(Date.UTC(2000, 0, 1, peak.peakHour)).toLocaleTimeString([], { hour: 'numeric' })
+                        : '—'}
+                </span>
+            </div>
+        </div>
+    );
+};
+
 // --- Main App Component ---
 
 function App() {
@@ -41,36 +115,71 @@ function App() {
     const [parkingStatus, setParkingStatus] = useState([]);
     // State for the search input
     const [searchTerm, setSearchTerm] = useState('');
+    // Buses matching the search, looked up on the backend
+    const [searchResults, setSearchResults] = useState([]);
     // State for the live clock
     const [time, setTime] = useState(new Date());
 
-    // This effect hook fetches data and updates the clock
+    // This effect hook subscribes to live status updates and updates the clock
     useEffect(() => {
-        const fetchData = async () => {
-            try {
-                // This is the live API call to your backend server
-                const response = await fetch('http://localhost:8000/api/status');
-                const data = await response.json();
-                
-                // Update the dashboard with the REAL data from the server
-                setParkingStatus(data);
-            } catch (error) {
-                console.error("Failed to fetch parking status:", error);
-                // In case of an error, we can set it to an empty array
-                setParkingStatus([]);
-            }
+        // The backend pushes a full "snapshot" event on connect and then
+        // "spots" events containing only the spots whose bus changed.
+        // EventSource reconnects on its own and each reconnect starts with a
+        // fresh snapshot, so nothing can be missed.
+        const statusStream = new EventSource('http://localhost:8000/api/status/stream');
+
+        statusStream.addEventListener('snapshot', (event) => {
+            setParkingStatus(JSON.parse(event.data));
+        });
+
+        statusStream.addEventListener('spots', (event) => {
+            const changes = new Map(JSON.parse(event.data).map(change => [change.spotId, change]));
+            setParkingStatus(previous => previous.map(spot => (
+                changes.has(spot.spotId)
+                    ? { ...spot, actualBus: changes.get(spot.spotId).actualBus }
+                    : spot
+            )));
+        });
+
+        statusStream.onerror = (error) => {
+            console.error("Lost connection to parking status stream, retrying:", error);
         };
 
-        fetchData(); // Initial fetch
-        const dataInterval = setInterval(fetchData, 2000); // Fetch data every 2 seconds
         const timeInterval = setInterval(() => setTime(new Date()), 1000);
 
         return () => {
-            clearInterval(dataInterval);
+            statusStream.close();
             clearInterval(timeInterval);
         };
     }, []); // The empty array ensures this effect runs only once on mount
 
+    // Ask the backend's bus index instead of scanning every spot; wait for a
+    // pause in typing so each keystroke does not send a request. A request
+    // still in flight when the term changes is aborted, so a slow answer for
+    // an older term can never overwrite the results for the newer one.
+    useEffect(() => {
+        if (!searchTerm) {
+            setSearchResults([]);
+            return;
+        }
+        const controller = new AbortController();
+        const timeout = setTimeout(() => {
+            fetch(`http://localhost:8000/api/buses?prefix=${encodeURIComponent(searchTerm)}&limit=5`,
+                  { signal: controller.signal })
+                .then(response => response.json())
+                .then(setSearchResults)
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error("Bus search failed:", error);
+                    }
+                });
+        }, 200);
+        return () => {
+            clearTimeout(timeout);
+            controller.abort();
+        };
+    }, [searchTerm]);
+
     const occupiedSpots = parkingStatus.filter(s => s.actualBus).length;
     const totalSpots = parkingStatus.length;
 
@@ -97,6 +206,13 @@ function App() {
                             value={searchTerm}
                             onChange={(e) => setSearchTerm(e.target.value)}
                         />
+                        {searchResults.map(bus => (
+                            <p key={bus.busNumber} className="text-xs text-slate-400 mt-1">
+                                <span className="font-semibold text-slate-200">{bus.busNumber}</span>
+                                {bus.parked ? ` in ${bus.spotId}` : ` left ${bus.spotId}`}
+                                {` · seen ${new Date(bus.lastSeen).toLocaleTimeString()}`}
+                            </p>
+                        ))}
                     </div>
                     <div>
                         <h3 className="text-sm text-slate-400">System Status</h3>
@@ -109,6 +225,7 @@ function App() {
                         <h3 className="text-sm text-slate-400">Depot Capacity</h3>
                         <p className="text-lg font-semibold">{occupiedSpots} / {totalSpots} Occupied</p>
                     </div>
+                    <AnalyticsPanel />
                 </div>
 
                 <div className="text-center text-slate-500">